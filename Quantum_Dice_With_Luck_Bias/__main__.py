@@ -0,0 +1,17 @@
+# to run (from the project root) - python -m Quantum_Dice_With_Luck_Bias
+# or, for the HTTP/JSON roll server - python -m Quantum_Dice_With_Luck_Bias serve
+# or, for a Monte Carlo attack campaign - python -m Quantum_Dice_With_Luck_Bias campaign
+import sys
+
+if len(sys.argv) > 1 and sys.argv[1] == "serve":
+    from Quantum_Dice_With_Luck_Bias.server import main
+
+    main(sys.argv[2:])
+elif len(sys.argv) > 1 and sys.argv[1] == "campaign":
+    from Quantum_Dice_With_Luck_Bias.campaign import main
+
+    main(sys.argv[2:])
+else:
+    from Quantum_Dice_With_Luck_Bias.quantum_dice import main
+
+    main(sys.argv[1:])
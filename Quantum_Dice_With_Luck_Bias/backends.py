@@ -0,0 +1,514 @@
+"""
+Pluggable entropy backends for the quantum dice and rng helpers
+
+Everything that needs random bits asks an EntropyBackend for them, so the
+same roll_die / roll_dice API can run on:
+
+- "sampler":     the (V1) qiskit Sampler, which is what the dice always used
+- "statevector": qiskit's V2 StatevectorSampler
+- "aer":         a local Aer simulator (only if qiskit-aer is installed)
+- "classical":   a seeded NumPy PCG64 generator
+- "urandom":     the operating system's random source (os.urandom)
+
+Production traffic often doesn't need simulator-grade realism, so the backend
+can be picked without code changes through the QUANTUM_DICE_BACKEND
+environment variable. Setting it to "auto" runs calibrate(), which measures
+how many bits per second each backend produces and picks the fastest one whose
+quality is at least QUANTUM_DICE_MIN_QUALITY ("pseudo", "os" or "quantum").
+"""
+from functools import lru_cache
+import os
+import threading
+import time
+
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.circuit_cache import (
+    CIRCUIT_CACHE_BYTES, MAX_CIRCUIT_QUBITS, circuit_size, get_sampler, get_uniform_circuit, make_seeded_sampler,
+    sample_circuit, sample_circuits, sample_uniform, split_bits
+)
+from Quantum_Dice_With_Luck_Bias.instrumentation import STATS
+from Quantum_Dice_With_Luck_Bias.table_cache import BoundedCache
+
+# How "real" each backend's randomness is, from least to most
+QUALITY_LEVELS = {"pseudo": 0, "os": 1, "quantum": 2}
+
+DEFAULT_BACKEND = "sampler"
+
+_registry = {}
+
+
+def bytes_to_ints(raw, num_bits):
+    """
+    Turn random bytes into uniform num_bits-wide integers
+
+    Parameters:
+    raw (numpy.ndarray): Random bytes, ceil(num_bits / 8) for every value
+    num_bits (int): Bits per value (1-64)
+
+    Returns:
+    numpy.ndarray: One integer between 0 and 2**num_bits - 1 per value
+    """
+    # Glue whole bytes together per value and mask off the extra high bits
+    bytes_per_value = (num_bits + 7) // 8
+    raw = np.asarray(raw, dtype=np.uint8).reshape(-1, bytes_per_value)
+    values = np.zeros(len(raw), dtype=np.uint64)
+    for i in range(bytes_per_value):
+        values = (values << np.uint64(8)) | raw[:, i]
+    values &= np.uint64((1 << num_bits) - 1)
+    return values.astype(np.int64) if num_bits < 64 else values
+
+
+def bit_array_to_ints(bit_array):
+    """
+    Read the shots of a V2 BitArray as integers without any per-shot Python objects
+
+    A BitArray keeps every shot as ceil(num_bits / 8) big-endian bytes in one
+    (shots, num_bytes) uint8 array. Up to 8 bits that's one byte per shot, and
+    up to 16 bits it's a big-endian uint16, so in both cases NumPy can just
+    look at the same memory as a different dtype instead of copying it.
+
+    Parameters:
+    bit_array (BitArray): Measurements of one classical register
+
+    Returns:
+    numpy.ndarray: One integer per shot (a uint8/uint16 view when possible)
+    """
+    packed = bit_array.array.reshape(-1, bit_array.array.shape[-1])
+    if packed.shape[1] == 1:
+        return packed[:, 0]
+    if packed.shape[1] == 2:
+        return np.ascontiguousarray(packed).view(">u2")[:, 0]
+    # Wider registers are glued together byte by byte (still vectorized)
+    return bytes_to_ints(packed, bit_array.num_bits)
+
+
+def sample_wide(sample, num_bits, shots):
+    """
+    Glue num_bits-wide values together from circuits at most MAX_CIRCUIT_QUBITS wide
+
+    Wide dice (a d1000000 needs 20 qubits) would take ages to simulate in one
+    circuit, so backends that run circuits measure a few narrower ones instead.
+
+    Parameters:
+    sample (callable): The backend's sample(num_bits, shots)
+    num_bits (int): Bits per value
+    shots (int): Number of values
+
+    Returns:
+    numpy.ndarray: shots integers between 0 and 2**num_bits - 1
+    """
+    values = np.zeros(shots, dtype=np.int64)
+    for width in split_bits(num_bits):
+        values = (values << width) | sample(width, shots)
+    return values
+
+
+def split_registers(qc, values):
+    """
+    Split measured integers into the values of every classical register
+
+    Every register's bits sit side by side in the measured integer, with the
+    first register in the lowest bits.
+
+    Returns:
+    list: numpy.ndarray of integers for every classical register of qc, in order
+    """
+    values = np.asarray(values).astype(np.int64)
+    registers = []
+    offset = 0
+    for creg in qc.cregs:
+        registers.append((values >> offset) & ((1 << creg.size) - 1))
+        offset += creg.size
+    return registers
+
+
+def join_registers(qc, registers):
+    """Glue every classical register's values back into one integer per shot (see split_registers)"""
+    values = np.zeros(len(registers[0]), dtype=np.int64)
+    offset = 0
+    for creg, register in zip(qc.cregs, registers):
+        values |= register << offset
+        offset += creg.size
+    return values
+
+
+def register_backend(cls):
+    """Class decorator that makes a backend available by its name"""
+    _registry[cls.name] = cls
+    return cls
+
+
+class EntropyBackend:
+    """Base class for anything that can hand out uniform random bits"""
+    # Name the backend is registered under
+    name = None
+    # One of the QUALITY_LEVELS
+    quality = "pseudo"
+    # Whether run_circuit works (needed for native biased circuits)
+    runs_circuits = False
+
+    @classmethod
+    def available(cls):
+        """Whether this backend can be used here (e.g. its optional dependency is installed)"""
+        return True
+
+    def random_bytes(self, num_bytes):
+        """
+        Get uniform random bytes
+
+        Returns:
+        numpy.ndarray: num_bytes random bytes (uint8)
+        """
+        raise NotImplementedError
+
+    def sample(self, num_bits, shots):
+        """
+        Get uniform random values of num_bits bits each
+
+        Returns:
+        numpy.ndarray: shots integers between 0 and 2**num_bits - 1
+        """
+        return bytes_to_ints(self.random_bytes(((num_bits + 7) // 8) * shots), num_bits)
+
+    def run_circuit(self, qc, shots):
+        """
+        Measure a circuit `shots` times
+
+        Returns:
+        numpy.ndarray: One measured integer per shot
+        """
+        raise NotImplementedError(f"The {self.name} backend can't run circuits")
+
+    def run_registers(self, qc, shots):
+        """
+        Measure a circuit with several classical registers `shots` times
+
+        Returns:
+        list: numpy.ndarray of measured integers for every classical register, in order
+        """
+        return split_registers(qc, self.run_circuit(qc, shots))
+
+    def run_batch(self, circuits, shots):
+        """
+        Measure several circuits `shots` times each, in one run where the backend can
+
+        Backends built on a sampler send all the circuits in a single call, so
+        a turn of dice spread over a few circuits still costs one round trip.
+
+        Returns:
+        list: The run_registers result of every circuit, in order
+        """
+        return [self.run_registers(qc, shots) for qc in circuits]
+
+
+@register_backend
+class SamplerBackend(EntropyBackend):
+    name = "sampler"
+    quality = "quantum"
+    runs_circuits = True
+
+    def __init__(self, seed=None):
+        """
+        Backend built on the (V1) qiskit Sampler
+
+        Parameters:
+        seed (int): Use a seeded sampler of our own instead of the shared one
+        """
+        if seed is None:
+            self._sampler, self._rng = None, None
+        else:
+            self._sampler, self._rng = make_seeded_sampler(seed)
+
+    @property
+    def sampler(self):
+        """The sampler we run circuits on"""
+        return self._sampler or get_sampler()
+
+    def random_bytes(self, num_bytes):
+        return self.sample(8, num_bytes).astype(np.uint8)
+
+    def sample(self, num_bits, shots):
+        if num_bits > MAX_CIRCUIT_QUBITS:
+            return sample_wide(self.sample, num_bits, shots)
+        return sample_uniform(num_bits, shots, self.sampler, self._rng)
+
+    def run_circuit(self, qc, shots):
+        return sample_circuit(qc, shots, self.sampler, self._rng)
+
+    def run_batch(self, circuits, shots):
+        return [split_registers(qc, values)
+                for qc, values in zip(circuits, sample_circuits(circuits, shots, self.sampler, self._rng))]
+
+
+@register_backend
+class StatevectorSamplerBackend(EntropyBackend):
+    name = "statevector"
+    quality = "quantum"
+    runs_circuits = True
+
+    def __init__(self, seed=None):
+        """
+        Backend built on qiskit's V2 StatevectorSampler
+
+        Parameters:
+        seed (int): Seed for the sampler (None for fresh randomness)
+        """
+        from qiskit.primitives import StatevectorSampler
+
+        # A Generator (rather than an int) so every run gives different shots
+        self.sampler = StatevectorSampler(seed=np.random.default_rng(seed))
+
+    def random_bytes(self, num_bytes):
+        # An 8-qubit circuit's packed shots already are the bytes we want
+        bit_array = self._run(get_uniform_circuit(8), num_bytes)
+        with STATS.timer("parse", shots=num_bytes):
+            return bit_array_to_ints(bit_array)
+
+    def sample(self, num_bits, shots):
+        if num_bits > MAX_CIRCUIT_QUBITS:
+            return sample_wide(self.sample, num_bits, shots)
+        return self.run_circuit(get_uniform_circuit(num_bits), shots)
+
+    def run_circuit(self, qc, shots):
+        if len(qc.cregs) > 1:
+            # Glue the registers together like the other backends do, first register lowest
+            return join_registers(qc, self.run_registers(qc, shots))
+        bit_array = self._run(qc, shots)
+        with STATS.timer("parse", shots=shots):
+            return bit_array_to_ints(bit_array).astype(np.int64)
+
+    def run_registers(self, qc, shots):
+        return self.run_batch([qc], shots)[0]
+
+    def run_batch(self, circuits, shots):
+        # V2 results already keep every classical register apart
+        all_data = self._run_data(circuits, shots)
+        with STATS.timer("parse", shots=shots * len(circuits)):
+            return [[bit_array_to_ints(getattr(data, creg.name)).astype(np.int64) for creg in qc.cregs]
+                    for qc, data in zip(circuits, all_data)]
+
+    def _run(self, qc, shots):
+        """Run a circuit and get the BitArray of its (first) classical register"""
+        return getattr(self._run_data([qc], shots)[0], qc.cregs[0].name)
+
+    def _run_data(self, circuits, shots):
+        """Run circuits (as one job) and get the measurements of all their classical registers"""
+        STATS.record_run(shots * len(circuits))
+        with STATS.timer("run", shots=shots * len(circuits)):
+            result = self.sampler.run(list(circuits), shots=shots).result()
+        # V2 results keep every shot, in order, per classical register
+        return [pub_result.data for pub_result in result]
+
+
+@register_backend
+class AerBackend(EntropyBackend):
+    name = "aer"
+    quality = "quantum"
+    runs_circuits = True
+
+    @classmethod
+    def available(cls):
+        try:
+            import qiskit_aer  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def __init__(self, seed=None):
+        """
+        Backend built on a local Aer simulator (needs the qiskit-aer package)
+
+        Parameters:
+        seed (int): Seed for the simulator (None for fresh randomness)
+        """
+        from qiskit_aer import AerSimulator
+
+        self.simulator = AerSimulator()
+        self._rng = np.random.default_rng(seed)
+        # (original, transpiled) circuit pairs keyed by the original's id. Each entry
+        # keeps its original alive, so the id can't be reused by another circuit
+        # while the entry exists (the circuit caches evict, so ids do get reused)
+        self._transpiled = BoundedCache(CIRCUIT_CACHE_BYTES,
+                                        lambda pair: circuit_size(pair[0]) + circuit_size(pair[1]))
+
+    def random_bytes(self, num_bytes):
+        return self.sample(8, num_bytes).astype(np.uint8)
+
+    def sample(self, num_bits, shots):
+        if num_bits > MAX_CIRCUIT_QUBITS:
+            return sample_wide(self.sample, num_bits, shots)
+        # The circuit cache transpiles (once) for the simulator's gate set
+        return self._run(get_uniform_circuit(num_bits, backend=self.simulator), shots)
+
+    def run_circuit(self, qc, shots):
+        return self._run(self._transpile(qc), shots)
+
+    def run_batch(self, circuits, shots):
+        all_values = self._run([self._transpile(qc) for qc in circuits], shots)
+        return [split_registers(qc, values) for qc, values in zip(circuits, all_values)]
+
+    def _transpile(self, qc):
+        """The circuit transpiled for the simulator (once per circuit)"""
+        from qiskit import transpile
+
+        return self._transpiled.get(id(qc), lambda: (qc, transpile(qc, self.simulator)))[1]
+
+    def _run(self, qc, shots):
+        """Run a circuit (or a list of circuits as one job) and get the measured integers"""
+        circuits = qc if isinstance(qc, list) else [qc]
+        seed = int(self._rng.integers(2 ** 31))
+        STATS.record_run(shots * len(circuits))
+        with STATS.timer("run", shots=shots * len(circuits)):
+            result = self.simulator.run(circuits, shots=shots, memory=True, seed_simulator=seed).result()
+        with STATS.timer("parse", shots=shots * len(circuits)):
+            # Registers are separated by spaces (last register first), dropping the
+            # spaces gives the same integer the other backends return
+            all_values = [np.array([int(bits.replace(" ", ""), 2) for bits in result.get_memory(i)],
+                                   dtype=np.int64)
+                          for i in range(len(circuits))]
+        return all_values if isinstance(qc, list) else all_values[0]
+
+
+@register_backend
+class ClassicalBackend(EntropyBackend):
+    name = "classical"
+    quality = "pseudo"
+
+    def __init__(self, seed=None):
+        """
+        Backend built on NumPy's PCG64 generator (fast, and reproducible with a seed)
+
+        Parameters:
+        seed (int): Seed for the generator (None for fresh randomness)
+        """
+        self._rng = np.random.Generator(np.random.PCG64(seed))
+
+    def random_bytes(self, num_bytes):
+        STATS.record_run(num_bytes)
+        with STATS.timer("run", shots=num_bytes):
+            return self._rng.integers(0, 256, size=num_bytes, dtype=np.uint8)
+
+    def sample(self, num_bits, shots):
+        if num_bits >= 63:
+            return super().sample(num_bits, shots)
+        STATS.record_run(shots)
+        with STATS.timer("run", shots=shots):
+            return self._rng.integers(0, 1 << num_bits, size=shots, dtype=np.int64)
+
+
+@register_backend
+class UrandomBackend(EntropyBackend):
+    name = "urandom"
+    quality = "os"
+
+    def __init__(self, seed=None):
+        """Backend built on os.urandom (the seed is ignored, it can't be seeded)"""
+
+    def random_bytes(self, num_bytes):
+        STATS.record_run(num_bytes)
+        with STATS.timer("run", shots=num_bytes):
+            return np.frombuffer(os.urandom(num_bytes), dtype=np.uint8)
+
+
+def backend_names(available_only=True):
+    """
+    Names of the registered backends
+
+    Parameters:
+    available_only (bool): Leave out backends that can't run here
+
+    Returns:
+    list: Backend names
+    """
+    return [name for name, cls in _registry.items() if not available_only or cls.available()]
+
+
+def calibrate(min_quality="pseudo", num_bytes=16384, names=None):
+    """
+    Measure how fast each backend produces random bits
+
+    Parameters:
+    min_quality (str): Lowest quality level allowed (see QUALITY_LEVELS)
+    num_bytes (int): Bytes to generate per backend for the measurement
+    names (list): Backends to measure (default: every available one)
+
+    Returns:
+    tuple: (name of the fastest backend meeting min_quality, dict of
+        name -> bits per second for every backend measured)
+    """
+    if min_quality not in QUALITY_LEVELS:
+        raise ValueError(f"Invalid quality. Choose from: {', '.join(QUALITY_LEVELS)}")
+
+    rates = {}
+    for name in names or backend_names():
+        cls = _registry[name]
+        if QUALITY_LEVELS[cls.quality] < QUALITY_LEVELS[min_quality]:
+            continue
+        backend = cls()
+        # Warm up first, so one-off setup (imports, circuit building) isn't counted
+        backend.random_bytes(64)
+        start = time.perf_counter()
+        backend.random_bytes(num_bytes)
+        elapsed = time.perf_counter() - start
+        rates[name] = num_bytes * 8 / max(elapsed, 1e-9)
+
+    if not rates:
+        raise ValueError(f"No available backend has quality '{min_quality}' or better")
+    return max(rates, key=rates.get), rates
+
+
+@lru_cache(maxsize=None)
+def _calibrated_choice(min_quality):
+    """Calibrate once per process for every quality policy that gets asked for"""
+    return calibrate(min_quality)[0]
+
+
+def create_backend(name=None, seed=None, min_quality=None):
+    """
+    Create a backend by name
+
+    Parameters:
+    name (str): Registered backend name, or "auto" to pick the fastest one that
+        meets min_quality. Defaults to the QUANTUM_DICE_BACKEND environment
+        variable, or "sampler" if that isn't set.
+    seed (int): Seed for backends that support it
+    min_quality (str): Quality policy for "auto" (defaults to the
+        QUANTUM_DICE_MIN_QUALITY environment variable, or "pseudo")
+
+    Returns:
+    EntropyBackend: The new backend
+    """
+    name = name or os.environ.get("QUANTUM_DICE_BACKEND", DEFAULT_BACKEND)
+    if name == "auto":
+        name = _calibrated_choice(min_quality or os.environ.get("QUANTUM_DICE_MIN_QUALITY", "pseudo"))
+
+    if name not in _registry:
+        raise ValueError(f"Invalid backend. Choose from: {', '.join(backend_names(False))}, auto")
+    if not _registry[name].available():
+        raise ValueError(f"The {name} backend isn't available (is its package installed?)")
+    return _registry[name](seed=seed)
+
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+
+def get_default_backend():
+    """
+    Get the shared backend configured by the environment, creating it on first use
+
+    Setting QUANTUM_DICE_RECORD or QUANTUM_DICE_REPLAY to a tape path records
+    or replays it (see tapes.py).
+
+    Returns:
+    EntropyBackend: The backend used when none is given explicitly
+    """
+    global _default_backend
+    if _default_backend is None:
+        with _default_backend_lock:
+            if _default_backend is None:
+                # Imported here since tapes.py builds on this module
+                from Quantum_Dice_With_Luck_Bias.tapes import wrap_from_env
+                _default_backend = wrap_from_env(create_backend())
+    return _default_backend
@@ -0,0 +1,262 @@
+"""
+Luck bias weights and precomputed alias tables for biased rolls
+
+Rolling a biased die used to mean recomputing the face weights, building a
+cumulative sum and scanning it face by face on every roll, with the random
+value quantized to 1/1000. Here the weights are computed once per
+(die_size, luck) and turned into a Walker/Vose alias table with integer
+thresholds, so a biased roll is just:
+
+    face = column if threshold_bits < threshold[column] else alias[column]
+
+for a uniform column and `precision_bits` uniform threshold bits. That works
+on whole NumPy arrays of draws at once, and the resulting distribution is
+exact to 2**-precision_bits (per column). Tables get a power-of-two number of
+columns (the extra ones share out the real faces), so a column is just a
+few raw random bits and never has to be rejected and drawn again.
+
+Tables live in a memory-bounded LRU cache (see table_cache.py): with dN dice,
+custom dice and fractional luck there's no limit to how many different tables
+can be asked for, so the least recently used ones make way past the budget.
+"""
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.table_cache import bounded_cache
+
+# Number of uniform bits used to pick between a column and its alias
+DEFAULT_PRECISION_BITS = 16
+
+# Memory the cached alias tables may use (every column costs 16 bytes, so a
+# d1000000 table is about 16 MB)
+ALIAS_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def check_luck(luck):
+    """Raise a ValueError unless luck is between 1 and 10 (fractions like 6.5 are fine)"""
+    if not 1 <= luck <= 10:
+        raise ValueError("Luck must be between 1 and 10")
+
+
+def calculate_bias(luck, die_size):
+    """
+    Calculate the probability of each face based on luck (1-10, fractions work too)
+    luck = 5 means no bias (50/50)
+    luck < 5 biases toward lower numbers
+    luck > 5 biases toward higher numbers
+
+    Returns:
+    numpy.ndarray: Probability of each face (index 0 is face 1), sums to 1
+    """
+    # Convert luck to a scale from -0.4 to 0.4 (0 is neutral)
+    # This gives us a moderate range of bias without being too extreme
+    # any higher of a bias gives us very skewed distributions, setting
+    # probability of some faces almost to 0 if were not careful
+    bias = (luck - 5) / 10
+
+    # Normalized position of every face in the range (0 to 1)
+    if die_size > 1:
+        position = np.arange(die_size) / (die_size - 1)
+    else:
+        position = np.full(die_size, 0.5)
+
+    # Every face of the die starts with a weight of 1, then we apply a bias
+    # that increases or decreases based on position of the face and luck modifier
+    # (positive bias increases probability of higher numbers)
+    weights = 1 + bias * (2 * position - 1)
+    """
+    Much needed example for this calculation:
+    die_size = 6 / luck modifier = 8
+    this gives a bias of 0.3
+    initial face weights = [1, 1, 1, 1, 1, 1]
+    weights += bias * (2 * position - 1) = 0.3 * (2 * [0, 1, 2, 3, 4, 5]/5 - 1)
+    weights AFTER bias calculation = [0.7, 0.82, 0.94, 1.06, 1.18, 1.3]
+    """
+
+    # Ensure all weights are positive
+    weights = np.maximum(weights, 0.1)
+
+    # Normalize weights to sum to 1
+    return weights / np.sum(weights)
+
+
+class AliasTable:
+    def __init__(self, probabilities, precision_bits=DEFAULT_PRECISION_BITS):
+        """
+        Build a Vose alias table with integer thresholds
+
+        The table has num_columns = the next power of two columns: the columns
+        past the last face start out with weight 0, so they only ever hold
+        parts of real faces (their threshold is 0 and the alias does the work).
+
+        Parameters:
+        probabilities (array): Probability of each face (should sum to 1)
+        precision_bits (int): Number of uniform bits used per threshold (1-62)
+        """
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        num_faces = len(probabilities)
+        column_bits = (num_faces - 1).bit_length()
+        num_columns = 1 << column_bits
+        scale = 1 << precision_bits
+
+        # Scale the probabilities to integers that add up to exactly
+        # num_columns * scale, handing the rounding leftovers to the faces
+        # with the biggest remainders (never to a face with weight 0)
+        scaled = np.zeros(num_columns)
+        scaled[:num_faces] = probabilities / probabilities.sum() * num_columns * scale
+        weights = np.floor(scaled).astype(np.int64)
+        shortfall = num_columns * scale - int(weights.sum())
+        if shortfall > 0:
+            weights[np.argsort(weights - scaled)[:shortfall]] += 1
+
+        # Every column starts out pointing at itself
+        threshold = np.full(num_columns, scale, dtype=np.int64)
+        alias = np.arange(num_columns, dtype=np.int64)
+
+        small = [i for i in range(num_columns) if weights[i] < scale]
+        large = [i for i in range(num_columns) if weights[i] >= scale]
+        weights = weights.tolist()
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            # Column s keeps its own face for weights[s] of the scale and
+            # gives the rest of the column to face l
+            threshold[s] = weights[s]
+            alias[s] = l
+            weights[l] -= scale - weights[s]
+            if weights[l] < scale:
+                small.append(l)
+            else:
+                large.append(l)
+        # Whatever's left is exactly full (integer weights, so no float drift)
+
+        self.num_faces = num_faces
+        self.column_bits = column_bits
+        self.num_columns = num_columns
+        self.precision_bits = precision_bits
+        self.threshold = threshold
+        self.alias = alias
+
+    def probabilities(self):
+        """
+        The exact distribution this table samples from
+
+        Returns:
+        numpy.ndarray: Probability of each face
+        """
+        scale = 1 << self.precision_bits
+        probs = self.threshold.astype(np.float64)
+        np.add.at(probs, self.alias, scale - self.threshold)
+        # The padding columns never come out as faces themselves
+        return probs[:self.num_faces] / (self.num_columns * scale)
+
+    def sample(self, columns, threshold_bits):
+        """
+        Turn uniform draws into faces
+
+        Parameters:
+        columns (array): Uniform ints from 0 to num_columns - 1
+        threshold_bits (array): Uniform ints with precision_bits bits each
+
+        Returns:
+        numpy.ndarray: Faces (0-based, same shape as columns)
+        """
+        columns = np.asarray(columns, dtype=np.int64)
+        keep = np.asarray(threshold_bits, dtype=np.int64) < self.threshold[columns]
+        return np.where(keep, columns, self.alias[columns])
+
+    def sample_lazily(self, columns, draw_bits, chunk_bits=1, first_bits=None, first_width=None):
+        """
+        Same as sample(), but only draws the threshold bits it actually needs
+
+        Comparing a uniform precision_bits-bit number with a column's threshold
+        is decided at the first bit (from the top) where the two differ, which
+        on average is the second one, so most rolls need about 2 threshold bits
+        instead of all of them. Full columns (threshold == 2**precision_bits)
+        and empty ones (threshold 0) don't need any. The faces come out exactly
+        as with sample(), since the bits drawn are just the top bits of the
+        same uniform number.
+
+        Parameters:
+        columns (array): Uniform ints from 0 to num_columns - 1
+        draw_bits (callable): draw_bits(width, n) -> n uniform width-bit ints
+        chunk_bits (int): Threshold bits drawn per round
+        first_bits (array): The first threshold bits of every roll, if they
+            were already drawn (e.g. together with the column)
+        first_width (int): How many bits first_bits holds (default chunk_bits)
+
+        Returns:
+        numpy.ndarray: Faces (0-based, same shape as columns)
+        """
+        columns = np.asarray(columns, dtype=np.int64)
+        thresholds = self.threshold[columns]
+        keep = thresholds >= 1 << self.precision_bits
+        pending = np.flatnonzero(~keep & (thresholds > 0))
+        if first_bits is not None:
+            first_bits = np.asarray(first_bits, dtype=np.int64)[pending]
+
+        shift = self.precision_bits
+        while len(pending) and shift > 0:
+            if first_bits is not None:
+                width = min(first_width or chunk_bits, shift)
+                bits = first_bits >> ((first_width or chunk_bits) - width)
+                first_bits = None
+            else:
+                width = min(chunk_bits, shift)
+                bits = np.asarray(draw_bits(width, len(pending)), dtype=np.int64)
+            shift -= width
+            target = (thresholds[pending] >> shift) & ((1 << width) - 1)
+            decided = bits != target
+            keep[pending[decided]] = bits[decided] < target[decided]
+            pending = pending[~decided]
+        # Whatever's still pending drew exactly the threshold, which isn't below it
+        return np.where(keep, columns, self.alias[columns])
+
+
+def weighted_bias(luck, weights):
+    """
+    Face probabilities for a die whose faces have weights of their own
+
+    The luck bias is applied on top of the weights, in the order the faces are
+    listed (luck > 5 favours the faces at the end of the list).
+
+    Parameters:
+    luck (float): Luck modifier from 1-10
+    weights (list): Non-negative weight of every face
+
+    Returns:
+    numpy.ndarray: Probability of each face, sums to 1
+    """
+    probabilities = np.asarray(weights, dtype=np.float64) * calculate_bias(luck, len(weights))
+    return probabilities / probabilities.sum()
+
+
+@bounded_cache(ALIAS_CACHE_BYTES)
+def get_alias_table(die_size, luck, precision_bits=DEFAULT_PRECISION_BITS):
+    """
+    Get the (cached) alias table for a die and luck value
+
+    Parameters:
+    die_size (int): Number of faces
+    luck (float): Luck modifier from 1-10
+    precision_bits (int): Number of uniform bits used per threshold
+
+    Returns:
+    AliasTable: Table sampling calculate_bias(luck, die_size)
+    """
+    return AliasTable(calculate_bias(luck, die_size), precision_bits)
+
+
+@bounded_cache(ALIAS_CACHE_BYTES)
+def get_weighted_alias_table(weights, luck, precision_bits=DEFAULT_PRECISION_BITS):
+    """
+    Get the (cached) alias table for a die with weighted faces
+
+    Parameters:
+    weights (tuple): Weight of every face (a tuple, so it can be a cache key)
+    luck (float): Luck modifier from 1-10
+    precision_bits (int): Number of uniform bits used per threshold
+
+    Returns:
+    AliasTable: Table sampling weighted_bias(luck, weights)
+    """
+    return AliasTable(weighted_bias(luck, weights), precision_bits)
@@ -0,0 +1,238 @@
+"""
+Entropy-efficient sampling of dice values from a stream of random bits
+
+Plain rejection sampling throws bits away: a d100 measures 7 qubits and
+rejects 28 of the 128 outcomes, and a rejected draw takes all 7 bits with it.
+Since every circuit execution is expensive, the EntropyEfficientSampler tries
+to get as many rolls as possible out of every measured bit:
+
+- Batches pack several rolls into one wider draw. Three d6 fit in 8 bits
+  (6**3 = 216 <= 256), and five d6 fit in 13 bits with only 5% rejected.
+  Digits that weren't needed by this batch are kept for the next one.
+- Single rolls use a running (value, range) state that keeps the leftover
+  randomness after a rejection instead of throwing it away, so over many
+  rolls they only cost about log2(die_size) bits each.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.instrumentation import STATS
+
+# Largest word we pack rolls into (so words always fit in a uint64)
+MAX_WORD_BITS = 63
+
+# Bytes fetched from the source in one go when the bit reservoir runs dry
+REFILL_BYTES = 1024
+
+
+# Any dN can be rolled, so only the most recent plans are kept
+@lru_cache(maxsize=1024)
+def _packing_plan(die_size):
+    """
+    Work out the cheapest way to pack rolls of a die into one word
+
+    Returns:
+    tuple: (rolls per word, bits per word, number of accepted word values)
+    """
+    best = None
+    rolls = 1
+    while die_size ** rolls < 2 ** (MAX_WORD_BITS - 1):
+        outcomes = die_size ** rolls
+        min_bits = max(1, (outcomes - 1).bit_length())
+        # A couple of extra bits lets us fit more copies of the outcomes in one
+        # word, which can reject less often
+        for word_bits in range(min_bits, min(min_bits + 3, MAX_WORD_BITS + 1)):
+            accepted = (2 ** word_bits // outcomes) * outcomes
+            cost = word_bits * 2 ** word_bits / (rolls * accepted)  # expected bits per roll
+            if best is None or cost < best[0]:
+                best = (cost, rolls, word_bits, accepted)
+        if die_size == 1:
+            break
+        rolls += 1
+    return best[1:]
+
+
+class EntropyEfficientSampler:
+    def __init__(self, source):
+        """
+        Create a sampler that draws dice values while wasting as few bits as possible
+
+        Parameters:
+        source (callable): Function taking a byte count and returning that many
+            random bytes as a uint8 array (e.g. EntropyPool.take_bytes)
+        """
+        self._source = source
+        # Unpacked random bits (one 0/1 per entry) that haven't been used yet
+        self._bits = np.empty(0, dtype=np.uint8)
+        self._bit_pos = 0
+        # Uniform value in [0, _state_range) built from leftover randomness
+        self._state_value = 0
+        self._state_range = 1
+        # Already-paid-for rolls left over from packed words, per die size
+        self._spare = {}
+
+        # Counters
+        self.bits_consumed = 0
+        self.values_produced = 0
+
+    def bits_per_value(self):
+        """
+        Average number of random bits used for each value handed out
+
+        Returns:
+        float: Bits consumed per roll so far (0 if nothing has been rolled)
+        """
+        if self.values_produced == 0:
+            return 0.0
+        return self.bits_consumed / self.values_produced
+
+    def reset_counters(self):
+        """Reset the bits consumed / values produced counters"""
+        self.bits_consumed = 0
+        self.values_produced = 0
+
+    def _take_bits(self, count):
+        """Take count random bits (as a 0/1 uint8 array) from the reservoir"""
+        have = len(self._bits) - self._bit_pos
+        if have < count:
+            num_bytes = max(REFILL_BYTES, (count - have + 7) // 8)
+            fresh = np.unpackbits(np.asarray(self._source(num_bytes), dtype=np.uint8))
+            self._bits = np.concatenate([self._bits[self._bit_pos:], fresh])
+            self._bit_pos = 0
+        bits = self._bits[self._bit_pos:self._bit_pos + count]
+        self._bit_pos += count
+        self.bits_consumed += count
+        return bits
+
+    def _take_words(self, word_bits, count):
+        """Take count words of word_bits random bits each"""
+        bits = self._take_bits(word_bits * count).reshape(count, word_bits).astype(np.uint64)
+        words = np.zeros(count, dtype=np.uint64)
+        for i in range(word_bits):
+            words = (words << np.uint64(1)) | bits[:, i]
+        return words
+
+    def bits(self, num_bits, n):
+        """
+        Draw n raw uniform values of num_bits bits each (no rejection needed)
+
+        These are helper bits (e.g. the threshold bits of a biased roll), not
+        dice values, so they count towards bits_consumed but not values_produced.
+
+        Parameters:
+        num_bits (int): Bits per value (1-63)
+        n (int): Number of values to draw
+
+        Returns:
+        numpy.ndarray: n random values (int64)
+        """
+        return self._take_words(num_bits, n).astype(np.int64)
+
+    def _absorb(self, value, value_range):
+        """Mix a leftover uniform value in [0, value_range) into the running state"""
+        # Don't let the state grow forever; past 64 bits it's plenty for any die
+        if value_range > 1 and self._state_range < 2 ** 64:
+            self._state_value = self._state_value * value_range + value
+            self._state_range *= value_range
+
+    def uniform_one(self, die_size):
+        """
+        Draw one uniform value from 0 to die_size - 1
+
+        Parameters:
+        die_size (int): Number of possible values
+
+        Returns:
+        int: The random value
+        """
+        spare = self._spare.get(die_size)
+        if spare is not None and len(spare):
+            self._spare[die_size] = spare[1:]
+            self.values_produced += 1
+            return int(spare[0])
+
+        while True:
+            # Make sure the state has plenty more outcomes than the die does
+            while self._state_range < die_size << 32:
+                word = int(self._take_words(32, 1)[0])
+                self._state_value = (self._state_value << 32) | word
+                self._state_range <<= 32
+
+            copies = self._state_range // die_size
+            if self._state_value < copies * die_size:
+                # Accepted: the value is uniform over the die, and what's left
+                # (which copy we landed in) is still uniform over `copies`
+                result = self._state_value % die_size
+                self._state_value //= die_size
+                self._state_range = copies
+                self.values_produced += 1
+                return result
+
+            # Rejected: keep the leftover randomness instead of starting over
+            STATS.count("rejected_outcomes")
+            self._state_value -= copies * die_size
+            self._state_range -= copies * die_size
+
+    def uniform(self, die_size, n):
+        """
+        Draw n uniform values from 0 to die_size - 1, packing several per word
+
+        Parameters:
+        die_size (int): Number of possible values
+        n (int): Number of values to draw
+
+        Returns:
+        numpy.ndarray: n random values (int64)
+        """
+        if die_size < 1:
+            raise ValueError("Die size must be at least 1")
+
+        results = np.empty(n, dtype=np.int64)
+        filled = 0
+
+        # Use up the rolls left over from the last batch first
+        spare = self._spare.pop(die_size, None)
+        if spare is not None and len(spare):
+            used = min(n, len(spare))
+            results[:used] = spare[:used]
+            filled = used
+            if used < len(spare):
+                self._spare[die_size] = spare[used:]
+
+        rolls_per_word, word_bits, accepted = _packing_plan(die_size)
+        outcomes = die_size ** rolls_per_word
+        while filled < n:
+            remaining = n - filled
+            num_words = -(-remaining // rolls_per_word)
+            # Ask for a few extra words to cover the ones we expect to reject
+            num_words = int(num_words * 2 ** word_bits / accepted) + 1
+            words = self._take_words(word_bits, num_words)
+
+            keep = words < np.uint64(accepted)
+            rejected = words[~keep]
+            STATS.count("rejected_outcomes", len(rejected))
+            if len(rejected) and accepted < 2 ** word_bits:
+                # A rejected word is still uniform over the values we rejected,
+                # so hand that leftover randomness to the single-roll state
+                # (only a few are needed, the state stops growing past 64 bits anyway)
+                leftover = 2 ** word_bits - accepted
+                for word in rejected[:4].tolist():
+                    self._absorb(word - accepted, leftover)
+
+            # Split each accepted word into its base-die_size digits (one per roll)
+            packed = words[keep] % np.uint64(outcomes)
+            digits = np.empty((len(packed), rolls_per_word), dtype=np.int64)
+            for i in range(rolls_per_word):
+                digits[:, i] = packed % np.uint64(die_size)
+                packed //= np.uint64(die_size)
+            digits = digits.ravel()
+
+            used = min(remaining, len(digits))
+            results[filled:filled + used] = digits[:used]
+            filled += used
+            if used < len(digits):
+                self._spare[die_size] = digits[used:]
+
+        self.values_produced += n
+        return results
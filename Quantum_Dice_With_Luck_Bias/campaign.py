@@ -0,0 +1,320 @@
+"""
+Monte Carlo campaign simulator: millions of encounters, spread over every core
+
+Balancing a game means questions like "with luck 3, how much damage does a +5
+attack with 2d6+3 do against AC 15?", answered over millions of encounters and
+for several luck settings. One roll_die call per die can't get anywhere near
+that, so a scenario here is a function that plays n encounters at once on
+NumPy arrays:
+
+    def scenario(dice, luck, n):
+        ...
+        return {"hit": hit, "damage": damage}   # one array of n values per metric
+
+Campaign cuts the encounters into chunks and runs them on a process pool.
+Every worker process builds its own QuantumDice (so its own entropy backend,
+from its own seed) once, and writes each chunk's results into a shared-memory
+buffer instead of pickling millions of values back to the parent. The parent
+folds every finished chunk into running statistics (count, mean, std, min,
+max per metric and luck) and hands the buffer slot to the next chunk, so the
+memory used doesn't grow with the number of encounters and results can be
+shown while the campaign is still running.
+
+to run (from the project root) -
+    python -m Quantum_Dice_With_Luck_Bias campaign --attack 5 --ac 15 --damage 2d6+3 --luck 3 5 7 -n 10000000
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.bias_tables import check_luck
+from Quantum_Dice_With_Luck_Bias.dice_expressions import DiceExpression, roll_expressions
+
+
+class RunningStats:
+    def __init__(self):
+        """Count, mean, variance, min and max of a stream of values, updated one batch at a time"""
+        self.count = 0
+        self.mean = 0.0
+        # Sum of squared differences from the mean (Welford / Chan et al.)
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        """Add a batch of values"""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        mean = values.mean()
+        self._merge(len(values), mean, float(((values - mean) ** 2).sum()),
+                    values.min(), values.max())
+
+    def merge(self, other):
+        """Add everything another RunningStats has seen"""
+        if other.count:
+            self._merge(other.count, other.mean, other.m2, other.min, other.max)
+
+    def _merge(self, count, mean, m2, low, high):
+        """Combine two sets of moments without going back to the values"""
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        self.min = min(self.min, float(low))
+        self.max = max(self.max, float(high))
+
+    def std(self):
+        """Standard deviation of the values so far"""
+        return float(np.sqrt(self.m2 / self.count)) if self.count else 0.0
+
+    def stderr(self):
+        """Standard error of the mean (how far the mean could still move)"""
+        return self.std() / np.sqrt(self.count) if self.count else 0.0
+
+    def summary(self):
+        return {"count": self.count, "mean": float(self.mean), "std": self.std(),
+                "stderr": float(self.stderr()), "min": self.min, "max": self.max}
+
+
+class AttackScenario:
+    # Names of the arrays every call returns
+    metrics = ("hit", "crit", "damage")
+
+    def __init__(self, attack_bonus=5, armor_class=15, damage="2d6+3", crit_range=20):
+        """
+        An attack roll against an armor class, then damage if it hits
+
+        A natural 1 always misses, a natural crit_range or higher always hits
+        and rolls the damage dice twice (the bonus is only added once).
+
+        Parameters:
+        attack_bonus (int): Added to the d20 attack roll
+        armor_class (int): Total the attack has to reach to hit
+        damage (str): Damage dice expression, e.g. "2d6+3" or "1d8+1d6+4"
+        crit_range (int): Lowest natural d20 that is a critical hit
+        """
+        self.attack_bonus = attack_bonus
+        self.armor_class = armor_class
+        self.damage = DiceExpression(damage)
+        self.crit_range = crit_range
+        # The extra dice of a critical hit, without the damage bonus
+        self.crit_dice = "".join(str(term) for term in self.damage.dice_terms()).lstrip("+") or "0"
+
+    def __call__(self, dice, luck, n):
+        # All three are drawn together, with one batched roll per die type
+        d20, damage, crit_damage = roll_expressions(dice, ["1d20", self.damage, self.crit_dice], n, luck)
+        crit = d20 >= self.crit_range
+        hit = crit | ((d20 != 1) & (d20 + self.attack_bonus >= self.armor_class))
+        damage = np.where(hit, damage + np.where(crit, crit_damage, 0), 0)
+        return {"hit": hit, "crit": crit, "damage": damage}
+
+
+class Campaign:
+    def __init__(self, dice, scenario, luck_values=(5,), encounters=1000000, chunk_size=100000):
+        """
+        Play a scenario for many encounters at several luck values
+
+        Parameters:
+        dice (QuantumDice): The dice whose settings (backend, efficient, custom
+            dice, ...) every worker copies
+        scenario (callable): scenario(dice, luck, n) -> dict of n values per
+            metric. Must be picklable (e.g. a module-level function or an
+            AttackScenario) to run on a process pool
+        luck_values (list): Luck values to play every encounter at
+        encounters (int): Number of encounters per luck value
+        chunk_size (int): Number of encounters a worker plays at once
+        """
+        if encounters < 0:
+            raise ValueError("Number of encounters can't be negative")
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be at least 1")
+        for luck in luck_values:
+            check_luck(luck)
+
+        self.dice = dice
+        self.scenario = scenario
+        self.luck_values = list(luck_values)
+        self.encounters = encounters
+        self.chunk_size = chunk_size
+        self.metrics = self._metric_names()
+        # luck -> metric -> RunningStats
+        self.stats = {luck: {metric: RunningStats() for metric in self.metrics}
+                      for luck in self.luck_values}
+
+    def _metric_names(self):
+        """The metrics the scenario reports, asking it for one encounter if it doesn't say"""
+        metrics = getattr(self.scenario, "metrics", None)
+        if metrics is None:
+            metrics = sorted(self.scenario(self.dice, 5, 1))
+        return tuple(metrics)
+
+    def summary(self):
+        """
+        The statistics so far
+
+        Returns:
+        dict: luck -> metric -> {count, mean, std, stderr, min, max}
+        """
+        return {luck: {metric: stats.summary() for metric, stats in metrics.items()}
+                for luck, metrics in self.stats.items()}
+
+    def _chunks(self):
+        """(luck, n) for every chunk, taking turns between luck values so they all make progress"""
+        for start in range(0, self.encounters, self.chunk_size):
+            for luck in self.luck_values:
+                yield luck, min(self.chunk_size, self.encounters - start)
+
+    def _add(self, luck, results):
+        for metric in self.metrics:
+            self.stats[luck][metric].update(results[metric])
+
+    def run(self, workers=None):
+        """
+        Play every encounter, one chunk at a time
+
+        Yields after every chunk so the caller can show progress or partial
+        results (they're in self.stats).
+
+        Parameters:
+        workers (int): Number of worker processes (None uses every CPU core,
+            1 plays everything in this process)
+
+        Yields:
+        int: Number of encounters played so far (over all luck values)
+        """
+        workers = workers or os.cpu_count() or 1
+        done = 0
+
+        options = self.dice.worker_options()
+        if workers == 1 or options is None:
+            for luck, n in self._chunks():
+                self._add(luck, self.scenario(self.dice, luck, n))
+                done += n
+                yield done
+            return
+
+        # Two buffer slots per worker, so a worker never waits on the parent
+        # to read its last chunk before it can start the next one
+        slots = 2 * workers
+        buffer = shared_memory.SharedMemory(
+            create=True, size=slots * len(self.metrics) * self.chunk_size * 8)
+        # Spawn fresh workers instead of forking: a fork copies this process
+        # mid-flight, including locks held by the entropy pool or roll service
+        # threads, which can deadlock the worker that inherits them
+        context = multiprocessing.get_context("spawn")
+        # Every worker gets its own seed for its own backend
+        seeds = context.Queue()
+        for seed in self.dice._seed_sequence.spawn(workers):
+            seeds.put(seed)
+        options.update(buffer=buffer.name, shape=(slots, len(self.metrics), self.chunk_size),
+                       metrics=self.metrics)
+        results = np.ndarray(options["shape"], dtype=np.float64, buffer=buffer.buf)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_start_worker,
+                                     initargs=(seeds, options)) as pool:
+                chunks = self._chunks()
+                free = list(range(slots))
+                running = {}
+                while True:
+                    # Keep every free slot busy
+                    while free:
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            break
+                        slot = free.pop()
+                        future = pool.submit(_play_chunk, self.scenario, chunk[0], chunk[1], slot)
+                        running[future] = (slot, chunk)
+                    if not running:
+                        break
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        slot, (luck, n) = running.pop(future)
+                        future.result()
+                        self._add(luck, dict(zip(self.metrics, results[slot, :, :n])))
+                        free.append(slot)
+                        done += n
+                        yield done
+        finally:
+            # Drop our view before closing, or the buffer can't be released
+            del results
+            buffer.close()
+            buffer.unlink()
+
+
+# The dice and shared buffer of a worker process, set up once by _start_worker
+_worker = {}
+
+
+def _start_worker(seeds, options):
+    """Give a worker process its own dice (and backend) and attach the shared result buffer"""
+    # Imported here to avoid a circular import (quantum_dice doesn't need us)
+    from Quantum_Dice_With_Luck_Bias.quantum_dice import worker_dice
+
+    dice = worker_dice(options, seeds.get())
+
+    # Worker processes share the parent's resource tracker, so attaching here
+    # doesn't stop the parent from unlinking the buffer once the campaign is done
+    buffer = shared_memory.SharedMemory(name=options["buffer"])
+    _worker["dice"] = dice
+    _worker["buffer"] = buffer
+    _worker["results"] = np.ndarray(options["shape"], dtype=np.float64, buffer=buffer.buf)
+    _worker["metrics"] = options["metrics"]
+
+
+def _play_chunk(scenario, luck, n, slot):
+    """Play n encounters in a worker and write the results into the shared buffer slot"""
+    results = scenario(_worker["dice"], luck, n)
+    for index, metric in enumerate(_worker["metrics"]):
+        _worker["results"][slot, index, :n] = results[metric]
+    return n
+
+
+def print_summary(campaign):
+    """Print a campaign's statistics, one block per luck value"""
+    for luck, metrics in campaign.summary().items():
+        print(f"--- luck {luck} ---")
+        for metric, stats in metrics.items():
+            print(f"{metric}: mean {stats['mean']:.4f} ± {stats['stderr']:.4f} "
+                  f"(std {stats['std']:.3f}, min {stats['min']:g}, max {stats['max']:g}, "
+                  f"{stats['count']} encounters)")
+
+
+def main(argv=None):
+    """Run an attack campaign from the command line"""
+    import argparse
+    import time
+
+    from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+
+    parser = argparse.ArgumentParser(prog="python -m Quantum_Dice_With_Luck_Bias campaign",
+                                     description="Simulate many attack rolls at several luck values")
+    parser.add_argument("--attack", type=int, default=5, help="attack bonus (default 5)")
+    parser.add_argument("--ac", type=int, default=15, help="armor class to hit (default 15)")
+    parser.add_argument("--damage", default="2d6+3", help="damage dice (default 2d6+3)")
+    parser.add_argument("--crit-range", type=int, default=20, help="lowest natural d20 that crits (default 20)")
+    parser.add_argument("--luck", type=float, nargs="+", default=[5], help="luck values to simulate")
+    parser.add_argument("-n", "--encounters", type=int, default=1000000,
+                        help="encounters per luck value (default 1000000)")
+    parser.add_argument("--chunk", type=int, default=100000, help="encounters per worker chunk")
+    parser.add_argument("--workers", type=int, help="worker processes (default: every CPU core)")
+    parser.add_argument("--backend", help="entropy backend (default: QUANTUM_DICE_BACKEND or sampler)")
+    parser.add_argument("--efficient", action="store_true", help="use the entropy-efficient sampler")
+    args = parser.parse_args(argv)
+
+    dice = QuantumDice(backend=args.backend, efficient=args.efficient)
+    scenario = AttackScenario(args.attack, args.ac, args.damage, args.crit_range)
+    campaign = Campaign(dice, scenario, args.luck, args.encounters, args.chunk)
+
+    start = time.perf_counter()
+    total = args.encounters * len(args.luck)
+    for done in campaign.run(args.workers):
+        print(f"\r{done}/{total} encounters", end="", flush=True)
+    elapsed = time.perf_counter() - start
+    print(f"\nPlayed {total} encounters in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f}/s)")
+    print_summary(campaign)
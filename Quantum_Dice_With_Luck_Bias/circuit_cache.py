@@ -0,0 +1,280 @@
+"""
+Shared circuit cache and sampler for the quantum dice and rng helpers
+
+Building a fresh QuantumCircuit (and a fresh Sampler) for every roll costs more
+than simulating a handful of Hadamard qubits does. Every circuit we need only
+depends on how many qubits it measures, so we build each width once and hand
+the same circuit (and the same long-lived sampler) to every caller.
+
+qiskit takes a long time to import, so it's only imported the first time a
+circuit or sampler is actually needed (callers that only want numbers from
+e.g. a classical source or a recorded tape never pay for it).
+"""
+from functools import lru_cache
+import threading
+
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.bias_tables import calculate_bias
+from Quantum_Dice_With_Luck_Bias.instrumentation import STATS
+from Quantum_Dice_With_Luck_Bias.table_cache import bounded_cache
+
+# Widest circuit we ever simulate. Simulation cost doubles with every qubit
+# (a 16 qubit circuit takes a few hundred times longer than two 8 qubit ones),
+# so wider numbers are glued together from several circuits this size or smaller
+MAX_CIRCUIT_QUBITS = 8
+
+# Memory the cached biased and plan circuits may use. There's one circuit per
+# (die, luck), and with dN dice and fractional luck there's no end to those
+CIRCUIT_CACHE_BYTES = 32 * 1024 * 1024
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def split_bits(num_bits, max_qubits=None):
+    """
+    Split num_bits into circuit widths of at most max_qubits, as even as possible
+
+    Parameters:
+    num_bits (int): Total number of random bits needed
+    max_qubits (int): Widest circuit allowed (default MAX_CIRCUIT_QUBITS)
+
+    Returns:
+    list: Circuit widths adding up to num_bits, e.g. 20 bits -> [7, 7, 6]
+    """
+    max_qubits = max_qubits or MAX_CIRCUIT_QUBITS
+    if max_qubits < 1:
+        raise ValueError("max_qubits must be at least 1")
+    pieces = max(1, -(-num_bits // max_qubits))
+    base, extra = divmod(num_bits, pieces)
+    return [base + 1] * extra + [base] * (pieces - extra)
+
+
+def get_sampler():
+    """
+    Get the shared Sampler, creating it the first time it's needed
+
+    Returns:
+    Sampler: The sampler used for every roll in this process
+    """
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            # Check again in case another thread created it while we waited
+            if _sampler is None:
+                from qiskit.primitives import Sampler
+                _sampler = Sampler()
+    return _sampler
+
+
+@lru_cache(maxsize=None)
+def get_uniform_circuit(num_bits, backend=None):
+    """
+    Get the circuit that puts num_bits qubits in superposition and measures them
+
+    Parameters:
+    num_bits (int): Number of qubits (and classical bits) in the circuit
+    backend: Optional backend to transpile for. The reference Sampler runs the
+        circuit as-is, but real hardware/Aer backends need their own gate set.
+
+    Returns:
+    QuantumCircuit: The cached circuit (don't modify it!)
+    """
+    from qiskit import QuantumCircuit, transpile
+
+    with STATS.timer("build", circuit="uniform", num_bits=num_bits):
+        qc = QuantumCircuit(num_bits, num_bits)
+
+        # Apply Hadamard gates for pure 50/50 randomness
+        for i in range(num_bits):
+            qc.h(i)
+
+        # Measure all qubits
+        qc.measure(range(num_bits), range(num_bits))
+
+        if backend is not None:
+            qc = transpile(qc, backend)
+    STATS.count("circuits_built")
+    return qc
+
+
+# Used to put expanded shots back into a random order (see sample_uniform)
+_shot_order = np.random.default_rng()
+
+
+def circuit_size(qc):
+    """
+    Rough number of bytes a cached circuit holds on to
+
+    State preparation keeps all 2**num_qubits amplitudes as its parameters,
+    which is what makes wide biased circuits big; everything else is a few
+    hundred bytes per instruction.
+    """
+    size = 1024
+    for instruction in qc.data:
+        size += 512 + 16 * len(instruction.operation.params)
+    return size
+
+
+@bounded_cache(CIRCUIT_CACHE_BYTES, circuit_size)
+def get_biased_circuit(die_size, luck):
+    """
+    Get the circuit whose measurement outcomes follow the luck-biased distribution
+
+    Instead of sampling uniformly and post-processing on the CPU, the amplitude
+    of basis state i is set to sqrt(probability of face i + 1). State
+    preparation for real amplitudes is a tree of RY rotations (plus CNOTs), and
+    the padding states past the last face get amplitude 0, so no outcome ever
+    has to be rejected.
+
+    Parameters:
+    die_size (int): Number of faces
+    luck (float): Luck modifier from 1-10 (fractions like 6.5 work too)
+
+    Returns:
+    QuantumCircuit: The cached circuit (don't modify it!)
+    """
+    from qiskit import QuantumCircuit
+    from qiskit.circuit.library import StatePreparation
+
+    num_bits = max(1, (die_size - 1).bit_length())
+    if num_bits > MAX_CIRCUIT_QUBITS:
+        # Preparing the state takes about 2**num_bits gates, and can't be split up
+        raise ValueError(f"A d{die_size} needs {num_bits} qubits, more than the "
+                         f"{MAX_CIRCUIT_QUBITS} a biased circuit can have")
+    with STATS.timer("build", circuit="biased", die_size=die_size, luck=luck):
+        amplitudes = np.zeros(2 ** num_bits)
+        amplitudes[:die_size] = np.sqrt(calculate_bias(luck, die_size))
+
+        qc = QuantumCircuit(num_bits, num_bits)
+        qc.append(StatePreparation(amplitudes / np.linalg.norm(amplitudes)), range(num_bits))
+        qc.measure(range(num_bits), range(num_bits))
+    STATS.count("circuits_built")
+    return qc
+
+
+@bounded_cache(CIRCUIT_CACHE_BYTES, circuit_size)
+def get_plan_circuit(dice):
+    """
+    Get one circuit that rolls several different dice at once (see roll_plan.py)
+
+    Every die gets its own qubits and its own classical register, in the order
+    given. Neutral dice (luck 5) put their qubits in an equal superposition
+    like get_uniform_circuit, lucky dice get the amplitudes of
+    get_biased_circuit (which never need rejecting).
+
+    Parameters:
+    dice (tuple): (die_size, luck) for every die (each at most MAX_CIRCUIT_QUBITS wide)
+
+    Returns:
+    QuantumCircuit: The cached circuit (don't modify it!)
+    """
+    from qiskit import ClassicalRegister, QuantumCircuit, QuantumRegister
+    from qiskit.circuit.library import StatePreparation
+
+    for die_size, luck in dice:
+        if (die_size - 1).bit_length() > MAX_CIRCUIT_QUBITS:
+            raise ValueError(f"A d{die_size} is too wide to go into a plan circuit")
+    with STATS.timer("build", circuit="plan", dice=dice):
+        qc = QuantumCircuit()
+        for i, (die_size, luck) in enumerate(dice):
+            num_bits = max(1, (die_size - 1).bit_length())
+            qr = QuantumRegister(num_bits, f"q{i}")
+            cr = ClassicalRegister(num_bits, f"c{i}")
+            qc.add_register(qr, cr)
+            if luck == 5:
+                qc.h(qr)
+            else:
+                amplitudes = np.zeros(2 ** num_bits)
+                amplitudes[:die_size] = np.sqrt(calculate_bias(luck, die_size))
+                qc.append(StatePreparation(amplitudes / np.linalg.norm(amplitudes)), qr)
+            qc.measure(qr, cr)
+    STATS.count("circuits_built")
+    return qc
+
+
+def make_seeded_sampler(seed):
+    """
+    Create a Sampler of our own whose shots are reproducible from a seed
+
+    Parameters:
+    seed: Anything numpy.random.default_rng accepts (int, SeedSequence, ...)
+
+    Returns:
+    tuple: (Sampler, numpy.random.Generator) - the generator drives the
+        sampler and should also be used to order its shots (see sample_circuit)
+    """
+    # The Sampler re-seeds from an int on every run (so every run would give the
+    # same shots), but a Generator carries on where the last run left off
+    from qiskit.primitives import Sampler
+
+    rng = np.random.default_rng(seed)
+    return Sampler(options={"seed": rng}), rng
+
+
+def sample_uniform(num_bits, shots, sampler=None, rng=None):
+    """
+    Measure num_bits Hadamard qubits `shots` times in a single sampler run
+
+    Parameters:
+    num_bits (int): Number of qubits to measure per shot
+    shots (int): Number of shots to run
+    sampler (Sampler): Sampler to use instead of the shared one
+    rng (numpy.random.Generator): Generator used to order the shots
+
+    Returns:
+    numpy.ndarray: One measured integer (0 to 2**num_bits - 1) per shot
+    """
+    return sample_circuit(get_uniform_circuit(num_bits), shots, sampler, rng)
+
+
+def sample_circuit(qc, shots, sampler=None, rng=None):
+    """
+    Run a measurement circuit `shots` times in a single sampler run
+
+    Parameters:
+    qc (QuantumCircuit): Circuit that measures all of its qubits
+    shots (int): Number of shots to run
+    sampler (Sampler): Sampler to use instead of the shared one
+    rng (numpy.random.Generator): Generator used to order the shots
+
+    Returns:
+    numpy.ndarray: One measured integer per shot
+    """
+    return sample_circuits([qc], shots, sampler, rng)[0]
+
+
+def sample_circuits(circuits, shots, sampler=None, rng=None):
+    """
+    Run several measurement circuits `shots` times each, all in a single sampler run
+
+    Parameters:
+    circuits (list): Circuits that measure all of their qubits
+    shots (int): Number of shots to run per circuit
+    sampler (Sampler): Sampler to use instead of the shared one
+    rng (numpy.random.Generator): Generator used to order the shots
+
+    Returns:
+    list: numpy.ndarray of measured integers for every circuit, in order
+    """
+    STATS.record_run(shots * len(circuits))
+    with STATS.timer("run", shots=shots * len(circuits)):
+        job = (sampler or get_sampler()).run(list(circuits), shots=shots)
+        result = job.result()
+
+    all_samples = []
+    with STATS.timer("parse", shots=shots * len(circuits)):
+        for quasi_dist in result.quasi_dists:
+            # The quasi-distribution maps each outcome to (count / shots), so
+            # multiplying back by shots gives us the count for every outcome
+            values = np.fromiter(quasi_dist.keys(), dtype=np.int64, count=len(quasi_dist))
+            probs = np.fromiter(quasi_dist.values(), dtype=np.float64, count=len(quasi_dist))
+            counts = np.rint(probs * shots).astype(np.int64)
+
+            # quasi_dists only keeps the counts and not the order the shots came in,
+            # so we shuffle the expanded outcomes back into a random sequence
+            samples = np.repeat(values, counts)
+            (rng or _shot_order).shuffle(samples)
+            all_samples.append(samples)
+    return all_samples
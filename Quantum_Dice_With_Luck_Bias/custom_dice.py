@@ -0,0 +1,86 @@
+"""
+Dice with custom faces and weights, made at runtime
+
+The standard dice only have faces 1 to N, all equally likely before luck.
+Game designers also want things like a Fudge die (-1, 0, +1), a loot die
+whose faces are item names, or a d6 where the 6 is twice as likely. A
+CustomDie holds its faces and (optional) weights; QuantumDice.add_die gives
+it a name so it can be rolled like any other die.
+
+Rolling works the same way as a lucky standard die: the luck bias is applied
+to the weights in the order the faces are listed, the result is turned into
+an alias table once (cached per weights and luck, see bias_tables.py), and
+every roll only picks a face index from that table.
+"""
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.bias_tables import (
+    calculate_bias, get_alias_table, get_weighted_alias_table, weighted_bias
+)
+
+
+class CustomDie:
+    def __init__(self, faces, weights=None):
+        """
+        Create a die with custom face values and/or weights
+
+        Parameters:
+        faces (int or list): Number of faces (faces 1 to N) or the value of
+            every face, e.g. [-1, 0, 1] or ["sword", "shield", "potion"]
+        weights (list): Optional non-negative weight of every face (before luck)
+        """
+        if isinstance(faces, (int, np.integer)):
+            faces = range(1, int(faces) + 1)
+        faces = list(faces)
+        if not faces:
+            raise ValueError("A die needs at least one face")
+
+        if weights is not None:
+            weights = tuple(float(w) for w in weights)
+            if len(weights) != len(faces):
+                raise ValueError(f"Got {len(weights)} weights for {len(faces)} faces")
+            if min(weights) < 0 or sum(weights) <= 0:
+                raise ValueError("Weights can't be negative and at least one has to be above 0")
+            # Equal weights are the same as no weights, and share the plain dN tables
+            if len(set(weights)) == 1:
+                weights = None
+
+        self.faces = faces
+        self.weights = weights
+        # Looking up faces by index works on whole arrays of rolls at once
+        self._face_values = np.asarray(faces)
+
+    @property
+    def num_faces(self):
+        return len(self.faces)
+
+    def probabilities(self, luck=5):
+        """
+        Chance of every face (in the order listed) at this luck
+
+        Returns:
+        numpy.ndarray: Probability of each face, sums to 1
+        """
+        if self.weights is None:
+            return calculate_bias(luck, self.num_faces)
+        return weighted_bias(luck, self.weights)
+
+    def alias_table(self, luck=5):
+        """The (cached) alias table picking face indices at this luck"""
+        if self.weights is None:
+            return get_alias_table(self.num_faces, luck)
+        return get_weighted_alias_table(self.weights, luck)
+
+    def face_values(self, indices):
+        """
+        Turn 0-based face indices into face values
+
+        Returns:
+        numpy.ndarray: The face value of every index
+        """
+        return self._face_values[indices]
+
+    def __repr__(self):
+        if self.weights is None:
+            return f"CustomDie({self.faces!r})"
+        return f"CustomDie({self.faces!r}, weights={list(self.weights)!r})"
@@ -0,0 +1,274 @@
+"""
+Tabletop dice notation (4d6kh3+2, 2d20kl1, 6d10>=8, ...) on top of QuantumDice
+
+An expression is a list of terms added together:
+
+- NdS        roll N dice with S sides (N defaults to 1, d% is a d100, any S works)
+- khK / klK  keep the highest / lowest K of them (k on its own means kh)
+- dhK / dlK  drop the highest / lowest K of them
+- >=T, >T, <=T, <T   dice pool: count the dice that succeed instead of adding them up
+- @L         luck 1-10 for just this term, e.g. @8 or @6.5 (otherwise the
+             expression's luck is used)
+- a plain number, e.g. the +2 in 4d6kh3+2
+
+Rolling never makes one roll_die call per die. Every term of every expression
+being rolled is planned first, the dice are grouped by (die, luck) and each
+group is drawn with a single batched roll_dice call. The keep/drop and pool
+rules are then applied to (rolls, dice) NumPy arrays, so rolling an expression
+10000 times costs about the same number of sampler runs as rolling it once.
+"""
+import re
+
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.bias_tables import check_luck
+
+# Most dice one term can roll, and the most sides a die can have (same as
+# QuantumDice.max_die_size), so a typo like 1000000d6 fails straight away
+MAX_DICE = 1000
+MAX_SIDES = 1000000
+
+# Most dice a single roll_expressions call draws (n times the dice in every expression)
+MAX_ROLLED_DICE = 10000000
+
+# One term, with an optional leading sign
+TERM_PATTERN = re.compile(
+    r"\s*(?P<sign>[+-])?\s*(?:"
+    r"(?P<count>\d*)d(?P<sides>\d+|%)"
+    r"(?:(?P<keep>kh|kl|dh|dl|k)(?P<keep_n>\d+))?"
+    r"(?:(?P<compare>>=|<=|>|<)(?P<target>\d+))?"
+    r"(?:@(?P<luck>\d+(?:\.\d+)?))?"
+    r"|(?P<constant>\d+))\s*",
+    re.IGNORECASE,
+)
+
+
+class DiceTerm:
+    def __init__(self, sign, count=0, sides=0, keep=None, keep_n=0,
+                 compare=None, target=0, luck=None, constant=0):
+        """
+        One term of a dice expression (either dice or a plain number)
+
+        Parameters:
+        sign (int): +1 or -1
+        count (int): Number of dice rolled (0 for a plain number)
+        sides (int): Sides on each die
+        keep (str): "kh", "kl", "dh", "dl" or None
+        keep_n (int): How many dice the keep/drop rule applies to
+        compare (str): ">=", ">", "<=", "<" for a dice pool, or None
+        target (int): Number a die has to beat (or stay under) to count as a success
+        luck (float): Luck for this term only, or None to use the expression's
+        constant (int): Value of a plain number term
+        """
+        self.sign = sign
+        self.count = count
+        self.sides = sides
+        self.keep = keep
+        self.keep_n = keep_n
+        self.compare = compare
+        self.target = target
+        self.luck = luck
+        self.constant = constant
+
+    @property
+    def is_dice(self):
+        return self.count > 0
+
+    def apply(self, rolls):
+        """
+        Work out this term's value for every row of rolls
+
+        Parameters:
+        rolls (numpy.ndarray): (expressions, count) array of die results
+
+        Returns:
+        numpy.ndarray: One value per row (with the sign applied)
+        """
+        if self.keep is not None:
+            rolls = np.sort(rolls, axis=1)
+            if self.keep == "kh":
+                rolls = rolls[:, self.count - self.keep_n:]
+            elif self.keep == "kl":
+                rolls = rolls[:, :self.keep_n]
+            elif self.keep == "dh":
+                rolls = rolls[:, :self.count - self.keep_n]
+            else:
+                rolls = rolls[:, self.keep_n:]
+
+        if self.compare == ">=":
+            values = np.count_nonzero(rolls >= self.target, axis=1)
+        elif self.compare == ">":
+            values = np.count_nonzero(rolls > self.target, axis=1)
+        elif self.compare == "<=":
+            values = np.count_nonzero(rolls <= self.target, axis=1)
+        elif self.compare == "<":
+            values = np.count_nonzero(rolls < self.target, axis=1)
+        else:
+            values = rolls.sum(axis=1)
+        return self.sign * values.astype(np.int64)
+
+    def __str__(self):
+        sign = "-" if self.sign < 0 else "+"
+        if not self.is_dice:
+            return f"{sign}{self.constant}"
+        text = f"{sign}{self.count}d{self.sides}"
+        if self.keep is not None:
+            text += f"{self.keep}{self.keep_n}"
+        if self.compare is not None:
+            text += f"{self.compare}{self.target}"
+        if self.luck is not None:
+            text += f"@{self.luck}"
+        return text
+
+
+class DiceExpression:
+    def __init__(self, text):
+        """
+        Parse a dice expression like "4d6kh3+2"
+
+        Parameters:
+        text (str): The expression (see the module docstring for the notation)
+        """
+        self.text = text
+        self.terms = parse(text)
+
+    def dice_terms(self):
+        """The terms that roll dice (leaving out plain numbers)"""
+        return [term for term in self.terms if term.is_dice]
+
+    def roll(self, dice, n=1, luck=5):
+        """
+        Roll the expression n times
+
+        Parameters:
+        dice (QuantumDice): The dice to roll with
+        n (int): Number of times to roll the whole expression
+        luck (float): Luck for every term that doesn't set its own
+
+        Returns:
+        numpy.ndarray: n totals
+        """
+        return roll_expressions(dice, [self], n, luck)[0]
+
+    def __str__(self):
+        return "".join(str(term) for term in self.terms).lstrip("+")
+
+    def __repr__(self):
+        return f"DiceExpression({self.text!r})"
+
+
+def parse(text):
+    """
+    Split a dice expression into its terms
+
+    Returns:
+    list: DiceTerm for every term, in order
+    """
+    terms = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = TERM_PATTERN.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Can't read dice expression {text!r} at position {position}")
+        if terms and match.group("sign") is None:
+            raise ValueError(f"Missing + or - before {match.group().strip()!r} in {text!r}")
+        terms.append(_make_term(match))
+        position = match.end()
+
+    if not terms:
+        raise ValueError("Empty dice expression")
+    return terms
+
+
+def _make_term(match):
+    """Turn one regex match into a DiceTerm, checking that it makes sense"""
+    sign = -1 if match.group("sign") == "-" else 1
+    if match.group("constant") is not None:
+        return DiceTerm(sign, constant=int(match.group("constant")))
+
+    count = int(match.group("count") or 1)
+    sides = 100 if match.group("sides") == "%" else int(match.group("sides"))
+    if count < 1:
+        raise ValueError("A dice term has to roll at least one die")
+    if count > MAX_DICE:
+        raise ValueError(f"A dice term can roll at most {MAX_DICE} dice, not {count}")
+    if sides < 1:
+        raise ValueError("A die needs at least one side")
+    if sides > MAX_SIDES:
+        raise ValueError(f"A die can have at most {MAX_SIDES} sides, not {sides}")
+
+    keep = match.group("keep")
+    keep = keep.lower() if keep else None
+    if keep == "k":
+        keep = "kh"
+    keep_n = int(match.group("keep_n") or 0)
+    if keep is not None and not 0 < keep_n <= count:
+        raise ValueError(f"Can't keep or drop {keep_n} of {count} dice")
+    if keep in ("dh", "dl") and keep_n == count:
+        raise ValueError(f"Dropping all {count} dice leaves nothing to add up")
+
+    luck = match.group("luck")
+    if luck is not None:
+        luck = float(luck) if "." in luck else int(luck)
+    if luck is not None:
+        check_luck(luck)
+
+    return DiceTerm(sign, count, sides, keep, keep_n, match.group("compare"),
+                    int(match.group("target") or 0), luck)
+
+
+def _die_type(dice, sides):
+    """Name of the die with this many sides in dice.dice_types (or just dN, which any dice can roll)"""
+    for die_type, size in dice.dice_types.items():
+        if size == sides:
+            return die_type
+    return f"d{sides}"
+
+
+def roll_expressions(dice, expressions, n=1, luck=5):
+    """
+    Roll many expressions n times each, with one batched roll_dice call per (die, luck)
+
+    Parameters:
+    dice (QuantumDice): The dice to roll with
+    expressions (list): DiceExpression objects or strings
+    n (int): Number of times to roll each expression
+    luck (float): Luck for every term that doesn't set its own
+
+    Returns:
+    list: numpy.ndarray of n totals for every expression
+    """
+    check_luck(luck)
+    if n < 0:
+        raise ValueError("Number of rolls can't be negative")
+    expressions = [e if isinstance(e, DiceExpression) else DiceExpression(e) for e in expressions]
+
+    # Plan: how many dice every (die, luck) group needs over all the expressions
+    needed = {}
+    for expression in expressions:
+        for term in expression.dice_terms():
+            key = (_die_type(dice, term.sides), term.luck or luck)
+            needed[key] = needed.get(key, 0) + term.count * n
+    if sum(needed.values()) > MAX_ROLLED_DICE:
+        raise ValueError(f"That would roll {sum(needed.values())} dice, "
+                         f"more than the limit of {MAX_ROLLED_DICE} at once")
+
+    # Draw: one batched roll per group
+    rolls = {key: dice.roll_dice(key[0], key[1], total) for key, total in needed.items()}
+    used = {key: 0 for key in rolls}
+
+    # Evaluate: hand every term its slice of its group's rolls
+    results = []
+    for expression in expressions:
+        totals = np.zeros(n, dtype=np.int64)
+        for term in expression.terms:
+            if not term.is_dice:
+                totals += term.sign * term.constant
+                continue
+            key = (_die_type(dice, term.sides), term.luck or luck)
+            start = used[key]
+            used[key] += term.count * n
+            totals += term.apply(rolls[key][start:used[key]].reshape(n, term.count))
+        results.append(totals)
+    return results
@@ -0,0 +1,98 @@
+"""
+Expected and empirical roll distributions for the luck visualization
+
+The visualization used to keep a Python list of every roll for each luck value
+and only draw anything once all of them were done. The expected distribution
+doesn't need any rolls at all (it's just calculate_bias), and the empirical
+one only needs a count per face, which np.bincount can update one batch of
+rolls at a time. That way the plot can be redrawn after every batch and the
+memory used doesn't grow with the number of rolls.
+"""
+import numpy as np
+
+
+class RollHistogram:
+    def __init__(self, die_size):
+        """
+        Running count of how often each face came up
+
+        Parameters:
+        die_size (int): Number of faces on the die
+        """
+        self.die_size = die_size
+        self.counts = np.zeros(die_size, dtype=np.int64)
+        self.total = 0
+
+    def update(self, rolls):
+        """Add a batch of rolls (faces 1 to die_size) to the counts"""
+        rolls = np.asarray(rolls, dtype=np.int64)
+        self.add_counts(np.bincount(rolls - 1, minlength=self.die_size))
+
+    def add_counts(self, counts):
+        """Add per-face counts (e.g. merged from sweep workers) to the histogram"""
+        self.counts += counts
+        self.total += int(np.sum(counts))
+
+    def frequencies(self):
+        """
+        Fraction of rolls that landed on each face
+
+        Returns:
+        numpy.ndarray: Observed probability of each face (all 0 before any rolls)
+        """
+        if self.total == 0:
+            return np.zeros(self.die_size)
+        return self.counts / self.total
+
+
+class DistributionEngine:
+    def __init__(self, dice, die_type, luck_values=(1, 3, 5, 7, 10)):
+        """
+        Compare expected and observed roll distributions for several luck values
+
+        Parameters:
+        dice (QuantumDice): The dice to roll
+        die_type (str): Type of die to roll
+        luck_values (list): Luck values to compare
+        """
+        self.dice = dice
+        self.die_type = die_type
+        self.die_size = dice.die_size(die_type)
+        self.luck_values = list(luck_values)
+        self.histograms = {luck: RollHistogram(self.die_size) for luck in self.luck_values}
+
+    def expected(self):
+        """
+        Exact probability of each face for every luck value (no rolling needed)
+
+        Returns:
+        dict: luck -> numpy.ndarray of face probabilities
+        """
+        return {luck: self.dice.face_probabilities(self.die_type, luck) for luck in self.luck_values}
+
+    def run(self, num_rolls, batch_size=10000, workers=1):
+        """
+        Roll num_rolls dice for every luck value, one batch at a time
+
+        Yields after every batch so the caller can redraw a plot or progress bar.
+
+        Parameters:
+        num_rolls (int): Number of rolls per luck value
+        batch_size (int): Number of rolls per luck value in each batch
+        workers (int): Number of worker processes to spread each batch over
+            (None uses every CPU core, 1 rolls everything in this process)
+
+        Yields:
+        int: Number of rolls done so far (per luck value); the counts so far
+            are in self.histograms
+        """
+        with self.dice.sweep_executor(workers) as executor:
+            done = 0
+            while done < num_rolls:
+                n = min(batch_size, num_rolls - done)
+                counts = self.dice.sweep(self.die_type, self.luck_values, n,
+                                         workers=workers, executor=executor)
+                for luck in self.luck_values:
+                    self.histograms[luck].add_counts(counts[luck])
+                done += n
+                yield done
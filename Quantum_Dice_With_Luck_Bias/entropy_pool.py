@@ -0,0 +1,197 @@
+"""
+Background-refilled pool of quantum random bytes
+
+Running the simulator for every single roll means every roll has to wait for
+it. Instead, the EntropyPool keeps a ring buffer of measured random bytes and a
+background thread that tops it back up with large multi-shot sampler runs
+whenever it drops below a low watermark. Rolls just take bytes out of the
+buffer, so they only ever wait on the simulator if the pool runs completely dry.
+"""
+import threading
+
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.backends import bytes_to_ints, get_default_backend
+
+
+def _sample_bytes(num_bytes):
+    """Default byte source: the shared backend (one 8-qubit circuit run with a shot per byte by default)"""
+    return get_default_backend().random_bytes(num_bytes)
+
+
+class EntropyPool:
+    def __init__(self, capacity=65536, low_watermark=0.25, high_watermark=0.9,
+                 block_size=8192, source=None, start=True):
+        """
+        Create a pool of random bytes that refills itself in the background
+
+        Parameters:
+        capacity (int): Size of the ring buffer in bytes
+        low_watermark (float): Fill level (0-1) that wakes the refill thread
+        high_watermark (float): Fill level (0-1) the refill thread fills up to
+        block_size (int): Number of bytes (shots) requested per sampler run
+        source (callable): Function taking a byte count and returning that many
+            random bytes as a uint8 array (e.g. a backend's random_bytes).
+            Defaults to the shared backend.
+        start (bool): Start the refill thread straight away
+        """
+        if capacity <= 0:
+            raise ValueError("Capacity must be positive")
+        if not 0 <= low_watermark < high_watermark <= 1:
+            raise ValueError("Watermarks must satisfy 0 <= low < high <= 1")
+
+        self.capacity = capacity
+        self.block_size = block_size
+        self._source = source or _sample_bytes
+        self._low = int(capacity * low_watermark)
+        self._high = max(1, int(capacity * high_watermark))
+
+        # The ring buffer: bytes live in _buffer[_head:_head + _count] (wrapping around)
+        self._buffer = np.zeros(capacity, dtype=np.uint8)
+        self._head = 0
+        self._count = 0
+
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._error = None
+        self._thread = None
+        if start:
+            self.start()
+
+    def start(self):
+        """Start the background refill thread (does nothing if it's already running)"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._refill_loop,
+                                            name="entropy-pool-refill", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background refill thread, the bytes already in the pool stay usable"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def available(self):
+        """Number of random bytes currently sitting in the pool"""
+        with self._cond:
+            return self._count
+
+    def fill_level(self):
+        """
+        How full the pool is
+
+        Returns:
+        float: Fraction of the ring buffer that holds unused random bytes (0-1)
+        """
+        with self._cond:
+            return self._count / self.capacity
+
+    def _refill_loop(self):
+        """Wait until the pool drops below the low watermark, then refill it to the high one"""
+        while True:
+            with self._cond:
+                while not self._stopped and self._count > self._low:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                wanted = self._high - self._count
+
+            while wanted > 0:
+                # Run the sampler without holding the lock so rolls can keep
+                # taking the bytes that are already in the pool meanwhile
+                try:
+                    block = np.asarray(self._source(min(self.block_size, wanted)), dtype=np.uint8)
+                except Exception as e:
+                    with self._cond:
+                        self._error = e
+                        self._stopped = True
+                        self._cond.notify_all()
+                    return
+
+                with self._cond:
+                    if self._stopped:
+                        return
+                    self._write(block[:self.capacity - self._count])
+                    self._cond.notify_all()
+                    wanted = self._high - self._count
+
+    def _write(self, block):
+        """Append bytes to the end of the ring buffer (lock must be held)"""
+        tail = (self._head + self._count) % self.capacity
+        first = min(len(block), self.capacity - tail)
+        self._buffer[tail:tail + first] = block[:first]
+        self._buffer[:len(block) - first] = block[first:]
+        self._count += len(block)
+
+    def _read(self, num_bytes, out):
+        """Move bytes from the front of the ring buffer into out (lock must be held)"""
+        first = min(num_bytes, self.capacity - self._head)
+        out[:first] = self._buffer[self._head:self._head + first]
+        out[first:num_bytes] = self._buffer[:num_bytes - first]
+        self._head = (self._head + num_bytes) % self.capacity
+        self._count -= num_bytes
+
+    def take_bytes(self, num_bytes, timeout=None):
+        """
+        Take random bytes out of the pool, blocking while it's empty
+
+        Parameters:
+        num_bytes (int): Number of bytes to take (can be bigger than the pool)
+        timeout (float): Seconds to wait for bytes before giving up (None waits forever)
+
+        Returns:
+        numpy.ndarray: num_bytes random bytes (uint8)
+        """
+        out = np.empty(num_bytes, dtype=np.uint8)
+        taken = 0
+        with self._cond:
+            while taken < num_bytes:
+                if self._count == 0:
+                    if self._error is not None:
+                        raise RuntimeError("Entropy pool refill failed") from self._error
+                    if self._stopped:
+                        raise RuntimeError("Entropy pool is empty and not refilling")
+                    # Wake the refill thread and wait for it to add more bytes
+                    self._cond.notify_all()
+                    if not self._cond.wait(timeout):
+                        raise TimeoutError("Timed out waiting for the entropy pool to refill")
+                    continue
+
+                n = min(num_bytes - taken, self._count)
+                self._read(n, out[taken:])
+                taken += n
+
+            if self._count <= self._low:
+                self._cond.notify_all()
+        return out
+
+    def take_values(self, num_bits, count, timeout=None):
+        """
+        Take uniform random integers with num_bits bits each from the pool
+
+        Parameters:
+        num_bits (int): Bits per value (1-64)
+        count (int): Number of values to take
+        timeout (float): Seconds to wait for bytes before giving up
+
+        Returns:
+        numpy.ndarray: count integers between 0 and 2**num_bits - 1
+        """
+        if not 1 <= num_bits <= 64:
+            raise ValueError("Values must be between 1 and 64 bits wide")
+
+        raw = self.take_bytes(((num_bits + 7) // 8) * count, timeout)
+        return bytes_to_ints(raw, num_bits)
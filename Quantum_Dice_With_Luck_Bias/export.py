@@ -0,0 +1,198 @@
+"""
+Bulk export of rolls to compact binary files, and memory-mapped replay
+
+For pre-generating big "entropy tapes" offline. Rolls are written one chunk at
+a time, so a tape can be much bigger than memory. Three formats are supported:
+
+- "npy":  a standard NumPy .npy file (np.load works on it too)
+- "raw":  the values back to back in the smallest int type that fits them
+          (uint8 for every die we have), no header
+- "bits": every value packed into just as many bits as it needs, e.g. 5 bits
+          for a d20 (value - low is stored, big-endian, padded at the end)
+
+The raw and bits formats write a small JSON sidecar (path + ".json") saying how
+to read them back. RollTape opens any of the three by memory-mapping the file:
+npy and raw tapes are read with no copying at all, bit-packed tapes only
+unpack the bytes of the slice being read.
+"""
+import json
+import os
+
+import numpy as np
+
+FORMATS = ("npy", "raw", "bits")
+
+
+def format_for_path(path):
+    """Pick a format from a file's extension (.npy, .bits, anything else is raw)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return "npy"
+    if extension == ".bits":
+        return "bits"
+    return "raw"
+
+
+def value_dtype(low, high):
+    """Smallest NumPy integer type that holds every value from low to high"""
+    return np.result_type(np.min_scalar_type(low), np.min_scalar_type(high))
+
+
+def _pack_bits(values, bits):
+    """Pack each value's lowest `bits` bits, most significant bit first"""
+    shifts = np.arange(bits - 1, -1, -1, dtype=np.uint64)
+    matrix = (values.astype(np.uint64)[:, None] >> shifts) & 1
+    return np.packbits(matrix.astype(np.uint8))
+
+
+def export_rolls(path, chunks, count, low, high, fmt=None):
+    """
+    Write count values taken from an iterator of chunks to a file
+
+    Parameters:
+    path (str): File to write
+    chunks (iterator): numpy.ndarray chunks of values, e.g. dice.stream(..., as_chunks=True)
+    count (int): Number of values to write
+    low (int): Smallest value the chunks can contain
+    high (int): Largest value the chunks can contain
+    fmt (str): "npy", "raw" or "bits" (default: picked from the extension)
+
+    Returns:
+    str: The format that was written
+    """
+    fmt = fmt or format_for_path(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Format must be one of: {', '.join(FORMATS)}")
+    if count < 0:
+        raise ValueError("Count can't be negative")
+
+    dtype = value_dtype(low, high)
+    bits = max(1, (high - low).bit_length())
+
+    if fmt == "npy":
+        # open_memmap writes the header and lets us fill the file in place
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(count,))
+        written = 0
+        for chunk in chunks:
+            chunk = chunk[:count - written]
+            out[written:written + len(chunk)] = chunk
+            written += len(chunk)
+            if written >= count:
+                break
+        out.flush()
+        del out
+        return fmt
+
+    with open(path, "wb") as f:
+        written = 0
+        # Bit-packed values only line up with byte boundaries every 8 values,
+        # so up to 7 values are carried over to the next chunk
+        carry = np.empty(0, dtype=np.int64)
+        for chunk in chunks:
+            chunk = np.asarray(chunk[:count - written])
+            written += len(chunk)
+            if fmt == "raw":
+                f.write(chunk.astype(dtype).tobytes())
+            else:
+                values = np.concatenate([carry, chunk.astype(np.int64) - low])
+                whole = len(values) // 8 * 8
+                f.write(_pack_bits(values[:whole], bits).tobytes())
+                carry = values[whole:]
+            if written >= count:
+                break
+        if len(carry):
+            f.write(_pack_bits(carry, bits).tobytes())
+
+    with open(path + ".json", "w") as f:
+        json.dump({
+            "format": fmt,
+            "count": written,
+            "dtype": np.dtype(dtype).str,
+            "bits": bits,
+            "low": int(low),
+        }, f)
+    return fmt
+
+
+class RollTape:
+    def __init__(self, path, fmt=None):
+        """
+        Memory-map an exported tape for replay
+
+        Parameters:
+        path (str): File written by export_rolls
+        fmt (str): "npy", "raw" or "bits" (default: read from the sidecar,
+            or picked from the extension)
+        """
+        self.path = path
+        meta = {}
+        if os.path.exists(path + ".json"):
+            with open(path + ".json") as f:
+                meta = json.load(f)
+        self.format = fmt or meta.get("format") or format_for_path(path)
+
+        if self.format == "npy":
+            self._data = np.load(path, mmap_mode="r")
+            self.count = len(self._data)
+            return
+
+        if not meta:
+            raise ValueError(f"{path} has no {path}.json sidecar saying how to read it")
+        self.count = meta["count"]
+        self.bits = meta["bits"]
+        self.low = meta["low"]
+        self.dtype = np.dtype(meta["dtype"])
+        if self.format == "raw":
+            self._data = np.memmap(path, dtype=self.dtype, mode="r", shape=(self.count,))
+        else:
+            self._data = np.memmap(path, dtype=np.uint8, mode="r")
+
+    @property
+    def values(self):
+        """
+        The whole tape as a read-only memory-mapped array (npy and raw tapes only)
+
+        Returns:
+        numpy.memmap: Every value on the tape, read straight from the file
+        """
+        if self.format == "bits":
+            raise ValueError("Bit-packed tapes have to be unpacked, index or slice them instead")
+        return self._data
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if self.format != "bits":
+            return self._data[index]
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.count)
+            if step != 1:
+                return self._unpack(start, stop)[::step]
+            return self._unpack(start, stop)
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("Tape index out of range")
+        return self._unpack(index, index + 1)[0]
+
+    def _unpack(self, start, stop):
+        """Unpack values start to stop of a bit-packed tape (only touches the bytes they're in)"""
+        if stop <= start:
+            return np.empty(0, dtype=self.dtype)
+        first_bit = start * self.bits
+        last_bit = stop * self.bits
+        raw = np.unpackbits(self._data[first_bit // 8:(last_bit + 7) // 8])
+        matrix = raw[first_bit % 8:first_bit % 8 + (stop - start) * self.bits].reshape(-1, self.bits)
+        weights = 1 << np.arange(self.bits - 1, -1, -1, dtype=np.uint64)
+        return ((matrix.astype(np.uint64) @ weights).astype(np.int64) + self.low).astype(self.dtype)
+
+    def chunks(self, chunk=65536):
+        """
+        Replay the tape chunk values at a time
+
+        Yields:
+        numpy.ndarray: The next chunk of values (views into the file for npy and raw tapes)
+        """
+        for start in range(0, self.count, chunk):
+            yield self[start:start + chunk]
@@ -0,0 +1,132 @@
+"""
+Counters and timers for the roll hot path
+
+When roll latency spikes it helps to know which stage is responsible, so the
+circuit cache, the backends and the dice all report into one process-wide
+RollStats object:
+
+- circuits built, and time spent building them
+- sampler invocations and shots requested, and time spent in sampler.run
+- time spent turning sampler results into numbers
+- outcomes rejected because they were out of range for a die
+- hit rates of the circuit and alias table caches
+
+QuantumDice.stats() and rng.stats() return a snapshot of it. Profiling hooks
+added with add_hook() get called after every timed stage, e.g. to forward the
+timings to a metrics system.
+"""
+from contextlib import contextmanager
+import threading
+import time
+
+# Stages that get timed
+STAGES = ("build", "run", "parse")
+
+
+class RollStats:
+    def __init__(self):
+        """Create an empty set of counters and timers"""
+        self._lock = threading.Lock()
+        self._hooks = []
+        self.reset()
+
+    def reset(self):
+        """Set every counter and timer back to zero"""
+        with self._lock:
+            self.counters = {
+                "circuits_built": 0,
+                "sampler_calls": 0,
+                "shots_requested": 0,
+                "rejected_outcomes": 0,
+            }
+            self.seconds = {stage: 0.0 for stage in STAGES}
+
+    def count(self, name, amount=1):
+        """Add amount to a counter (creating it if it's new)"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_run(self, shots):
+        """Count one sampler/backend invocation asking for `shots` shots"""
+        with self._lock:
+            self.counters["sampler_calls"] += 1
+            self.counters["shots_requested"] += shots
+
+    @contextmanager
+    def timer(self, stage, **info):
+        """
+        Time a block of code as one of the STAGES
+
+        Parameters:
+        stage (str): "build", "run" or "parse"
+        info: Extra details passed on to the profiling hooks
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.seconds[stage] += elapsed
+                hooks = list(self._hooks)
+            for hook in hooks:
+                hook(stage, elapsed, info)
+
+    def add_hook(self, hook):
+        """
+        Call hook(stage, seconds, info) after every timed stage
+
+        Parameters:
+        hook (callable): The profiling hook/callback to add
+        """
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """Stop calling a hook added with add_hook"""
+        with self._lock:
+            self._hooks.remove(hook)
+
+    def snapshot(self):
+        """
+        Copy of every counter, timer and cache hit rate
+
+        Returns:
+        dict: {"counters": {...}, "seconds": {...}, "caches": {...}}
+        """
+        with self._lock:
+            counters = dict(self.counters)
+            seconds = dict(self.seconds)
+        return {"counters": counters, "seconds": seconds, "caches": _cache_stats()}
+
+
+def _cache_stats():
+    """Hits, misses and hit rate of every cache on the hot path (plus memory use for the bounded ones)"""
+    # Imported here since those modules report into this one
+    from Quantum_Dice_With_Luck_Bias import bias_tables, circuit_cache, probability
+
+    caches = {
+        "uniform_circuits": circuit_cache.get_uniform_circuit,
+        "biased_circuits": circuit_cache.get_biased_circuit,
+        "plan_circuits": circuit_cache.get_plan_circuit,
+        "alias_tables": bias_tables.get_alias_table,
+        "weighted_alias_tables": bias_tables.get_weighted_alias_table,
+        "exact_distributions": probability._cached_distribution,
+    }
+    result = {}
+    for name, cached in caches.items():
+        info = cached.cache_info()
+        lookups = info.hits + info.misses
+        result[name] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "hit_rate": info.hits / lookups if lookups else None,
+        }
+        # Only the memory-bounded caches (see table_cache.py) know their size in bytes
+        if hasattr(info, "bytes"):
+            result[name].update(evictions=info.evictions, bytes=info.bytes, max_bytes=info.max_bytes)
+    return result
+
+
+# The one RollStats every module in the process reports into
+STATS = RollStats()
@@ -0,0 +1,291 @@
+"""
+Exact outcome distributions for dice expressions
+
+Every face probability of a (lucky) die is known exactly from calculate_bias,
+so the distribution of a whole expression can be worked out instead of rolled:
+
+- sums of dice are convolutions of the face probabilities (for big pools
+  like 10d100 the convolutions are done with an FFT)
+- keep/drop rules (4d6kh3, 2d20kl1 = disadvantage) count how many dice land
+  on every face, going from the highest face down (or the lowest face up)
+- dice pools (6d10>=8) are binomial distributions over the number of successes
+- plain numbers just shift the distribution, and a minus sign mirrors it
+
+Results are cached per (expression, luck) in a memory-bounded LRU cache, so
+the app can redraw the exact distribution of something like 10d100 instantly,
+and sampled rolls can be checked against it (see ExactDistribution.total_variation).
+"""
+from math import lgamma
+
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.bias_tables import calculate_bias, check_luck
+from Quantum_Dice_With_Luck_Bias.dice_expressions import DiceExpression
+from Quantum_Dice_With_Luck_Bias.table_cache import bounded_cache
+
+# Above this many multiply-adds, convolutions switch from np.convolve to an FFT
+FFT_THRESHOLD = 50000
+
+# Memory the cached distributions may use
+DISTRIBUTION_CACHE_BYTES = 32 * 1024 * 1024
+
+# Most possible totals an expression's distribution can have (at the limit
+# the FFTs take about half a second)
+MAX_OUTCOMES = 2000000
+
+# Limits for keep/drop terms: the table _keep_distribution fills in (dice
+# placed x kept total) and the multiply-adds it takes to fill it, which at
+# the limit is about a second
+MAX_KEEP_STATES = 10000000
+MAX_KEEP_WORK = 1000000000
+
+
+class ExactDistribution:
+    def __init__(self, offset, probabilities):
+        """
+        Probability of every total from offset upwards
+
+        Parameters:
+        offset (int): Smallest possible total
+        probabilities (numpy.ndarray): probabilities[i] is P(total == offset + i)
+        """
+        self.offset = offset
+        self.probabilities = probabilities
+
+    @property
+    def values(self):
+        """Every possible total, lined up with probabilities"""
+        return np.arange(self.offset, self.offset + len(self.probabilities))
+
+    def probability(self, value):
+        """Chance of rolling exactly this total"""
+        index = value - self.offset
+        return float(self.probabilities[index]) if 0 <= index < len(self.probabilities) else 0.0
+
+    def mean(self):
+        """Expected total"""
+        return float(np.dot(self.values, self.probabilities))
+
+    def std(self):
+        """Standard deviation of the total"""
+        return float(np.sqrt(np.dot((self.values - self.mean()) ** 2, self.probabilities)))
+
+    def total_variation(self, samples):
+        """
+        How far sampled totals are from this distribution
+
+        Parameters:
+        samples (numpy.ndarray): Rolled totals
+
+        Returns:
+        float: Total variation distance, 0 (identical) to 1 (nothing in common)
+        """
+        samples = np.asarray(samples, dtype=np.int64) - self.offset
+        inside = samples[(samples >= 0) & (samples < len(self.probabilities))]
+        observed = np.bincount(inside, minlength=len(self.probabilities)) / len(samples)
+        outside = 1 - len(inside) / len(samples)
+        return float(0.5 * (np.abs(observed - self.probabilities).sum() + outside))
+
+
+def _fft_size(size):
+    """
+    Power of two to pad an FFT of `size` values to
+
+    FFTs of awkward lengths (like a big prime) are many times slower, and the
+    zero padding doesn't change the result of the convolution.
+    """
+    return 1 << (size - 1).bit_length()
+
+
+def convolve(a, b):
+    """Distribution of the sum of two independent totals (FFT for big inputs)"""
+    if len(a) * len(b) <= FFT_THRESHOLD:
+        return np.convolve(a, b)
+    size = len(a) + len(b) - 1
+    fft_size = _fft_size(size)
+    result = np.fft.irfft(np.fft.rfft(a, fft_size) * np.fft.rfft(b, fft_size), fft_size)
+    return _clean(result[:size])
+
+
+def power(pmf, n):
+    """Distribution of the sum of n independent copies of pmf"""
+    size = n * (len(pmf) - 1) + 1
+    if size * len(pmf) > FFT_THRESHOLD:
+        # One FFT, raise every frequency to the n-th power, one inverse FFT
+        fft_size = _fft_size(size)
+        return _clean(np.fft.irfft(np.fft.rfft(pmf, fft_size) ** n, fft_size)[:size])
+
+    # Small enough to do exactly, by repeated squaring
+    result = np.ones(1)
+    while n:
+        if n & 1:
+            result = np.convolve(result, pmf)
+        n >>= 1
+        if n:
+            pmf = np.convolve(pmf, pmf)
+    return result
+
+
+def _clean(pmf):
+    """FFTs leave tiny negative rounding errors behind, clip them and renormalize"""
+    pmf = np.clip(pmf, 0, None)
+    return pmf / pmf.sum()
+
+
+def _keep_distribution(faces, scores, count, keep_n, highest):
+    """
+    Distribution of the total score of the keep_n highest (or lowest) of count dice
+
+    Works through the faces from the end we keep first, tracking how many dice
+    have been placed so far and the total of the kept ones. Putting m of the
+    r dice not placed yet on a face with probability p has weight C(r, m) * p^m.
+
+    Parameters:
+    faces (numpy.ndarray): Probability of each face
+    scores (numpy.ndarray): What a kept die on each face adds to the total
+        (the face itself for sums, 1 or 0 for dice pools)
+    count (int): Number of dice rolled
+    keep_n (int): Number of dice kept
+    highest (bool): Keep the highest dice (otherwise the lowest)
+
+    Returns:
+    numpy.ndarray: probabilities[s] is P(kept total == s), from 0 to keep_n * max(scores)
+    """
+    size = len(faces)
+    order = range(size - 1, -1, -1) if highest else range(size)
+    max_total = keep_n * int(scores.max())
+    log_factorials = np.array([lgamma(m + 1) for m in range(count + 1)])
+
+    # dp[j] = probability of every kept total with j dice placed so far
+    dp = np.zeros((count + 1, max_total + 1))
+    dp[0, 0] = 1.0
+    for face in order:
+        p = faces[face]
+        if p == 0:
+            continue
+        new = np.zeros_like(dp)
+        for placed in range(count + 1):
+            if not dp[placed].any():
+                continue
+            left = count - placed
+            for m in range(left + 1):
+                log_choose = log_factorials[left] - log_factorials[m] - log_factorials[left - m]
+                weight = np.exp(log_choose + m * np.log(p))
+                shift = max(0, min(m, keep_n - placed)) * int(scores[face])
+                new[placed + m, shift:] += weight * dp[placed, :max_total + 1 - shift]
+        dp = new
+    return _clean(dp[count])
+
+
+def _term_distribution(term, luck):
+    """
+    Exact distribution of one dice term (without its sign)
+
+    Returns:
+    tuple: (smallest value, probabilities)
+    """
+    faces = calculate_bias(term.luck or luck, term.sides)
+    outcomes = np.arange(1, term.sides + 1)
+
+    if term.compare is not None:
+        # Dice pool: every die is a success (1) or a failure (0)
+        scores = {
+            ">=": outcomes >= term.target,
+            ">": outcomes > term.target,
+            "<=": outcomes <= term.target,
+            "<": outcomes < term.target,
+        }[term.compare].astype(np.int64)
+        if term.keep is None:
+            # Independent successes: a binomial distribution
+            p = float(faces[scores == 1].sum())
+            return 0, power(np.array([1 - p, p]), term.count)
+    elif term.keep is None:
+        # Plain sum: faces run from 1, so the sum of count dice starts at count
+        return term.count, power(faces, term.count)
+    else:
+        scores = outcomes
+
+    if term.keep in ("kh", "kl"):
+        kept, highest = term.keep_n, term.keep == "kh"
+    else:
+        # Dropping the highest K is keeping the lowest count - K (and the other way round)
+        kept, highest = term.count - term.keep_n, term.keep == "dl"
+    pmf = _keep_distribution(faces, scores, term.count, kept, highest)
+    if term.compare is not None:
+        return 0, pmf
+    # Kept sums below kept * 1 can't happen, so start the distribution there
+    return kept, pmf[kept:]
+
+
+def _check_size(expression):
+    """
+    Make sure an expression's exact distribution can be worked out in reasonable time and memory
+
+    Raises:
+    ValueError: If it has too many possible totals, or a keep/drop term is too big
+    """
+    outcomes = 1
+    for term in expression.dice_terms():
+        kept = term.count
+        if term.keep in ("kh", "kl"):
+            kept = term.keep_n
+        elif term.keep is not None:
+            kept = term.count - term.keep_n
+        max_score = 1 if term.compare is not None else term.sides
+        # A sum of kept dice runs from kept to kept * sides, a pool from 0 to kept
+        outcomes += kept if term.compare is not None else kept * (term.sides - 1)
+
+        if term.keep is not None:
+            # Same table size and loop counts as _keep_distribution
+            states = (term.count + 1) * (kept * max_score + 1)
+            work = term.sides * (term.count + 1) * (term.count + 2) // 2 * (kept * max_score + 1)
+            if states > MAX_KEEP_STATES or work > MAX_KEEP_WORK:
+                raise ValueError(f"{str(term).lstrip('+')} is too big to work out exactly "
+                                 f"(try fewer dice or fewer sides)")
+    if outcomes > MAX_OUTCOMES:
+        raise ValueError(f"{expression} has {outcomes} possible totals, "
+                         f"more than the limit of {MAX_OUTCOMES}")
+
+
+def _expression_distribution(expression, luck):
+    """Convolve every term of an expression together"""
+    offset = 0
+    pmf = np.ones(1)
+    for term in expression.terms:
+        if not term.is_dice:
+            offset += term.sign * term.constant
+            continue
+        low, term_pmf = _term_distribution(term, luck)
+        if term.sign < 0:
+            # -X: the highest value of X becomes the lowest
+            low, term_pmf = -(low + len(term_pmf) - 1), term_pmf[::-1]
+        offset += low
+        pmf = convolve(pmf, term_pmf)
+    return offset, pmf
+
+
+@bounded_cache(DISTRIBUTION_CACHE_BYTES)
+def _cached_distribution(text, luck):
+    offset, pmf = _expression_distribution(DiceExpression(text), luck)
+    # Cached arrays are shared between callers, so nobody gets to change them
+    pmf.setflags(write=False)
+    return offset, pmf
+
+
+def exact_distribution(expression, luck=5):
+    """
+    Exact probability of every total of a dice expression
+
+    Parameters:
+    expression (str or DiceExpression): e.g. "10d100", "4d6kh3+2", "2d20kl1"
+    luck (float): Luck for every term that doesn't set its own with @
+
+    Returns:
+    ExactDistribution: The distribution (cached per expression and luck)
+    """
+    check_luck(luck)
+    if not isinstance(expression, DiceExpression):
+        expression = DiceExpression(expression)
+    _check_size(expression)
+    # str() gives the same text for the same expression however it was typed
+    return ExactDistribution(*_cached_distribution(str(expression), luck))
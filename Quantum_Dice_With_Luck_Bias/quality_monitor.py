@@ -0,0 +1,393 @@
+"""
+Streaming statistical quality monitor for roll and number streams
+
+Until now the only way to check a backend was to store a list of rolls and
+eyeball a matplotlib histogram of it. That doesn't work for a stream that
+runs for days, so a QualityMonitor looks at every batch as it goes past and
+only keeps running totals (memory doesn't depend on how many values it sees):
+
+- chi-square goodness of fit: a count per face (or per bucket of values for
+  big ranges like a d1000000 or rng numbers up to 10**12) against the
+  expected distribution, e.g. the luck-biased calculate_bias one
+- serial correlation: lag-1 correlation between every value and the next,
+  from running sums (a stuck or repeating source shows up here)
+- runs test (Wald-Wolfowitz): how often the stream switches between values
+  above and below the expected mean (too few or too many switches both mean
+  the values aren't independent)
+
+The tests run on every window of `window` values as it fills up (so a backend
+that starts drifting halfway through a long stream is still caught), and
+check() runs them on everything seen so far. Any p-value below alpha raises an
+alert: it's kept in monitor.alerts, counted in the stats snapshot and handed
+to on_alert.
+
+    monitor = QualityMonitor.for_die(dice, "d20", luck=7)
+    for roll in monitor.watch(dice.stream("d20", 7)):
+        ...
+"""
+from collections import deque, namedtuple
+from math import erfc, exp, lgamma, log, sqrt
+
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.instrumentation import STATS
+
+# What went wrong: the test, its statistic and p-value, and where in the stream
+QualityAlert = namedtuple("QualityAlert", ["test", "statistic", "p_value", "samples", "scope"])
+
+
+def chi_square_sf(x, df):
+    """
+    Chance of a chi-square statistic at least x with df degrees of freedom
+
+    This is the regularized upper incomplete gamma function Q(df/2, x/2),
+    worked out with its series or its continued fraction (whichever converges
+    faster), so scipy isn't needed.
+    """
+    if df <= 0 or x <= 0:
+        return 1.0
+    a = df / 2
+    x = x / 2
+    scale = exp(-x + a * log(x) - lgamma(a))
+    if x < a + 1:
+        # Series for the lower function P(a, x), then Q = 1 - P
+        term = total = 1 / a
+        k = a
+        for _ in range(100000):
+            k += 1
+            term *= x / k
+            total += term
+            if term < total * 1e-15:
+                break
+        return max(0.0, 1.0 - total * scale)
+
+    # Continued fraction for Q(a, x) (modified Lentz)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 100000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = d if abs(d) > tiny else tiny
+        c = b + an / c
+        c = c if abs(c) > tiny else tiny
+        d = 1 / d
+        step = d * c
+        h *= step
+        if abs(step - 1) < 1e-15:
+            break
+    return min(1.0, scale * h)
+
+
+def _normal_p_value(z):
+    """Two-sided p-value of a standard normal statistic"""
+    return erfc(abs(z) / sqrt(2))
+
+
+class _Accumulator:
+    def __init__(self, bins):
+        """Running totals for every test over one stretch of the stream"""
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.samples = 0
+        self.out_of_range = 0
+        # Lag-1 sums over (previous value, value) pairs
+        self.pairs = 0
+        self.sum_x = self.sum_y = self.sum_xx = self.sum_yy = self.sum_xy = 0.0
+        self.last = None
+        # Runs above/below the expected mean (values equal to it are skipped)
+        self.above = 0
+        self.below = 0
+        self.runs = 0
+        self.last_side = None
+
+    def update(self, buckets, positions, threshold):
+        """
+        Add a batch
+
+        Parameters:
+        buckets (numpy.ndarray): Bucket of every value (out of range ones already removed)
+        positions (numpy.ndarray): Every value as a float, for the correlation and runs tests
+        threshold (float): Expected mean, in the same units as positions
+        """
+        self.counts += np.bincount(buckets, minlength=len(self.counts))
+        self.samples += len(positions)
+        if len(positions) == 0:
+            return
+
+        # Carry the last value of the previous batch over, so no pair is missed
+        if self.last is not None:
+            positions_with_last = np.concatenate(([self.last], positions))
+        else:
+            positions_with_last = positions
+        x = positions_with_last[:-1]
+        y = positions_with_last[1:]
+        self.pairs += len(x)
+        self.sum_x += float(x.sum())
+        self.sum_y += float(y.sum())
+        self.sum_xx += float(np.dot(x, x))
+        self.sum_yy += float(np.dot(y, y))
+        self.sum_xy += float(np.dot(x, y))
+        self.last = positions[-1]
+
+        sides = positions[positions != threshold] > threshold
+        if len(sides):
+            self.above += int(np.count_nonzero(sides))
+            self.below += len(sides) - int(np.count_nonzero(sides))
+            # A new run starts wherever the side changes (and at the very start)
+            self.runs += int(np.count_nonzero(sides[1:] != sides[:-1]))
+            if self.last_side is None or sides[0] != self.last_side:
+                self.runs += 1
+            self.last_side = bool(sides[-1])
+
+    def chi_square(self, expected):
+        """(statistic, p-value) of the counts against the expected bucket probabilities"""
+        total = self.counts.sum()
+        if total == 0:
+            return 0.0, 1.0
+        possible = expected > 0
+        # A value in a bucket that should never be hit can't be chance
+        if self.counts[~possible].any():
+            return float("inf"), 0.0
+        wanted = expected[possible] * total
+        statistic = float((((self.counts[possible] - wanted) ** 2) / wanted).sum())
+        return statistic, chi_square_sf(statistic, int(possible.sum()) - 1)
+
+    def serial_correlation(self):
+        """(lag-1 correlation, p-value); sqrt(n) * r is about standard normal for independent values"""
+        n = self.pairs
+        if n < 2:
+            return 0.0, 1.0
+        cov = self.sum_xy - self.sum_x * self.sum_y / n
+        var_x = self.sum_xx - self.sum_x ** 2 / n
+        var_y = self.sum_yy - self.sum_y ** 2 / n
+        if var_x <= 0 or var_y <= 0:
+            # Every value the same: only fine if the die can only roll one thing
+            return 0.0, 1.0
+        r = cov / sqrt(var_x * var_y)
+        return r, _normal_p_value(r * sqrt(n))
+
+    def runs_test(self):
+        """(z statistic, p-value) of the number of runs above/below the expected mean"""
+        n1, n2 = self.above, self.below
+        n = n1 + n2
+        if n1 == 0 or n2 == 0 or n < 3:
+            return 0.0, 1.0
+        mean = 2 * n1 * n2 / n + 1
+        variance = 2 * n1 * n2 * (2 * n1 * n2 - n) / (n * n * (n - 1))
+        if variance <= 0:
+            return 0.0, 1.0
+        z = (self.runs - mean) / sqrt(variance)
+        return z, _normal_p_value(z)
+
+
+class QualityMonitor:
+    def __init__(self, low, size, probabilities=None, alpha=1e-6, window=100000,
+                 max_bins=1024, on_alert=None):
+        """
+        Watch a stream of integers from low to low + size - 1
+
+        Parameters:
+        low (int): Smallest value the stream should produce
+        size (int): Number of different values it should produce
+        probabilities (array): Expected chance of every value (None means uniform)
+        alpha (float): p-value below which a test raises an alert. The tests
+            run after every window, so keep it small to avoid false alarms
+        window (int): Values per window the tests are run on
+        max_bins (int): Most chi-square buckets; bigger ranges are split into
+            this many equal buckets of neighbouring values
+        on_alert (callable): Called with every QualityAlert
+        """
+        if size < 1:
+            raise ValueError("The stream needs at least one possible value")
+        if window < 2:
+            raise ValueError("Window must be at least 2")
+        if probabilities is not None and len(probabilities) != size:
+            raise ValueError(f"Got {len(probabilities)} probabilities for {size} values")
+
+        self.low = low
+        self.size = size
+        self.alpha = alpha
+        self.window = window
+        self.on_alert = on_alert
+        self.bins = min(size, max_bins)
+
+        # First value of every bucket, spreading the values as evenly as possible
+        starts = [(i * size + self.bins - 1) // self.bins for i in range(self.bins)]
+        if probabilities is None:
+            widths = np.diff(np.array(starts + [size], dtype=np.float64))
+            self.expected = widths / size
+            self._mean = (size - 1) / 2
+        else:
+            probabilities = np.asarray(probabilities, dtype=np.float64)
+            probabilities = probabilities / probabilities.sum()
+            self.expected = np.add.reduceat(probabilities, np.array(starts))
+            self._mean = float(np.dot(np.arange(size), probabilities))
+        # Bucket numbers need Python ints once size * bins could overflow int64
+        self._wide = size * self.bins >= 2 ** 63
+
+        self.total = _Accumulator(self.bins)
+        self.current = _Accumulator(self.bins)
+        self.windows = 0
+        # Only the latest alerts are kept, so a broken stream can't fill memory
+        self.alerts = deque(maxlen=100)
+
+    @classmethod
+    def for_die(cls, dice, die_type="d20", luck=5, **options):
+        """
+        Monitor for the rolls of one die at one luck (faces 1 to N)
+
+        Parameters:
+        dice (QuantumDice): The dice doing the rolling
+        die_type (str): Any numbered die the dice can roll (d20, d1000, ...)
+        luck (float): Luck the rolls are made with
+        options: Passed on to QualityMonitor (alpha, window, ...)
+        """
+        die_size, custom = dice._resolve_die(die_type)
+        if custom is not None:
+            raise ValueError("Custom dice can have any face values; monitor a numbered die instead")
+        return cls(1, die_size, dice._calculate_bias(luck, die_size), **options)
+
+    @classmethod
+    def for_range(cls, min_val, max_val, **options):
+        """Monitor for uniform numbers between min_val and max_val (e.g. from rng)"""
+        if min_val > max_val:
+            raise ValueError("min_val can't be bigger than max_val")
+        return cls(min_val, max_val - min_val + 1, **options)
+
+    def update(self, values):
+        """
+        Add a batch of values from the stream
+
+        Parameters:
+        values (array): Rolls or numbers, in the order they were made
+
+        Returns:
+        list: QualityAlert for every test that failed on a window finished by this batch
+        """
+        values = np.asarray(values)
+        if values.dtype != object:
+            values = values.astype(np.int64)
+        alerts = []
+        # Split the batch where windows end, so every window is tested on its own
+        start = 0
+        while start < len(values):
+            take = min(len(values) - start, self.window - self.current.samples - self.current.out_of_range)
+            self._add(values[start:start + take])
+            start += take
+            if self.current.samples + self.current.out_of_range >= self.window:
+                self.windows += 1
+                alerts += self._check(self.current, "window")
+                self.current = _Accumulator(self.bins)
+        return alerts
+
+    def _add(self, values):
+        offsets = values - self.low
+        inside = ((offsets >= 0) & (offsets < self.size)).astype(bool)
+        outside = len(values) - int(np.count_nonzero(inside))
+        offsets = offsets[inside]
+        if self._wide:
+            buckets = np.array([o * self.bins // self.size for o in offsets], dtype=np.int64)
+        else:
+            buckets = (offsets.astype(np.int64) * self.bins) // self.size
+        positions = offsets.astype(np.float64)
+        for accumulator in (self.total, self.current):
+            accumulator.out_of_range += outside
+            accumulator.update(buckets, positions, self._mean)
+
+    def check(self):
+        """
+        Run every test on everything seen so far
+
+        Returns:
+        list: QualityAlert for every test that failed
+        """
+        return self._check(self.total, "total")
+
+    def _results(self, accumulator):
+        return {
+            "chi_square": accumulator.chi_square(self.expected),
+            "serial_correlation": accumulator.serial_correlation(),
+            "runs": accumulator.runs_test(),
+        }
+
+    def _check(self, accumulator, scope):
+        samples = accumulator.samples + accumulator.out_of_range
+        failed = []
+        if accumulator.out_of_range:
+            failed.append(QualityAlert("range", accumulator.out_of_range, 0.0, samples, scope))
+        for test, (statistic, p_value) in self._results(accumulator).items():
+            if p_value < self.alpha:
+                failed.append(QualityAlert(test, statistic, p_value, samples, scope))
+
+        for alert in failed:
+            self.alerts.append(alert)
+            STATS.count("quality_alerts")
+            if self.on_alert is not None:
+                self.on_alert(alert)
+        return failed
+
+    def report(self):
+        """
+        Where every test stands on everything seen so far
+
+        Returns:
+        dict: samples, out_of_range, windows, alerts and (statistic, p-value) of every test
+        """
+        report = {
+            "samples": self.total.samples + self.total.out_of_range,
+            "out_of_range": self.total.out_of_range,
+            "windows": self.windows,
+            "alerts": len(self.alerts),
+        }
+        report.update(self._results(self.total))
+        return report
+
+    def watch(self, stream, batch=4096):
+        """
+        Pass a stream through unchanged while monitoring it
+
+        Works with single values (e.g. dice.stream(...)) and with chunks
+        (dice.stream(..., as_chunks=True), rng.stream_numbers(...)). Single
+        values are checked batch at a time.
+
+        Parameters:
+        stream (iterable): Values or numpy.ndarray chunks
+        batch (int): Single values collected before they're checked
+
+        Returns:
+        generator: The same items the stream yields
+        """
+        pending = []
+        try:
+            for item in stream:
+                if isinstance(item, np.ndarray):
+                    self.update(item)
+                else:
+                    pending.append(item)
+                    if len(pending) >= batch:
+                        self.update(pending)
+                        pending = []
+                yield item
+        finally:
+            if pending:
+                self.update(pending)
+
+
+def print_alert(alert):
+    """Print one alert in a readable form (handy as on_alert)"""
+    print(f"\nQUALITY ALERT: {alert.test} test failed on the {alert.scope} "
+          f"({alert.samples} values, statistic {alert.statistic:.4g}, p = {alert.p_value:.3g})")
+
+
+def print_report(monitor):
+    """Print where every test of a monitor stands"""
+    report = monitor.report()
+    print("--- stream quality ---")
+    print(f"values checked: {report['samples']} ({report['windows']} windows, "
+          f"{report['out_of_range']} out of range, {report['alerts']} alerts)")
+    for test in ("chi_square", "serial_correlation", "runs"):
+        statistic, p_value = report[test]
+        print(f"{test}: statistic {statistic:.4g}, p = {p_value:.3g}")
@@ -1,15 +1,90 @@
-from qiskit import QuantumCircuit
-from qiskit.primitives import Sampler
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+import multiprocessing
+import os
+import re
+import threading
+
 import numpy as np
 import time
 
+from Quantum_Dice_With_Luck_Bias.backends import (
+    EntropyBackend, backend_names, bytes_to_ints, create_backend, get_default_backend
+)
+from Quantum_Dice_With_Luck_Bias.bias_tables import calculate_bias, check_luck, get_alias_table
+from Quantum_Dice_With_Luck_Bias.bit_sampler import EntropyEfficientSampler
+from Quantum_Dice_With_Luck_Bias.circuit_cache import MAX_CIRCUIT_QUBITS, get_biased_circuit
+from Quantum_Dice_With_Luck_Bias.custom_dice import CustomDie
+from Quantum_Dice_With_Luck_Bias.dice_expressions import roll_expressions
+from Quantum_Dice_With_Luck_Bias.distribution import DistributionEngine
+from Quantum_Dice_With_Luck_Bias.instrumentation import STATS
+from Quantum_Dice_With_Luck_Bias.roll_plan import MAX_PLAN_QUBITS, roll_plan
+from Quantum_Dice_With_Luck_Bias.tapes import RecordingBackend, ReplayBackend
+
+# Any die named like d3 or d1000 can be rolled, not just the ones in dice_types
+DIE_PATTERN = re.compile(r"d(\d+)")
+
 class QuantumDice:
-    def __init__(self):
-        """Initialize the quantum dice simulator"""
+    # Most async rolls that can be waiting on the dice at once (see aroll_dice)
+    max_async_rolls = 256
+    # Biggest dN we roll (a lucky d1000000 needs a 16 MB alias table)
+    max_die_size = 1000000
+    
+    def __init__(self, pool=None, efficient=False, native_bias=False, seed=None, backend=None,
+                 record_to=None, replay_from=None):
+        """
+        Initialize the quantum dice simulator
+        
+        Parameters:
+        pool (EntropyPool): Optional pre-filled pool of quantum random bytes.
+            When given, rolls take their bits from the pool instead of
+            waiting on the simulator.
+        efficient (bool): Draw rolls from a stream of measured bytes with the
+            EntropyEfficientSampler instead of one rejection-sampled circuit
+            per roll, so (almost) no measured bits get thrown away
+        native_bias (bool): Put the luck bias into the circuit itself with
+            rotation gates, so one measurement gives a biased face directly
+            (takes priority over pool/efficient, which only hold uniform bits).
+            Dice wider than MAX_CIRCUIT_QUBITS are still rolled the usual way.
+        seed (int): Give these dice their own seeded backend so the same seed
+            always gives the same rolls (otherwise the shared backend is used)
+        backend (str or EntropyBackend): Where the random bits come from, e.g.
+            "sampler", "statevector", "aer", "classical", "urandom" or "auto"
+            (see backends.py). Defaults to the QUANTUM_DICE_BACKEND
+            environment variable, or the qiskit Sampler if that isn't set.
+        record_to (str): Append every raw value the backend measures to this
+            tape file (see tapes.py)
+        replay_from (str): Roll from the values recorded on this tape instead
+            of a backend, so the same rolls come out again without running
+            anything (use the same settings and calls as the recording)
+        """
+        self.pool = pool
+        self.native_bias = native_bias
+        if replay_from is not None:
+            self.backend = ReplayBackend(replay_from)
+        elif isinstance(backend, EntropyBackend):
+            self.backend = backend
+        elif backend is None and seed is None:
+            self.backend = get_default_backend()
+        else:
+            self.backend = create_backend(backend, seed)
+        if record_to is not None:
+            self.backend = RecordingBackend(self.backend, record_to)
+        if native_bias and not self.backend.runs_circuits:
+            raise ValueError(f"native_bias needs a backend that runs circuits, not {self.backend.name}")
+        # Hands out independent seeds to sweep workers
+        if isinstance(seed, np.random.SeedSequence):
+            self._seed_sequence = seed
+        else:
+            self._seed_sequence = np.random.SeedSequence(seed)
+        # Async rolls go through a RollService that is only created on first use
+        self._service = None
+        self._async_slots = None
+        self._service_lock = threading.Lock()
+        # Keeps track of how many bits each roll costs (see bits_per_roll)
+        self.bit_sampler = EntropyEfficientSampler(self._random_bytes) if efficient else None
         # These will be the types of dice we can roll
         # Standard tabletop dice, with a d100 added in for fun
-        self.sampler = Sampler()
         self.dice_types = {
             "d4": 4,
             "d6": 6,
@@ -19,6 +94,79 @@ class QuantumDice:
             "d20": 20,
             "d100": 100
         }
+        # Dice added at runtime with add_die, by name
+        self.custom_dice = {}
+    
+    @property
+    def sampler(self):
+        """The qiskit sampler our backend runs circuits on (None for non-qiskit backends)"""
+        return getattr(self.backend, "sampler", None)
+    
+    def add_die(self, name, faces, weights=None):
+        """
+        Add a die with custom faces and/or weights that can be rolled by name
+        
+        Luck works on custom dice too, favouring the faces at the start (luck
+        below 5) or the end (luck above 5) of the list. Custom dice are always
+        rolled with an alias table, even with native_bias on.
+        
+        Parameters:
+        name (str): Name to roll the die by, e.g. "fudge" or "loot"
+        faces (int or list): Number of faces, or the value of every face
+        weights (list): Optional weight of every face, e.g. [1, 1, 1, 1, 1, 2]
+            for a d6 that rolls a 6 twice as often
+        
+        Returns:
+        CustomDie: The new die
+        """
+        if name in self.dice_types or DIE_PATTERN.fullmatch(name):
+            raise ValueError(f"{name} is already a standard die")
+        die = CustomDie(faces, weights)
+        self.custom_dice[name] = die
+        return die
+    
+    def _resolve_die(self, die_type):
+        """
+        Look up a die by name
+        
+        Returns:
+        tuple: (number of faces, the CustomDie or None for a plain die with faces 1 to N)
+        """
+        if die_type in self.custom_dice:
+            die = self.custom_dice[die_type]
+            return die.num_faces, die
+        if die_type in self.dice_types:
+            return self.dice_types[die_type], None
+        match = DIE_PATTERN.fullmatch(die_type) if isinstance(die_type, str) else None
+        if match is not None and 1 <= int(match.group(1)) <= self.max_die_size:
+            return int(match.group(1)), None
+        names = list(self.dice_types) + list(self.custom_dice)
+        raise ValueError(f"Invalid die type. Choose from: {', '.join(names)} "
+                         f"(or any dN up to d{self.max_die_size})")
+    
+    def die_size(self, die_type):
+        """
+        Number of faces on a die (checking that it's a die we can roll)
+        
+        Parameters:
+        die_type (str): A die in dice_types, any dN, or a die added with add_die
+        
+        Returns:
+        int: Number of faces
+        """
+        return self._resolve_die(die_type)[0]
+    
+    def face_probabilities(self, die_type="d20", luck=5):
+        """
+        Exact chance of every face of a die at this luck
+        
+        Returns:
+        numpy.ndarray: Probability of each face (index 0 is the first face)
+        """
+        die_size, custom = self._resolve_die(die_type)
+        if custom is not None:
+            return custom.probabilities(luck)
+        return calculate_bias(luck, die_size)
     
     def _calculate_bias(self, luck, die_size):
         """
@@ -26,58 +174,35 @@ class QuantumDice:
         luck = 5 means no bias (50/50)
         luck < 5 biases toward lower numbers
         luck > 5 biases toward higher numbers
+        (see bias_tables.calculate_bias for how the weights are worked out)
         """
-        # Convert luck to a scale from -0.4 to 0.4 (0 is neutral)
-        # This gives us a moderate range of bias without being too extreme
-        # any higher of a bias gives us very skewed distributions, setting
-        # probability of some faces almost to 0 if were not careful
-        bias = (luck - 5) / 10
-        
-        # Create weights for each face value
-        weights = np.ones(die_size)
-        # ever face of the die starts with a probability of 1
-        # Apply bias: positive bias increases probability of higher numbers
-        for i in range(die_size):
-            # Normalized position in the range (0 to 1)
-            position = i / (die_size - 1)
-            # Apply a bias that increases or decreases based on position of the face and luck modifier
-            weights[i] += bias * (2 * position - 1)
-            """
-            Much needed example for this calculation:
-            die_size = 6 / luck modifier = 8
-            this gives a bias of 0.3
-            initial face weights = [1, 1, 1, 1, 1, 1]
-            weights[i] += bias * (2 * position - 1) = 0.3 * (2 * i/5 - 1)
-            weights AFTER bias calculation = [0.7, 0.82, 0.94, 1.06, 1.18, 1.3]
-            """
-        
-        # Ensure all weights are positive
-        weights = np.maximum(weights, 0.1)
-        
-        # Normalize weights to sum to 1
-        return weights / np.sum(weights)
+        return calculate_bias(luck, die_size)
     
     def roll_die(self, die_type="d20", luck=5):
         """
         Roll a quantum die with optional luck modifier
         
         Parameters:
-        die_type (str): Type of die to roll (d4, d6, d8, d10, d12, d20, d100)
-        luck (int): Luck modifier from 1-10, with 5 being neutral
+        die_type (str): Type of die to roll (d4, d6, d8, d10, d12, d20, d100,
+            any other dN, or a die added with add_die)
+        luck (float): Luck modifier from 1-10, with 5 being neutral
             - Lower values bias toward lower numbers
             - Higher values bias toward higher numbers
+            - Fractions like 6.5 work too
         
         Returns:
-        int: The result of the die roll
+        int: The result of the die roll (the face value for custom dice)
         """
         # Validate inputs
-        if die_type not in self.dice_types:
-            raise ValueError(f"Invalid die type. Choose from: {', '.join(self.dice_types.keys())}")
+        die_size, custom = self._resolve_die(die_type)
+        
+        check_luck(luck)
         
-        if not 1 <= luck <= 10:
-            raise ValueError("Luck must be between 1 and 10")
+        if custom is not None:
+            return custom.face_values(self._roll_custom(custom, luck, 1)).tolist()[0]
         
-        die_size = self.dice_types[die_type]
+        if self.native_bias:
+            return int(self._roll_native(die_size, luck, 1)[0])
         
         # For perfectly neutral luck (5), use the unbiased quantum RNG
         if luck == 5:
@@ -86,97 +211,597 @@ class QuantumDice:
             # Otherwise use the biased version
             return self._roll_biased(die_size, luck)
     
+    def roll_dice(self, die_type="d20", luck=5, n=1):
+        """
+        Roll a quantum die n times using batched sampler runs
+        
+        Instead of running one single-shot circuit per roll, all n rolls come
+        from one circuit run with shots=n. Any rejected values (out of range for
+        the die) are topped up by follow-up batches.
+        
+        Parameters:
+        die_type (str): Type of die to roll (d4, d6, d8, d10, d12, d20, d100,
+            any other dN, or a die added with add_die)
+        luck (float): Luck modifier from 1-10, with 5 being neutral
+        n (int): Number of rolls to make
+        
+        Returns:
+        numpy.ndarray: Array of n roll results (1 to die size, or face values for custom dice)
+        """
+        # Validate inputs
+        die_size, custom = self._resolve_die(die_type)
+        
+        check_luck(luck)
+        
+        if n < 0:
+            raise ValueError("Number of rolls can't be negative")
+        
+        if custom is not None:
+            return custom.face_values(self._roll_custom(custom, luck, n))
+        
+        if self.native_bias:
+            return self._roll_native(die_size, luck, n)
+        
+        if luck == 5:
+            return self._roll_unbiased_batch(die_size, n)
+        else:
+            return self._roll_biased_batch(die_size, luck, n)
+    
+    def roll_plan(self, dice, luck=5, max_qubits=MAX_PLAN_QUBITS):
+        """
+        Roll a mix of different dice (e.g. a d20, two d6 and a d8) together
+        
+        On backends that run circuits, all the dice go into one circuit (or a
+        few, each at most max_qubits wide) with a classical register per die,
+        so the whole turn costs about one sampler call instead of one per die
+        (see roll_plan.py). Custom dice, dice too wide for a circuit, and all
+        the dice on other backends are rolled with one batched roll_dice call
+        per die and luck.
+        
+        Parameters:
+        dice (list): Die types like "d20", or (die_type, luck) pairs for dice
+            with their own luck
+        luck (int): Luck for the dice that don't have their own
+        max_qubits (int): Widest circuit to pack dice into
+        
+        Returns:
+        list: The result of every die, in the order given
+        """
+        # Pools and the efficient sampler only hold uniform bits, not circuits
+        use_circuits = self.backend.runs_circuits and self.pool is None and self.bit_sampler is None
+        widest = min(max_qubits, MAX_CIRCUIT_QUBITS)
+        
+        plan = []
+        in_circuit = []
+        for entry in dice:
+            die_type, die_luck = (entry, luck) if isinstance(entry, str) else entry
+            die_size, custom_die = self._resolve_die(die_type)
+            check_luck(die_luck)
+            plan.append((die_type, die_luck))
+            # Custom dice are rolled from their alias tables, and wide dice
+            # from several narrow circuits (or an alias table) like roll_dice does
+            if use_circuits and custom_die is None and (die_size - 1).bit_length() <= widest:
+                in_circuit.append(len(plan) - 1)
+        
+        results = [None] * len(plan)
+        if in_circuit:
+            sizes = [(self.die_size(plan[i][0]), plan[i][1]) for i in in_circuit]
+            for index, roll in zip(in_circuit, roll_plan(self.backend, sizes, max_qubits)):
+                results[index] = roll
+        
+        # Roll each remaining (die, luck) group in one batch and hand the results back out
+        groups = {}
+        for index, key in enumerate(plan):
+            if results[index] is None:
+                groups.setdefault(key, []).append(index)
+        for (die_type, die_luck), indices in groups.items():
+            for index, roll in zip(indices, self.roll_dice(die_type, die_luck, len(indices)).tolist()):
+                results[index] = roll
+        return results
+    
+    def roll_expression(self, expression, luck=5, n=1):
+        """
+        Roll a tabletop dice expression like "4d6kh3+2" or "2d20kl1@8"
+        
+        All the dice the expression needs are drawn up front with one batched
+        roll_dice call per die and luck (see dice_expressions.py).
+        
+        Parameters:
+        expression (str or DiceExpression): The expression to roll
+        luck (int): Luck for every term that doesn't set its own with @
+        n (int): Number of times to roll the expression
+        
+        Returns:
+        int: The total (or numpy.ndarray of n totals when n isn't 1)
+        """
+        totals = roll_expressions(self, [expression], n, luck)[0]
+        return int(totals[0]) if n == 1 else totals
+    
+    def stream(self, die_type="d20", luck=5, chunk=4096, as_chunks=False):
+        """
+        Endless stream of rolls, made chunk rolls at a time
+        
+        Only one chunk is held in memory at a time, so the stream can run for
+        as long as the consumer wants and stop whenever it likes (break out of
+        the loop or close() the generator). The first roll only waits for the
+        first chunk, not for all of them.
+        
+        Parameters:
+        die_type (str): Type of die to roll (any die roll_dice takes)
+        luck (float): Luck modifier from 1-10, with 5 being neutral
+        chunk (int): Number of rolls made per batched roll_dice call
+        as_chunks (bool): Yield whole numpy arrays of chunk rolls instead of single ints
+        
+        Returns:
+        generator: Yields ints (or numpy.ndarray chunks) forever
+        """
+        # Check everything now, rather than on the first next() of the generator
+        self._resolve_die(die_type)
+        check_luck(luck)
+        if chunk < 1:
+            raise ValueError("Chunk size must be at least 1")
+        return self._stream(die_type, luck, chunk, as_chunks)
+    
+    def _stream(self, die_type, luck, chunk, as_chunks):
+        """The generator behind stream()"""
+        while True:
+            rolls = self.roll_dice(die_type, luck, chunk)
+            if as_chunks:
+                yield rolls
+            else:
+                # tolist() turns the whole chunk into Python ints in one go
+                yield from rolls.tolist()
+    
+    async def aroll_die(self, die_type="d20", luck=5):
+        """
+        Async version of roll_die, for use from an asyncio event loop
+        
+        Returns:
+        int: The result of the die roll (the face value for custom dice)
+        """
+        rolls = await self.aroll_dice(die_type, luck, 1)
+        return rolls.tolist()[0]
+    
+    async def aroll_dice(self, die_type="d20", luck=5, n=1):
+        """
+        Async version of roll_dice, for use from an asyncio event loop
+        
+        The blocking sampler work never runs on the event loop: requests go to
+        a RollService, whose single worker thread rolls everything that arrives
+        at about the same time in one batch. At most max_async_rolls requests
+        wait on it at once; the rest wait their turn on the event loop instead
+        of piling up more work behind the sampler.
+        
+        Avoid mixing these with plain roll_die/roll_dice calls from other
+        threads on the same dice, since those don't go through the service.
+        
+        Returns:
+        numpy.ndarray: Array of n roll results (1 to die size)
+        """
+        import asyncio
+        
+        service, slots = self._async_state(asyncio.get_running_loop())
+        async with slots:
+            return await asyncio.wrap_future(service.submit(die_type, luck, n))
+    
+    def _async_state(self, loop):
+        """The RollService and the concurrency limit for async rolls on this event loop"""
+        import asyncio
+        from Quantum_Dice_With_Luck_Bias.roll_service import RollService
+        
+        with self._service_lock:
+            if self._service is None:
+                self._service = RollService(self)
+            # A Semaphore belongs to one event loop, so make a new one for a new loop
+            if self._async_slots is None or self._async_slots[0] is not loop:
+                self._async_slots = (loop, asyncio.Semaphore(self.max_async_rolls))
+            return self._service, self._async_slots[1]
+    
+    def bits_per_roll(self):
+        """
+        Average number of measured bits used per roll (efficient mode only)
+        
+        Returns:
+        float: Bits consumed per value drawn, or None if efficient mode is off
+        """
+        if self.bit_sampler is None:
+            return None
+        return self.bit_sampler.bits_per_value()
+    
+    def stats(self):
+        """
+        Hot-path counters, stage timings and cache hit rates (see instrumentation.py)
+        
+        The counters are shared by every QuantumDice in the process, since
+        they all use the same circuit caches and backends.
+        
+        Returns:
+        dict: STATS.snapshot() plus this dice's backend, pool fill level and bits per roll
+        """
+        snapshot = STATS.snapshot()
+        snapshot["backend"] = getattr(self.backend, "name", None)
+        snapshot["pool_fill_level"] = self.pool.fill_level() if self.pool is not None else None
+        snapshot["bits_per_roll"] = self.bits_per_roll()
+        return snapshot
+    
+    def _random_bytes(self, num_bytes):
+        """Get random bytes from the pool, or straight from the backend"""
+        if self.pool is not None:
+            return self.pool.take_bytes(num_bytes)
+        return self.backend.random_bytes(num_bytes)
+    
+    def _sample_batch(self, num_bits, shots):
+        """
+        Get `shots` uniform num_bits values, either from the entropy pool
+        or from a single multi-shot backend run
+        
+        Returns:
+        numpy.ndarray: One measured integer per shot
+        """
+        if self.pool is not None:
+            return self.pool.take_values(num_bits, shots)
+        # Backends that run circuits glue wide values together from narrower
+        # circuits themselves (see backends.sample_wide)
+        return self.backend.sample(num_bits, shots)
+    
+    def _roll_unbiased_batch(self, die_size, n):
+        """Roll an unbiased quantum die n times, refilling rejected values"""
+        if self.bit_sampler is not None:
+            return self.bit_sampler.uniform(die_size, n) + 1
+        
+        num_bits = max(1, (die_size - 1).bit_length())
+        # Fraction of outcomes that land on a face of the die
+        # e.g. a d100 uses 7 bits (128 outcomes), so 100/128 are kept
+        accept_rate = die_size / 2 ** num_bits
+        
+        results = np.empty(n, dtype=np.int64)
+        filled = 0
+        while filled < n:
+            remaining = n - filled
+            # Ask for a few extra shots so that most batches finish in one run
+            shots = int(np.ceil(remaining / accept_rate * 1.05)) + 8
+            values = self._sample_batch(num_bits, shots)
+            
+            # Keep the values that are in range for our die
+            in_range = values[values < die_size]
+            STATS.count("rejected_outcomes", len(values) - len(in_range))
+            values = in_range[:remaining]
+            results[filled:filled + len(values)] = values + 1  # +1 because dice start at 1
+            filled += len(values)
+        
+        return results
+    
+    def _random_bits(self, num_bits, n):
+        """Get n uniform values of num_bits bits each, drawn as whole bytes"""
+        if self.bit_sampler is not None:
+            return self.bit_sampler.bits(num_bits, n)
+        return bytes_to_ints(self._random_bytes(((num_bits + 7) // 8) * n), num_bits)
+    
+    def _roll_biased_batch(self, die_size, luck, n):
+        """Roll a quantum die with luck-based bias n times"""
+        # The alias table for this die and luck is only built once
+        table = get_alias_table(die_size, luck)
+        return self._sample_table(table, n) + 1  # +1 because dice start at 1
+    
+    def _roll_custom(self, die, luck, n):
+        """Roll a custom die n times, returning which face (0-based) each roll landed on"""
+        return self._sample_table(die.alias_table(luck), n)
+    
+    def _sample_table(self, table, n):
+        """
+        Draw n faces (0-based) from an alias table
+        
+        Every roll picks a uniform column, then compares threshold bits with
+        the column's threshold to choose between its face and its alias. Tables
+        have a power-of-two number of columns, so a column is just raw bits
+        that never get rejected, and the threshold bits are only drawn until
+        the comparison is decided (see AliasTable.sample_lazily).
+        
+        Biased rolls still cost more entropy than unbiased ones. With the bit
+        reservoir (efficient mode) a roll takes the column bits plus about 2
+        threshold bits on average, e.g. ~4.3 bits for a d6 at luck 1 against
+        ~2.6 at luck 5. Without it every roll draws whole bytes: 2 bytes for
+        most dice (1 for d2-d4), and the odd undecided roll draws more.
+        """
+        if self.bit_sampler is not None:
+            # The bit reservoir hands out single bits without wasting the rest
+            # of a byte (and counts every column as a roll for bits_per_roll)
+            if n == 1:
+                columns = np.array([self.bit_sampler.uniform_one(table.num_columns)])
+            else:
+                columns = self.bit_sampler.uniform(table.num_columns, n)
+            return table.sample_lazily(columns, self.bit_sampler.bits)
+        
+        # One draw per roll gives both the column and at least 6 threshold
+        # bits, filling up whole bytes (a d20 gets 5 column bits and 11
+        # threshold bits from 2 bytes). That settles all but 1 in 64 rolls,
+        # the rest draw one more byte at a time until they're decided.
+        word_bits = 8 * ((table.column_bits + 6 + 7) // 8)
+        chunk_bits = min(word_bits - table.column_bits, table.precision_bits)
+        words = self._random_bits(word_bits, n)
+        columns = words & ((1 << table.column_bits) - 1)
+        first_bits = words >> (word_bits - chunk_bits)
+        return table.sample_lazily(columns, self._random_bits, 8, first_bits, chunk_bits)
+    
+    def _face_indices(self, die_type, luck, n):
+        """Roll n dice and return which face (0-based, in order) each one landed on"""
+        die_size, custom = self._resolve_die(die_type)
+        if custom is not None:
+            return self._roll_custom(custom, luck, n)
+        return self.roll_dice(die_type, luck, n) - 1
+    
+    def _roll_native(self, die_size, luck, n):
+        """
+        Roll n dice by measuring a circuit that already has the luck bias built in
+        
+        The circuit's amplitudes are the square roots of the face probabilities
+        and every state past the last face has amplitude 0, so every shot is a
+        valid face and nothing needs to be rejected (this works for luck 5 too).
+        """
+        if (die_size - 1).bit_length() > MAX_CIRCUIT_QUBITS:
+            # Preparing the state of a wide die takes about 2**num_bits gates
+            # (minutes for a d1000000), so those use the split circuits or alias table
+            if luck == 5:
+                return self._roll_unbiased_batch(die_size, n)
+            return self._roll_biased_batch(die_size, luck, n)
+        qc = get_biased_circuit(die_size, luck)
+        return self.backend.run_circuit(qc, n) + 1  # +1 because dice start at 1
+    
     def _roll_unbiased(self, die_size):
         """Roll an unbiased quantum die"""
+        if self.bit_sampler is not None:
+            # Reuses leftover randomness instead of rejecting whole draws
+            return self.bit_sampler.uniform_one(die_size) + 1
+        
         # Calculate bits needed
         num_bits = max(1, (die_size - 1).bit_length())
         
         while True:
-            # Create circuit with required qubits
-            qc = QuantumCircuit(num_bits, num_bits)
-            
-            # Apply Hadamard gates for pure 50/50 randomness
-            for i in range(num_bits):
-                qc.h(i)
-                
-            # Measure all qubits
-            qc.measure(range(num_bits), range(num_bits))
-            
-            # Run the circuit
-            job = self.sampler.run(qc, shots=1)
-            result = job.result()
-            
-            # Get the result
-            value = list(result.quasi_dists[0].keys())[0]
+            # Measure one value (taken straight from the pool if we have one,
+            # otherwise the backend runs its cached num_bits-wide circuit)
+            value = int(self._sample_batch(num_bits, 1)[0])
             
             # Ensure the value is in range for our die
             if 0 <= value < die_size:
                 return value + 1  # +1 because dice start at 1, not 0
+            STATS.count("rejected_outcomes")
     
     def _roll_biased(self, die_size, luck):
         """Roll a quantum die with luck-based bias"""
-        # Get probability weights based on luck
-        weights = self._calculate_bias(luck, die_size)
+        # Get the precomputed alias table for our luck-based weights
+        table = get_alias_table(die_size, luck)
+        
+        # We'll use the quantum RNG to pick a random column of the table
+        # and then random threshold bits to pick between the column's face and its alias
+        return int(self._sample_table(table, 1)[0]) + 1  # +1 because dice start at 1
+    
+    def sweep_executor(self, workers=None, use_threads=False):
+        """
+        Create the worker pool that sweep() spreads its work over
         
-        # We'll use the quantum RNG to generate a random number
-        # and then use that to select from our weighted distribution
-        random_value = self._roll_unbiased(1000) / 1000.0  # Random value between 0 and 1
+        Parameters:
+        workers (int): Number of workers (None uses every CPU core)
+        use_threads (bool): Use threads instead of processes
         
-        # Calculate cumulative probabilities
-        cumulative = np.cumsum(weights)
+        Returns:
+        Executor to use as a context manager (a do-nothing context for 1 worker)
+        """
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            return nullcontext(None)
+        if use_threads:
+            return ThreadPoolExecutor(max_workers=workers)
+        # Spawn fresh workers instead of forking: a fork copies this process
+        # mid-flight, including locks held by the entropy pool or roll service
+        # threads, which can deadlock the worker that inherits them
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    
+    def worker_options(self):
+        """
+        Settings a worker process needs to build dice like these
         
-        # Find where our random value falls in the cumulative distribution
-        for i in range(die_size):
-            if random_value <= cumulative[i]:
-                return i + 1  # +1 because dice start at 1
+        Workers rebuild the backend from its name, which tape backends don't
+        have (and their tape lives here), so dice on those get None and have
+        to roll right here.
         
-        # Fallback (should never reach here)
-        return die_size
+        Returns:
+        dict: Picklable settings for worker_dice, or None if workers can't copy these dice
+        """
+        if self.backend.name not in backend_names(False):
+            return None
+        return {
+            "efficient": self.bit_sampler is not None,
+            "native_bias": self.native_bias,
+            "backend": self.backend.name,
+            "dice_types": dict(self.dice_types),
+            "custom_dice": dict(self.custom_dice),
+        }
     
-    def visualize_bias(self, die_type="d20", num_rolls=1000):
+    def sweep(self, die_type="d20", luck_values=(1, 3, 5, 7, 10), n=1000,
+              workers=None, use_threads=False, executor=None):
+        """
+        Roll n dice for every luck value, spread over a pool of workers
+        
+        The luck values don't depend on each other, so each one's rolls are
+        split into chunks that run in parallel. Every chunk builds its own
+        dice (and so its own sampler) from an independent seed, and the
+        per-face counts of all the chunks are added together at the end.
+        
+        Parameters:
+        die_type (str): Type of die to roll
+        luck_values (list): Luck values to roll for
+        n (int): Number of rolls per luck value
+        workers (int): Number of workers (None uses every CPU core, 1 rolls
+            everything right here without a pool)
+        use_threads (bool): Use threads instead of processes
+        executor: Already running pool to reuse (see sweep_executor)
+        
+        Returns:
+        dict: luck -> numpy.ndarray with the number of hits on each face
+            (index 0 is the first face)
+        """
+        die_size = self.die_size(die_type)
+        
+        for luck in luck_values:
+            check_luck(luck)
+        
+        workers = workers or os.cpu_count() or 1
+        
+        options = self.worker_options()
+        if (executor is None and workers == 1) or options is None:
+            return {luck: np.bincount(self._face_indices(die_type, luck, n), minlength=die_size)
+                    for luck in luck_values}
+        
+        # Split every luck value's rolls into enough chunks to keep all the workers busy
+        chunks_per_luck = max(1, -(-workers // len(luck_values)))
+        chunk_size = max(1, -(-n // chunks_per_luck))
+        
+        counts = {luck: np.zeros(die_size, dtype=np.int64) for luck in luck_values}
+        context = nullcontext(executor) if executor is not None else self.sweep_executor(workers, use_threads)
+        with context as pool:
+            futures = []
+            for luck in luck_values:
+                for start in range(0, n, chunk_size):
+                    seed = self._seed_sequence.spawn(1)[0]
+                    future = pool.submit(_sweep_chunk, die_type, luck,
+                                         min(chunk_size, n - start), seed, options)
+                    futures.append((luck, future))
+            
+            # Merge the count arrays from every chunk
+            for luck, future in futures:
+                counts[luck] += future.result()
+        
+        return counts
+    
+    def visualize_bias(self, die_type="d20", num_rolls=1000, workers=None):
         """
         Visualize how different luck values affect die rolls
         
         Parameters:
         die_type (str): Type of die to simulate
         num_rolls (int): Number of rolls to simulate for each luck value
+        workers (int): Number of worker processes to roll with (None uses every CPU core)
         """
-        if die_type not in self.dice_types:
-            raise ValueError(f"Invalid die type. Choose from: {', '.join(self.dice_types.keys())}")
+        # Selected luck values to display
+        engine = DistributionEngine(self, die_type, luck_values=[1, 3, 5, 7, 10])
+        expected = engine.expected()
+        faces = np.arange(1, engine.die_size + 1)
+        
+        # Roll everything in batches, only the per-face counts are kept
+        for _ in engine.run(num_rolls, batch_size=num_rolls, workers=workers):
+            pass
         
-        die_size = self.dice_types[die_type]
-        luck_values = [1, 3, 5, 7, 10]  # Selected luck values to display
+        # matplotlib is slow to import, so only load it when we actually plot
+        import matplotlib.pyplot as plt
         
         plt.figure(figsize=(12, 8))
         
-        for luck in luck_values:
-            results = []
-            for _ in range(num_rolls):
-                results.append(self.roll_die(die_type, luck))
-            
-            # Create histogram
-            plt.hist(results, bins=range(1, die_size + 2), alpha=0.6, 
-                     label=f"Luck = {luck}")
+        for luck, histogram in engine.histograms.items():
+            # Create histogram, with the exact expected counts as a dashed line
+            bars = plt.bar(faces, histogram.counts, width=1.0, alpha=0.6,
+                           label=f"Luck = {luck}")
+            plt.plot(faces, expected[luck] * num_rolls, linestyle="--",
+                     color=bars.patches[0].get_facecolor(), alpha=1.0)
         
         plt.title(f"Effect of Luck on {die_type} Rolls ({num_rolls} rolls per luck value)")
         plt.xlabel("Roll Result")
-        plt.ylabel("Number of hits")
-        plt.xticks(range(1, die_size + 1))
+        plt.ylabel("Number of hits (dashed = expected)")
+        plt.xticks(faces)
         plt.legend()
         plt.grid(alpha=0.3)
         plt.show()
 
-# Interactive test
-if __name__ == "__main__":
-    dice = QuantumDice()
+def worker_dice(options, seed):
+    """
+    Build a worker's own dice from QuantumDice.worker_options()
+    
+    Parameters:
+    options (dict): The settings from worker_options()
+    seed (SeedSequence): Independent seed for the worker's backend
+    
+    Returns:
+    QuantumDice: Dice with the same settings and dice, on their own backend
+    """
+    dice = QuantumDice(efficient=options["efficient"], native_bias=options["native_bias"],
+                       seed=seed, backend=options["backend"])
+    dice.dice_types = options["dice_types"]
+    dice.custom_dice = options["custom_dice"]
+    return dice
+
+def _sweep_chunk(die_type, luck, n, seed, options):
+    """Roll one chunk of a sweep inside a worker and return its per-face counts"""
+    dice = worker_dice(options, seed)
+    return np.bincount(dice._face_indices(die_type, luck, n), minlength=dice.die_size(die_type))
+
+def print_stats(stats):
+    """Print a stats() snapshot in a readable form"""
+    counters = stats["counters"]
+    seconds = stats["seconds"]
+    print("--- hot path stats ---")
+    print(f"backend: {stats.get('backend')}")
+    for name, value in counters.items():
+        print(f"{name}: {value}")
+    for stage, spent in seconds.items():
+        print(f"time in {stage}: {spent * 1000:.2f} ms")
+    for name, cache in stats["caches"].items():
+        rate = "n/a" if cache["hit_rate"] is None else f"{cache['hit_rate']:.0%}"
+        line = f"{name} cache: {cache['hits']} hits, {cache['misses']} misses ({rate})"
+        if "bytes" in cache:
+            line += f", {cache['bytes'] / 1024:.0f} KB, {cache['evictions']} evicted"
+        print(line)
+
+
+def main(argv=None):
+    """Interactive quantum dice roller for the command line"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Roll quantum dice with luck modifiers")
+    parser.add_argument("--stats", action="store_true",
+                        help="print hot-path counters and timings after every roll")
+    parser.add_argument("--backend", help="entropy backend (default: QUANTUM_DICE_BACKEND or sampler)")
+    parser.add_argument("--efficient", action="store_true", help="use the entropy-efficient sampler")
+    parser.add_argument("--record", metavar="TAPE", help="append every measured value to this tape file")
+    parser.add_argument("--replay", metavar="TAPE", help="roll from a recorded tape instead of a backend")
+    export = parser.add_argument_group("bulk export (skips the interactive roller)")
+    export.add_argument("--export", metavar="PATH", help="write rolls to this file and exit")
+    export.add_argument("--die", default="d20", help="die to roll for --export (default d20)")
+    export.add_argument("--luck", type=float, default=5, help="luck for --export (default 5)")
+    export.add_argument("-n", "--count", type=int, default=1000000, help="number of rolls to export")
+    export.add_argument("--format", choices=("npy", "raw", "bits"),
+                        help="file format (default: from the extension, .npy/.bits/anything else is raw)")
+    export.add_argument("--chunk", type=int, default=65536, help="rolls made per sampler batch")
+    export.add_argument("--monitor", action="store_true",
+                        help="run the streaming quality checks on the exported rolls")
+    args = parser.parse_args(argv)
+    
+    dice = QuantumDice(backend=args.backend, efficient=args.efficient,
+                       record_to=args.record, replay_from=args.replay)
+    
+    if args.export:
+        from Quantum_Dice_With_Luck_Bias.export import export_rolls
+        
+        die_type = args.die.lower()
+        rolls = dice.stream(die_type, args.luck, chunk=args.chunk, as_chunks=True)
+        if args.monitor:
+            from Quantum_Dice_With_Luck_Bias.quality_monitor import QualityMonitor, print_alert, print_report
+            
+            monitor = QualityMonitor.for_die(dice, die_type, args.luck, on_alert=print_alert)
+            rolls = monitor.watch(rolls)
+        fmt = export_rolls(args.export, rolls, args.count, 1, dice.die_size(die_type), args.format)
+        print(f"Wrote {args.count} {die_type} rolls (luck {args.luck}) to {args.export} as {fmt}")
+        if args.monitor:
+            print_report(monitor)
+        if args.stats:
+            print_stats(dice.stats())
+        return
     
     print("🎲 QUANTUM DICE SIMULATOR 🎲")
     print("Using real quantum mechanics to roll dice with luck modifiers!")
-    print("\nAvailable dice:", ", ".join(dice.dice_types.keys()))
+    print("\nAvailable dice:", ", ".join(dice.dice_types.keys()), "(or any dN, like d1000)")
     
     while True:
         try:
-            die_choice = input("\nChoose a die type (or 'q' to quit, 'v' to visualize): ").lower()
+            die_choice = input("\nChoose a die type or dice expression like 4d6kh3+2 "
+                               "(or 'q' to quit, 'v' to visualize): ").lower()
             
             if die_choice == 'q':
                 print("Thanks for playing with quantum dice!")
@@ -187,15 +812,21 @@ if __name__ == "__main__":
                 dice.visualize_bias(vis_die)
                 continue
                 
-            luck = int(input("Enter your luck (1-10, 5 is neutral): "))
+            luck = float(input("Enter your luck (1-10, 5 is neutral): "))
             
             print("\nRolling the quantum", die_choice, "...")
             # Add a slight delay for dramatic effect
             time.sleep(0.5)
             
-            result = dice.roll_die(die_choice, luck)
+            # Anything that isn't a plain die type is read as dice notation, e.g. 4d6kh3+2
+            if die_choice in dice.dice_types:
+                result = dice.roll_die(die_choice, luck)
+            else:
+                result = dice.roll_expression(die_choice, luck)
             
             print(f"⚛️ You rolled: {result} ⚛️")
+            if args.stats:
+                print_stats(dice.stats())
             
             # Offer to roll again
             again = input("\nRoll again? (y/n): ").lower()
@@ -207,4 +838,9 @@ if __name__ == "__main__":
             print("Error:", e)
         except KeyboardInterrupt:
             print("\nThanks for playing with quantum dice!")
-            break
\ No newline at end of file
+            break
+
+
+# Interactive test (run from the project root: python -m Quantum_Dice_With_Luck_Bias)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Roll plans: several different dice rolled in one wide circuit
+
+A turn often needs a mix of dice, say a d20, two d6 and a d8. Rolled one at a
+time, every die is its own circuit and its own sampler round trip. A roll plan
+puts the dice side by side in one circuit instead, each on its own qubits with
+its own classical register, so a single sampler call measures all of them.
+
+Unbiased dice whose size isn't a power of two can still land on an outcome
+past their last face. To make that rare, a round with such dice in it is run
+for PLAN_SHOTS shots and every die keeps the first shot that landed on a face
+(extra shots cost next to nothing on a simulator, unlike another round trip).
+Only dice that missed in every shot get redrawn, packed together into the
+next, smaller circuit.
+
+Simulation cost doubles with every qubit, so dice are packed into circuits of
+at most max_qubits qubits (first-fit, widest dice first). On the local
+simulators a few ~10 qubit circuits are much cheaper than one 20+ qubit one.
+All the circuits of a round are still sent in one backend run (see
+EntropyBackend.run_batch), so packing them narrower doesn't add round trips.
+Dice wider than MAX_CIRCUIT_QUBITS never go into a plan at all;
+QuantumDice.roll_plan rolls those the same way roll_dice does.
+"""
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.circuit_cache import get_plan_circuit
+from Quantum_Dice_With_Luck_Bias.instrumentation import STATS
+
+# Widest circuit a plan packs dice into by default
+MAX_PLAN_QUBITS = 10
+
+# Shots per round when some die can miss its faces (a d20 misses all 4 about 2% of the time)
+PLAN_SHOTS = 4
+
+
+def pack_dice(widths, max_qubits=MAX_PLAN_QUBITS):
+    """
+    Group dice into circuits of at most max_qubits qubits
+
+    Parameters:
+    widths (list): Qubits needed by every die
+    max_qubits (int): Widest circuit allowed
+
+    Returns:
+    list: For every circuit, the indices of the dice in it
+    """
+    if max_qubits < 1:
+        raise ValueError("max_qubits must be at least 1")
+    if widths and max(widths) > max_qubits:
+        raise ValueError(f"A die needing {max(widths)} qubits doesn't fit in {max_qubits}")
+    circuits = []
+    free = []
+    # First fit, widest dice first, leaves the least room unused
+    for index in sorted(range(len(widths)), key=lambda i: -widths[i]):
+        for c, room in enumerate(free):
+            if widths[index] <= room:
+                circuits[c].append(index)
+                free[c] -= widths[index]
+                break
+        else:
+            circuits.append([index])
+            free.append(max_qubits - widths[index])
+    # Keep every circuit's dice in plan order, so the same plan gives the same circuit
+    return [sorted(indices) for indices in circuits]
+
+
+def roll_plan(backend, dice, max_qubits=MAX_PLAN_QUBITS):
+    """
+    Roll a list of (die_size, luck) dice with as few circuit runs as possible
+
+    Parameters:
+    backend (EntropyBackend): A backend that runs circuits
+    dice (list): (die_size, luck) for every die
+    max_qubits (int): Widest circuit to run
+
+    Returns:
+    list: The result (1 to die_size) of every die, in the order given
+    """
+    results = [None] * len(dice)
+    pending = list(range(len(dice)))
+    while pending:
+        widths = [max(1, (dice[i][0] - 1).bit_length()) for i in pending]
+        groups = [[pending[g] for g in group] for group in pack_dice(widths, max_qubits)]
+        # Every circuit of this round goes to the backend in a single run
+        circuits = [get_plan_circuit(tuple(dice[i] for i in indices)) for indices in groups]
+        # Biased dice and power-of-two dice always land on a face, one shot is enough
+        can_miss = any(dice[i][1] == 5 and dice[i][0] & (dice[i][0] - 1) for i in pending)
+        batch = backend.run_batch(circuits, PLAN_SHOTS if can_miss else 1)
+
+        for indices, registers in zip(groups, batch):
+            # Split the measurement per die, keeping its first shot that landed on a face
+            for index, values in zip(indices, registers):
+                hits = np.flatnonzero(values < dice[index][0])
+                if len(hits):
+                    results[index] = int(values[hits[0]]) + 1  # +1 because dice start at 1
+                    STATS.count("rejected_outcomes", int(hits[0]))
+                else:
+                    STATS.count("rejected_outcomes", len(values))
+
+        # Only the dice that were rejected get rolled again
+        pending = [i for i in pending if results[i] is None]
+    return results
@@ -0,0 +1,186 @@
+"""
+Micro-batching roll service for a QuantumDice shared between threads
+
+The Streamlit app shares one QuantumDice between every session, so when several
+people press "Roll" at once, each of them used to call roll_die on the same
+object at the same time (with nothing stopping them from stepping on each
+other) and each paid for a sampler run of its own.
+
+The RollService puts every roll request in a queue instead. One worker thread
+waits a very short window after the first request arrives (or until the batch
+is big enough), groups what it collected by die and luck, rolls each group with
+a single multi-shot roll_dice call and hands every caller its own share of the
+results. Since only the worker thread ever touches the dice, callers don't
+need any locking, and ten concurrent rolls of a d20 cost one sampler run
+instead of ten.
+"""
+from concurrent.futures import Future
+import threading
+import time
+
+from Quantum_Dice_With_Luck_Bias.bias_tables import check_luck
+from Quantum_Dice_With_Luck_Bias.instrumentation import STATS
+
+
+class RollService:
+    def __init__(self, dice, window=0.002, max_batch=1024, start=True):
+        """
+        Create a roll service in front of a QuantumDice
+
+        Parameters:
+        dice (QuantumDice): The dice every request is rolled with
+        window (float): Seconds to keep collecting requests after the first one arrives
+        max_batch (int): Number of rolls that closes a batch early
+        start (bool): Start the worker thread straight away
+        """
+        if window < 0:
+            raise ValueError("Window can't be negative")
+        if max_batch < 1:
+            raise ValueError("Max batch must be at least 1")
+
+        self.dice = dice
+        self.window = window
+        self.max_batch = max_batch
+
+        # Requests waiting for the next batch: (future, die_type, luck, n)
+        self._pending = []
+        self._pending_rolls = 0
+
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        if start:
+            self.start()
+
+    def start(self):
+        """Start the worker thread (does nothing if it's already running)"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._serve_loop,
+                                            name="roll-service", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the worker thread once the requests already queued are rolled"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def submit(self, die_type="d20", luck=5, n=1):
+        """
+        Queue a request for n rolls without waiting for them
+
+        Parameters:
+        die_type (str): Type of die to roll (anything dice.roll_dice takes)
+        luck (float): Luck modifier from 1-10, with 5 being neutral
+        n (int): Number of rolls
+
+        Returns:
+        concurrent.futures.Future: Resolves to a numpy.ndarray of n rolls
+        """
+        # Check the request here so the caller gets the error, not the batch
+        self.dice.die_size(die_type)
+        check_luck(luck)
+        if n < 0:
+            raise ValueError("Number of rolls can't be negative")
+
+        future = Future()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Roll service is stopped")
+            self._pending.append((future, die_type, luck, n))
+            self._pending_rolls += n
+            self._cond.notify_all()
+        return future
+
+    def roll(self, die_type="d20", luck=5, timeout=None):
+        """
+        Roll one die, sharing a sampler run with any other rolls requested meanwhile
+
+        Parameters:
+        die_type (str): Type of die to roll (anything dice.roll_dice takes)
+        luck (float): Luck modifier from 1-10, with 5 being neutral
+        timeout (float): Seconds to wait for the result (None waits forever)
+
+        Returns:
+        int: The result of the die roll (the face value for custom dice)
+        """
+        return self.submit(die_type, luck, 1).result(timeout).tolist()[0]
+
+    def roll_many(self, die_type="d20", luck=5, n=1, timeout=None):
+        """
+        Roll n dice as part of the next batch
+
+        Returns:
+        numpy.ndarray: Array of n roll results (1 to die size, or face values for custom dice)
+        """
+        return self.submit(die_type, luck, n).result(timeout)
+
+    @property
+    def dice_types(self):
+        """The dice types of the dice behind the service"""
+        return self.dice.dice_types
+
+    def roll_dice(self, die_type="d20", luck=5, n=1):
+        """Same as roll_many, so the service can stand in for the dice (e.g. in roll_expressions)"""
+        return self.roll_many(die_type, luck, n)
+
+    def _serve_loop(self):
+        """Collect requests for one window (or until max_batch rolls), then roll them"""
+        while True:
+            with self._cond:
+                while not self._stopped and not self._pending:
+                    self._cond.wait()
+                if self._stopped and not self._pending:
+                    return
+
+                # Give other callers a moment to join this batch
+                deadline = time.monotonic() + self.window
+                while not self._stopped and self._pending_rolls < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._pending
+                self._pending = []
+                self._pending_rolls = 0
+
+            # Roll without holding the lock so new requests can queue up meanwhile
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        """Roll every (die, luck) group of a batch with one roll_dice call each"""
+        groups = {}
+        for future, die_type, luck, n in batch:
+            # Skip requests whose caller cancelled them while they were queued
+            if future.set_running_or_notify_cancel():
+                groups.setdefault((die_type, luck), []).append((future, n))
+
+        STATS.count("service_batches")
+        STATS.count("service_requests", len(batch))
+
+        for (die_type, luck), requests in groups.items():
+            try:
+                rolls = self.dice.roll_dice(die_type, luck, sum(n for _, n in requests))
+            except Exception as e:
+                for future, _ in requests:
+                    future.set_exception(e)
+                continue
+
+            # Hand every caller its own slice of the batch
+            start = 0
+            for future, n in requests:
+                future.set_result(rolls[start:start + n])
+                start += n
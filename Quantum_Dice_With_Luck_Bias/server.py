@@ -0,0 +1,234 @@
+"""
+Small local HTTP/JSON server for rolling quantum dice
+
+Lets a game backend (or anything else that speaks HTTP) roll dice without
+importing qiskit itself. It only uses the standard library's asyncio streams,
+so there's nothing extra to install.
+
+Endpoints:
+- GET  /roll?die=d20&luck=5&n=3   roll one kind of die (any dN, luck can be
+                                  fractional like 6.5)
+- POST /roll                      body {"die": "d20", "luck": 5, "n": 3}, or a
+                                  list of those to roll several kinds at once
+- GET  /stats                     hot path counters (see instrumentation.py)
+- GET  /health                    {"ok": true}
+
+Connections are kept alive between requests (HTTP/1.1), rolls go through
+QuantumDice.aroll_dice so concurrent requests share sampler runs, and once
+max_in_flight requests are being worked on new ones get a 503 with a
+Retry-After header instead of queueing up forever.
+
+to run (from the project root) -
+    python -m Quantum_Dice_With_Luck_Bias serve [--host 127.0.0.1] [--port 8000] [--backend sampler]
+"""
+import argparse
+import asyncio
+import json
+from urllib.parse import parse_qs, urlsplit
+
+from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        """An error that gets sent back to the client as {"error": message}"""
+        super().__init__(message)
+        self.status = status
+
+
+class RollServer:
+    def __init__(self, dice, max_in_flight=1024, max_body=1 << 20,
+                 max_rolls=100000, keepalive_timeout=15):
+        """
+        HTTP front end for a QuantumDice
+
+        Parameters:
+        dice (QuantumDice): The dice every request rolls with
+        max_in_flight (int): Requests worked on at once before new ones get a 503
+        max_body (int): Largest request body accepted, in bytes
+        max_rolls (int): Most rolls a single request can ask for (over all its entries)
+        keepalive_timeout (float): Seconds an idle connection is kept open
+        """
+        self.dice = dice
+        self.max_in_flight = max_in_flight
+        self.max_body = max_body
+        self.max_rolls = max_rolls
+        self.keepalive_timeout = keepalive_timeout
+        self._in_flight = 0
+
+    async def serve(self, host="127.0.0.1", port=8000):
+        """Listen on host:port until cancelled"""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        address = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"Quantum dice server listening on {address}")
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        """Answer requests on one connection until the client (or the idle timeout) closes it"""
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.keepalive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break  # client closed the connection
+
+                keep_alive = await self._handle_request(request_line, reader, writer)
+                # Wait for slow clients to read the response before reading the next request
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass  # broken or oversized request, just drop the connection
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request_line, reader, writer):
+        """
+        Read one request, answer it and work out if the connection stays open
+
+        Returns:
+        bool: True to keep the connection alive for another request
+        """
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            self._respond(writer, 400, {"error": "Malformed request line"}, False)
+            return False
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        # HTTP/1.1 keeps connections open unless told not to, HTTP/1.0 is the other way round
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            keep_alive = connection != "close"
+        else:
+            keep_alive = connection == "keep-alive"
+
+        length = int(headers.get("content-length", 0) or 0)
+        if length > self.max_body:
+            self._respond(writer, 413, {"error": "Request body too large"}, False)
+            return False
+        body = await reader.readexactly(length) if length else b""
+
+        if self._in_flight >= self.max_in_flight:
+            self._respond(writer, 503, {"error": "Too many requests in flight, try again"},
+                          keep_alive, {"Retry-After": "1"})
+            return keep_alive
+
+        self._in_flight += 1
+        try:
+            status, payload = 200, await self._route(method, target, body)
+        except HTTPError as e:
+            status, payload = e.status, {"error": str(e)}
+        finally:
+            self._in_flight -= 1
+
+        self._respond(writer, status, payload, keep_alive)
+        return keep_alive
+
+    async def _route(self, method, target, body):
+        """Work out the response payload for one request"""
+        url = urlsplit(target)
+        if url.path == "/health":
+            return {"ok": True}
+        if url.path == "/stats":
+            return self.dice.stats()
+        if url.path != "/roll":
+            raise HTTPError(404, f"No such endpoint: {url.path}")
+
+        if method == "GET":
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            return await self._roll(query)
+        if method == "POST":
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(400, "Request body must be JSON")
+            if isinstance(request, list):
+                # Batch request: every entry gets rolled at the same time
+                self._check_total(request)
+                results = await asyncio.gather(*(self._roll(entry) for entry in request))
+                return {"results": results}
+            self._check_total([request])
+            return await self._roll(request)
+        raise HTTPError(405, f"{method} isn't supported on /roll")
+
+    def _check_total(self, entries):
+        """Refuse requests asking for more than max_rolls rolls"""
+        try:
+            total = sum(int(entry.get("n", 1)) for entry in entries)
+        except (AttributeError, TypeError, ValueError):
+            raise HTTPError(400, 'Every roll must be an object like {"die": "d20", "luck": 5, "n": 1}')
+        if total > self.max_rolls:
+            raise HTTPError(400, f"At most {self.max_rolls} rolls per request")
+
+    async def _roll(self, entry):
+        """Roll one {"die", "luck", "n"} entry"""
+        try:
+            die_type = str(entry.get("die", "d20")).lower()
+            luck = float(entry.get("luck", 5))
+            # Whole numbers stay ints, so they come back as 5 rather than 5.0
+            if luck.is_integer():
+                luck = int(luck)
+            n = int(entry.get("n", 1))
+        except (AttributeError, TypeError, ValueError):
+            raise HTTPError(400, 'Every roll must be an object like {"die": "d20", "luck": 5, "n": 1}')
+        if n > self.max_rolls:
+            raise HTTPError(400, f"At most {self.max_rolls} rolls per request")
+
+        try:
+            rolls = await self.dice.aroll_dice(die_type, luck, n)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        return {"die": die_type, "luck": luck, "rolls": rolls.tolist()}
+
+    def _respond(self, writer, status, payload, keep_alive, extra_headers=None):
+        """Write a JSON response"""
+        body = json.dumps(payload).encode()
+        headers = {
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
+            "Connection": "keep-alive" if keep_alive else "close",
+        }
+        headers.update(extra_headers or {})
+        head = f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+
+
+def main(argv=None):
+    """Start the server from the command line"""
+    parser = argparse.ArgumentParser(prog="python -m Quantum_Dice_With_Luck_Bias serve",
+                                     description="Serve quantum dice rolls over HTTP/JSON")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default 8000)")
+    parser.add_argument("--backend", help="entropy backend (default: QUANTUM_DICE_BACKEND or sampler)")
+    parser.add_argument("--efficient", action="store_true", help="use the entropy-efficient sampler")
+    parser.add_argument("--max-in-flight", type=int, default=1024,
+                        help="requests worked on at once before answering 503 (default 1024)")
+    args = parser.parse_args(argv)
+
+    dice = QuantumDice(backend=args.backend, efficient=args.efficient)
+    server = RollServer(dice, max_in_flight=args.max_in_flight)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nServer stopped")
@@ -0,0 +1,136 @@
+"""
+Memory-bounded LRU cache for bias tables, circuits and distributions
+
+functools.lru_cache(maxsize=None) was fine while there were seven dice and ten
+luck values. With dN for any N, custom dice and fractional luck, the number of
+possible tables is unlimited and one d1000000 alias table alone is 16 MB, so
+counting entries isn't enough either. BoundedCache keeps the most recently
+used entries up to a budget in bytes and evicts the least recently used ones
+past it, while counting hits, misses and evictions for the stats panel.
+"""
+from collections import OrderedDict, namedtuple
+from functools import wraps
+import sys
+import threading
+
+import numpy as np
+
+# Same hits/misses/currsize fields as functools' cache_info(), plus the memory numbers
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "evictions", "currsize", "bytes", "max_bytes"])
+
+
+def estimate_size(value):
+    """
+    Rough number of bytes a cached value holds on to
+
+    Counts NumPy arrays by their data, and looks one level into tuples, lists
+    and the attributes of plain objects (e.g. an AliasTable's arrays).
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes + 112
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    size = sys.getsizeof(value)
+    for attribute in getattr(value, "__dict__", {}).values():
+        if isinstance(attribute, np.ndarray):
+            size += attribute.nbytes + 112
+        else:
+            size += sys.getsizeof(attribute)
+    return size
+
+
+class BoundedCache:
+    def __init__(self, max_bytes, sizeof=estimate_size):
+        """
+        LRU cache limited by the memory its values use
+
+        Parameters:
+        max_bytes (int): Memory budget; least recently used entries are evicted past it
+        sizeof (callable): Function estimating the bytes a value uses
+        """
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_clear()
+
+    def get(self, key, build):
+        """
+        Get the value for key, calling build() to make it if it isn't cached
+
+        Parameters:
+        key: Any hashable key
+        build (callable): Makes the value when it's missing
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return self._entries[key][0]
+            self._misses += 1
+
+        # Build outside the lock so slow builds don't hold up other lookups
+        value = build()
+        size = self._sizeof(value)
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (value, size)
+                self._bytes += size
+                # Always keep the newest entry, even if it's bigger than the whole budget
+                while self._bytes > self.max_bytes and len(self._entries) > 1:
+                    _, (_, old_size) = self._entries.popitem(last=False)
+                    self._bytes -= old_size
+                    self._evictions += 1
+            return self._entries[key][0]
+
+    def resize(self, max_bytes):
+        """Change the memory budget (evicting straight away if it shrank)"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self._evictions += 1
+
+    def cache_info(self):
+        """
+        Hit, miss and memory numbers
+
+        Returns:
+        CacheInfo: hits, misses, evictions, currsize (entries), bytes, max_bytes
+        """
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions,
+                             len(self._entries), self._bytes, self.max_bytes)
+
+    def cache_clear(self):
+        """Drop every entry and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+
+def bounded_cache(max_bytes, sizeof=estimate_size):
+    """
+    Decorator like functools.lru_cache, but limited by memory instead of entries
+
+    The wrapped function gets the same cache_info() and cache_clear() as with
+    lru_cache, plus the BoundedCache itself as .cache (e.g. for .resize()).
+    """
+    def decorator(function):
+        cache = BoundedCache(max_bytes, sizeof)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            key = args + tuple(sorted(kwargs.items())) if kwargs else args
+            return cache.get(key, lambda: function(*args, **kwargs))
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache.cache_info
+        wrapper.cache_clear = cache.cache_clear
+        return wrapper
+    return decorator
@@ -0,0 +1,165 @@
+"""
+Record and replay entropy tapes
+
+A tape is a plain file of the raw measured values a backend handed out, one
+after the other, with every value stored as the ceil(num_bits / 8) big-endian
+bytes it came from (so bytes are stored as themselves, and a 7-bit d100 sample
+takes one byte). That's exactly how bytes_to_ints reads bytes back into values,
+so a tape is just a stream of random bytes to whoever replays it.
+
+- RecordingBackend wraps a backend and appends everything it hands out to a
+  tape (the file is only ever appended to, and flushed after every run).
+- ReplayBackend memory-maps a tape and hands its bytes out again in order,
+  without running anything.
+
+Replaying a tape with the same dice settings and the same sequence of calls
+gives exactly the same rolls as when it was recorded, which makes bug reports
+reproducible and lets load tests run at full speed with no simulator at all.
+
+The shared default backend can be wrapped without code changes by setting
+QUANTUM_DICE_RECORD (or QUANTUM_DICE_REPLAY) to a tape path.
+"""
+import os
+import threading
+
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.backends import EntropyBackend, bytes_to_ints, join_registers
+from Quantum_Dice_With_Luck_Bias.instrumentation import STATS
+
+
+def ints_to_bytes(values, num_bits):
+    """
+    Turn num_bits-wide integers back into the bytes bytes_to_ints reads them from
+
+    Parameters:
+    values (numpy.ndarray): Integers between 0 and 2**num_bits - 1
+    num_bits (int): Bits per value (1-64)
+
+    Returns:
+    numpy.ndarray: ceil(num_bits / 8) big-endian bytes per value (uint8)
+    """
+    bytes_per_value = (num_bits + 7) // 8
+    wide = np.asarray(values).astype(">u8").view(np.uint8).reshape(-1, 8)
+    return np.ascontiguousarray(wide[:, 8 - bytes_per_value:]).reshape(-1)
+
+
+class RecordingBackend(EntropyBackend):
+    name = "record"
+
+    def __init__(self, inner, path):
+        """
+        Wrap a backend and append everything it hands out to a tape
+
+        Parameters:
+        inner (EntropyBackend): The backend that actually makes the random values
+        path (str): Tape file to append to (created if it doesn't exist)
+        """
+        self.inner = inner
+        self.path = path
+        self.quality = inner.quality
+        self.runs_circuits = inner.runs_circuits
+        self._lock = threading.Lock()
+        self._file = open(path, "ab")
+
+    def random_bytes(self, num_bytes):
+        data = self.inner.random_bytes(num_bytes)
+        self._append(np.asarray(data, dtype=np.uint8))
+        return data
+
+    def sample(self, num_bits, shots):
+        values = self.inner.sample(num_bits, shots)
+        self._append(ints_to_bytes(values, num_bits))
+        return values
+
+    def run_circuit(self, qc, shots):
+        values = self.inner.run_circuit(qc, shots)
+        self._append(ints_to_bytes(values, qc.num_clbits))
+        return values
+
+    def run_batch(self, circuits, shots):
+        batch = self.inner.run_batch(circuits, shots)
+        # Recorded the same way as one run_circuit per circuit, which is how they're replayed
+        for qc, registers in zip(circuits, batch):
+            self._append(ints_to_bytes(join_registers(qc, registers), qc.num_clbits))
+        return batch
+
+    def _append(self, data):
+        """Add bytes to the end of the tape"""
+        with self._lock:
+            self._file.write(data.tobytes())
+            # Flush every run, so a crash still leaves a tape of everything up to it
+            self._file.flush()
+
+    def close(self):
+        """Close the tape file"""
+        with self._lock:
+            self._file.close()
+
+
+class ReplayBackend(EntropyBackend):
+    name = "replay"
+    # Replayed circuit outcomes are as good as the circuits that were recorded
+    runs_circuits = True
+
+    def __init__(self, path, loop=False):
+        """
+        Hand out the bytes of a recorded tape again, in order
+
+        Parameters:
+        path (str): Tape file to replay
+        loop (bool): Start again from the beginning when the tape runs out
+            (otherwise running out raises a RuntimeError)
+        """
+        self.path = path
+        self.loop = loop
+        self._tape = np.memmap(path, dtype=np.uint8, mode="r")
+        self._position = 0
+        self._lock = threading.Lock()
+
+    @property
+    def position(self):
+        """Number of bytes replayed so far"""
+        with self._lock:
+            return self._position
+
+    def rewind(self):
+        """Go back to the start of the tape"""
+        with self._lock:
+            self._position = 0
+
+    def random_bytes(self, num_bytes):
+        STATS.record_run(num_bytes)
+        with STATS.timer("run", shots=num_bytes):
+            with self._lock:
+                start = self._position
+                end = start + num_bytes
+                if end <= len(self._tape):
+                    self._position = end
+                    # A view of the memory-mapped file, nothing gets copied
+                    return np.asarray(self._tape[start:end])
+                if not self.loop or len(self._tape) == 0:
+                    raise RuntimeError(f"Replay tape {self.path} ran out after {len(self._tape)} bytes")
+                # Wrap around to the start as many times as needed
+                indices = np.arange(start, end) % len(self._tape)
+                self._position = end % len(self._tape)
+                return np.asarray(self._tape[indices])
+
+    def run_circuit(self, qc, shots):
+        return bytes_to_ints(self.random_bytes(((qc.num_clbits + 7) // 8) * shots), qc.num_clbits)
+
+
+def wrap_from_env(backend):
+    """
+    Record or replay the given backend if QUANTUM_DICE_RECORD/QUANTUM_DICE_REPLAY is set
+
+    Returns:
+    EntropyBackend: The backend to use
+    """
+    replay = os.environ.get("QUANTUM_DICE_REPLAY")
+    if replay:
+        return ReplayBackend(replay, loop=os.environ.get("QUANTUM_DICE_REPLAY_LOOP") == "1")
+    record = os.environ.get("QUANTUM_DICE_RECORD")
+    if record:
+        return RecordingBackend(backend, record)
+    return backend
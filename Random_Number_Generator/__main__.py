@@ -0,0 +1,4 @@
+# to run (from the project root) - python -m Random_Number_Generator
+from Random_Number_Generator.rng import main
+
+main()
@@ -1,61 +1,186 @@
-from qiskit import QuantumCircuit
-from qiskit.primitives import Sampler
-import matplotlib.pyplot as plt
 import numpy as np
 
-def generate_random_bits(num_bits): 
+from Quantum_Dice_With_Luck_Bias.backends import get_default_backend
+from Quantum_Dice_With_Luck_Bias.circuit_cache import MAX_CIRCUIT_QUBITS, split_bits
+from Quantum_Dice_With_Luck_Bias.instrumentation import STATS
+
+
+def generate_random_bits(num_bits, pool=None, backend=None, max_qubits=MAX_CIRCUIT_QUBITS): 
 # pass in minimum number of bits needed to represent the range of numbers we want to generate (in binary)
 # for example, if we want to generate numbers between 0 and 15, we need 4 bits to represent 16 numbers
 # if we want to generate numbers between 0 and 100, we need 7 bits to represent 128 numbers
     """Generate random bits using quantum superposition and measurement"""
-    # Create a quantum circuit with num_bits qubits
-    qc = QuantumCircuit(num_bits, num_bits)
-    
-    # Place all qubits in superposition
-    for i in range(num_bits):
-        qc.h(i)  # Apply Hadamard gate - placing bits is superposition state between 0 and 1 equally.
+    widths = split_bits(num_bits, max_qubits)
+    if len(widths) > 1:
+        # Too wide for one circuit: measure independent narrower circuits and
+        # put their bits side by side (Python ints can be as wide as we like)
+        value = 0
+        for width in widths:
+            value = (value << width) | generate_random_bits(width, pool, backend, max_qubits)
+        return value
     
-    # At this point, all bit have equal probability of being measured as 0 or 1.
-    # Measure all qubits
-    qc.measure(range(num_bits), range(num_bits))
+    # If we have a pre-filled entropy pool, take the bits from it instead of
+    # waiting for the simulator to run a circuit
+    if pool is not None:
+        return int(pool.take_values(num_bits, 1)[0])
     
-    # Execute the circuit using Sampler (This runs the created circuit on a quantum simulator)
-    # This step forces the bit to collapse and "choose" a value (0 or 1) when measured.
-    sampler = Sampler()
-    job = sampler.run(qc, shots=1)
-    result = job.result()
-    
-    # Get the binary outcome from quasi-distribution (format returned by the Sampler)
-    # The quasi-distribution is a dictionary where the keys are the binary outcomes and the values are the probabilities.
-    # basically this 'extracts' the binary outcome into a readable format for us
-    binary_outcome = list(result.quasi_dists[0].keys())[0]
-    return binary_outcome
+    # The default backend runs a (cached) circuit with num_bits qubits, each with a
+    # Hadamard gate placing it in a superposition state between 0 and 1 equally,
+    # then measures it, which forces every bit to collapse and "choose" 0 or 1.
+    # Other entropy backends (classical, os.urandom, Aer, ...) can be passed in, or
+    # picked with the QUANTUM_DICE_BACKEND environment variable (see backends.py)
+    backend = backend or get_default_backend()
+    return int(backend.sample(num_bits, 1)[0])
 
 
-def generate_random_number(min_val, max_val):
-    """Generate a random number between min_val and max_val (inclusive)"""
-    # Calculate how many bits we need (based on the range of numbers we want to generate)
+def _check_range(min_val, max_val):
+    """Work out how many random bits a range needs"""
+    if max_val < min_val:
+        raise ValueError("max_val must be at least min_val")
     range_size = max_val - min_val + 1
-    num_bits = max(4, range_size.bit_length())
+    # We draw an offset from 0 to range_size - 1 and add min_val to it,
+    # e.g. 1-100 needs 7 bits (offsets 0-127, of which 0-99 are kept)
+    return range_size, max(1, (range_size - 1).bit_length())
+
+
+def generate_random_number(min_val, max_val, pool=None, backend=None, max_qubits=MAX_CIRCUIT_QUBITS):
+    """Generate a random number between min_val and max_val (inclusive), optionally using an EntropyPool or backend"""
+    # Calculate how many bits we need (based on the range of numbers we want to generate)
+    range_size, num_bits = _check_range(min_val, max_val)
     
     while True:
         # Generate random bits
-        random_value = generate_random_bits(num_bits)
+        offset = generate_random_bits(num_bits, pool, backend, max_qubits)
         
         # Check if it's in our desired range
-        if min_val <= random_value <= max_val:
-            return random_value
+        if offset < range_size:
+            return min_val + offset
+        STATS.count("rejected_outcomes")
+
+
+def _random_words(num_bits, n, pool, backend, max_qubits):
+    """
+    n uniform num_bits-wide values, made from circuits no wider than max_qubits
+    
+    Returns:
+    numpy.ndarray: int64 values up to 63 bits, Python ints (object array) beyond that
+    """
+    wide = num_bits > 63
+    values = np.zeros(n, dtype=object if wide else np.int64)
+    for width in split_bits(num_bits, max_qubits):
+        # One multi-shot run (or pool read) per piece, for all n values at once
+        if pool is not None:
+            piece = pool.take_values(width, n)
+        else:
+            piece = (backend or get_default_backend()).sample(width, n)
+        if wide:
+            values = values * (1 << width) + piece.astype(object)
+        else:
+            values = (values << width) | piece.astype(np.int64)
+    return values
+
+
+def generate_random_numbers(min_val, max_val, n, pool=None, backend=None, max_qubits=MAX_CIRCUIT_QUBITS):
+    """
+    Generate n random numbers between min_val and max_val (inclusive) in batches
+    
+    Parameters:
+    min_val (int): Smallest number to generate (can be negative or huge)
+    max_val (int): Largest number to generate
+    n (int): How many numbers to make
+    pool (EntropyPool): Optional pool to take the random bits from
+    backend (EntropyBackend): Optional backend to take the random bits from
+    max_qubits (int): Widest circuit to run
+    
+    Returns:
+    numpy.ndarray: n numbers (int64, or Python ints when the numbers don't fit in 64 bits)
+    """
+    range_size, num_bits = _check_range(min_val, max_val)
+    if n < 0:
+        raise ValueError("n can't be negative")
+    
+    # Python ints are only needed if the offsets or the numbers themselves outgrow int64
+    fits = num_bits <= 63 and -2 ** 63 <= min_val and max_val < 2 ** 63
+    numbers = np.empty(n, dtype=np.int64 if fits else object)
+    accept_rate = range_size / 2 ** num_bits
+    
+    filled = 0
+    while filled < n:
+        remaining = n - filled
+        # Ask for a few extra values so most batches only need one round
+        shots = int(np.ceil(remaining / accept_rate * 1.05)) + 8
+        offsets = _random_words(num_bits, shots, pool, backend, max_qubits)
+        
+        # Keep the offsets that land inside the range
+        in_range = offsets[offsets < range_size]
+        STATS.count("rejected_outcomes", len(offsets) - len(in_range))
+        in_range = in_range[:remaining]
+        if not fits:
+            in_range = in_range.astype(object)
+        numbers[filled:filled + len(in_range)] = in_range + min_val
+        filled += len(in_range)
+    
+    return numbers
+
+
+def stream_numbers(min_val, max_val, chunk=4096, as_chunks=False, pool=None, backend=None, max_qubits=MAX_CIRCUIT_QUBITS):
+    """
+    Endless stream of random numbers between min_val and max_val (inclusive)
+    
+    Numbers are made chunk at a time with generate_random_numbers, so memory
+    use stays the same however long the stream runs, and the consumer can
+    stop at any point.
+    
+    Parameters:
+    min_val (int): Smallest number to generate
+    max_val (int): Largest number to generate
+    chunk (int): Numbers made per batch
+    as_chunks (bool): Yield whole numpy arrays of chunk numbers instead of single ints
+    pool (EntropyPool): Optional pool to take the random bits from
+    backend (EntropyBackend): Optional backend to take the random bits from
+    max_qubits (int): Widest circuit to run
+    
+    Returns:
+    generator: Yields ints (or numpy.ndarray chunks) forever
+    """
+    # Check the range now, rather than on the first next() of the generator
+    _check_range(min_val, max_val)
+    if chunk < 1:
+        raise ValueError("Chunk size must be at least 1")
+    return _stream_numbers(min_val, max_val, chunk, as_chunks, pool, backend, max_qubits)
+
+
+def _stream_numbers(min_val, max_val, chunk, as_chunks, pool, backend, max_qubits):
+    """The generator behind stream_numbers()"""
+    while True:
+        numbers = generate_random_numbers(min_val, max_val, chunk, pool, backend, max_qubits)
+        if as_chunks:
+            yield numbers
+        else:
+            yield from numbers.tolist()
+
+
+def stats():
+    """Hot-path counters, stage timings and cache hit rates (shared with the dice)"""
+    return STATS.snapshot()
 
 def visualize_distribution(min_val, max_val, samples):
     """Generate multiple random numbers and visualize their distribution"""
-    results = []
-    for _ in range(samples):
-        results.append(generate_random_number(min_val, max_val))
+    # Only keep a count per value instead of a list of every number
+    values = np.arange(min_val, max_val + 1)
+    counts = np.zeros(len(values), dtype=np.int64)
+    done = 0
+    for numbers in stream_numbers(min_val, max_val, chunk=min(samples, 4096), as_chunks=True):
+        numbers = numbers[:samples - done]
+        counts += np.bincount(numbers - min_val, minlength=len(values))
+        done += len(numbers)
+        if done >= samples:
+            break
     
-    # Plot the distribution
+    # Plot the distribution (matplotlib is slow to import, so only load it when we plot)
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(10, 6))
-    plt.hist(results, bins=max_val-min_val+1, range=(min_val-0.5, max_val+0.5), 
-             alpha=0.7, color='blue', edgecolor='black')
+    plt.bar(values, counts, width=1.0, alpha=0.7, color='blue', edgecolor='black')
     plt.title(f'Distribution of {samples} Quantum Random Numbers')
     plt.xlabel('Value')
     plt.ylabel('Frequency')
@@ -63,20 +188,60 @@ def visualize_distribution(min_val, max_val, samples):
     plt.xticks(range(min_val, max_val+1))
     plt.show()
     
-    # Print some statistics
-    print(f"Mean: {np.mean(results):.2f}")
-    print(f"Standard Deviation: {np.std(results):.2f}")
-    print(f"Min: {min(results)}")
-    print(f"Max: {max(results)}")
+    # Print some statistics (worked out from the counts)
+    mean = np.sum(values * counts) / samples
+    std = np.sqrt(np.sum(counts * (values - mean) ** 2) / samples)
+    seen = values[counts > 0]
+    print(f"Mean: {mean:.2f}")
+    print(f"Standard Deviation: {std:.2f}")
+    print(f"Min: {seen.min()}")
+    print(f"Max: {seen.max()}")
+
 
+def main(argv=None):
+    """Run the demos (only when run as a script, never on import), or export numbers with --export"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Quantum random number generator demos and bulk export")
+    parser.add_argument("--export", metavar="PATH", help="write random numbers to this file and exit")
+    parser.add_argument("--min", type=int, default=1, help="smallest number for --export (default 1)")
+    parser.add_argument("--max", type=int, default=100, help="largest number for --export (default 100)")
+    parser.add_argument("-n", "--count", type=int, default=1000000, help="how many numbers to export")
+    parser.add_argument("--format", choices=("npy", "raw", "bits"),
+                        help="file format (default: from the extension, .npy/.bits/anything else is raw)")
+    parser.add_argument("--chunk", type=int, default=65536, help="numbers made per batch")
+    parser.add_argument("--backend", help="entropy backend (default: QUANTUM_DICE_BACKEND or sampler)")
+    parser.add_argument("--monitor", action="store_true",
+                        help="run the streaming quality checks on the exported numbers")
+    args = parser.parse_args(argv)
+    
+    if args.export:
+        from Quantum_Dice_With_Luck_Bias.backends import create_backend
+        from Quantum_Dice_With_Luck_Bias.export import export_rolls
+        
+        backend = create_backend(args.backend) if args.backend else None
+        numbers = stream_numbers(args.min, args.max, args.chunk, as_chunks=True, backend=backend)
+        if args.monitor:
+            from Quantum_Dice_With_Luck_Bias.quality_monitor import QualityMonitor, print_alert, print_report
+            
+            monitor = QualityMonitor.for_range(args.min, args.max, on_alert=print_alert)
+            numbers = monitor.watch(numbers)
+        fmt = export_rolls(args.export, numbers, args.count, args.min, args.max, args.format)
+        print(f"Wrote {args.count} numbers from {args.min} to {args.max} to {args.export} as {fmt}")
+        if args.monitor:
+            print_report(monitor)
+        return
+    
+    # Demo: Generate a single random number
+    print("Generating a single quantum random number between 1 and 100...")
+    random_num = generate_random_number(1, 100)
+    print(f"Your quantum random number is: {random_num}")
+    
+    # Demo: Visualize the distribution (optional)
+    print("\nGenerating 1000 random numbers between 1 and 6 (like rolling a quantum die)...")
+    visualize_distribution(1, 20, 1000)
 
-# Demo: Generate a single random number
-print("Generating a single quantum random number between 1 and 100...")
-random_num = generate_random_number(1, 100)
-print(f"Your quantum random number is: {random_num}")
 
-# Demo: Visualize the distribution (optional)
-print("\nGenerating 1000 random numbers between 1 and 6 (like rolling a quantum die)...")
-visualize_distribution(1, 20, 1000)
+if __name__ == "__main__":
+    main()
 
-# to run - python rng.py
\ No newline at end of file
+# to run (from the project root) - python -m Random_Number_Generator.rng
\ No newline at end of file
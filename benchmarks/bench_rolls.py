@@ -0,0 +1,206 @@
+"""
+Benchmark suite for roll throughput, latency and entropy efficiency
+
+Covers:
+- QuantumDice.roll_die for every die in dice_types at luck 1, 5 and 10
+- rng.generate_random_number over several range sizes
+- the batched roll_dice path
+- the visualization path (DistributionEngine over the 5 default luck values)
+
+For every case it reports rolls/sec, p50/p99 latency per call, backend calls
+per roll and random bits consumed per roll. Results can be saved to JSON and
+compared against an earlier run to spot regressions.
+
+to run (from the project root) -
+    python -m benchmarks.bench_rolls [--backend sampler] [--quick] [--json out.json] [--compare old.json]
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.backends import EntropyBackend, create_backend
+from Quantum_Dice_With_Luck_Bias.distribution import DistributionEngine
+from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+from Random_Number_Generator import rng
+
+LUCK_VALUES = [1, 5, 10]
+RNG_RANGES = [(1, 6), (1, 100), (0, 1000), (1, 4096), (1, 65536), (1, 10 ** 12)]
+
+# Metrics where a bigger number is better (for --compare)
+HIGHER_IS_BETTER = {"rolls_per_sec"}
+
+
+class CountingBackend(EntropyBackend):
+    """Wraps another backend and counts how often it's called and how many bits it hands out"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = inner.name
+        self.quality = inner.quality
+        self.runs_circuits = inner.runs_circuits
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.bits = 0
+
+    @property
+    def sampler(self):
+        return getattr(self.inner, "sampler", None)
+
+    def random_bytes(self, num_bytes):
+        self.calls += 1
+        self.bits += 8 * num_bytes
+        return self.inner.random_bytes(num_bytes)
+
+    def sample(self, num_bits, shots):
+        self.calls += 1
+        self.bits += num_bits * shots
+        return self.inner.sample(num_bits, shots)
+
+    def run_circuit(self, qc, shots):
+        self.calls += 1
+        self.bits += qc.num_clbits * shots
+        return self.inner.run_circuit(qc, shots)
+
+    def run_batch(self, circuits, shots):
+        self.calls += 1
+        self.bits += sum(qc.num_clbits for qc in circuits) * shots
+        return self.inner.run_batch(circuits, shots)
+
+
+def measure(fn, iterations, rolls_per_call, backend):
+    """
+    Time `iterations` calls of fn
+
+    Returns:
+    dict: rolls/sec, p50/p99 latency per call (ms), backend calls and bits per roll
+    """
+    fn()  # warm-up (circuit building, first sampler run, ...)
+    backend.reset()
+
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies[i] = time.perf_counter() - start
+
+    rolls = iterations * rolls_per_call
+    return {
+        "rolls_per_sec": rolls / latencies.sum(),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "sampler_calls_per_roll": backend.calls / rolls,
+        "bits_per_roll": backend.bits / rolls,
+    }
+
+
+def run_suite(backend_name=None, quick=False, efficient=False):
+    """
+    Run every benchmark case
+
+    Returns:
+    dict: case name -> metrics
+    """
+    backend = CountingBackend(create_backend(backend_name))
+    dice = QuantumDice(backend=backend, efficient=efficient)
+
+    single_iterations = 20 if quick else 200
+    batch_size = 10000 if quick else 100000
+    batch_iterations = 3 if quick else 10
+    vis_rolls = 10000 if quick else 100000
+
+    results = {}
+
+    for die_type in dice.dice_types:
+        for luck in LUCK_VALUES:
+            results[f"roll_die/{die_type}/luck{luck}"] = measure(
+                lambda: dice.roll_die(die_type, luck), single_iterations, 1, backend)
+
+    for min_val, max_val in RNG_RANGES:
+        results[f"rng.generate_random_number/{min_val}-{max_val}"] = measure(
+            lambda: rng.generate_random_number(min_val, max_val, backend=backend),
+            single_iterations, 1, backend)
+
+    for die_type in ("d6", "d20", "d100"):
+        for luck in LUCK_VALUES:
+            results[f"roll_dice/{die_type}/luck{luck}/n{batch_size}"] = measure(
+                lambda: dice.roll_dice(die_type, luck, batch_size), batch_iterations, batch_size, backend)
+
+    def visualize():
+        engine = DistributionEngine(dice, "d20")
+        for _ in engine.run(vis_rolls, workers=1):
+            pass
+
+    results[f"visualization/d20/n{vis_rolls}"] = measure(
+        visualize, 1, vis_rolls * 5, backend)
+
+    return results
+
+
+def compare(results, baseline, threshold=0.10):
+    """
+    Find the metrics that got worse than an earlier run by more than threshold
+
+    Returns:
+    list: (case, metric, change) for every change worse than threshold
+    """
+    regressions = []
+    for case, metrics in results.items():
+        if case not in baseline:
+            continue
+        for metric, value in metrics.items():
+            old = baseline[case].get(metric)
+            if not old:
+                continue
+            change = (value - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > threshold:
+                regressions.append((case, metric, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark quantum dice throughput, latency and entropy use")
+    parser.add_argument("--backend", help="entropy backend to benchmark (default: QUANTUM_DICE_BACKEND or sampler)")
+    parser.add_argument("--efficient", action="store_true", help="use the entropy-efficient sampler")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for a fast smoke run")
+    parser.add_argument("--json", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change counted as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.backend, args.quick, args.efficient)
+
+    print(f"{'case':50s} {'rolls/s':>12s} {'p50 ms':>9s} {'p99 ms':>9s} {'calls/roll':>11s} {'bits/roll':>10s}")
+    for case, m in results.items():
+        print(f"{case:50s} {m['rolls_per_sec']:12.0f} {m['p50_ms']:9.3f} {m['p99_ms']:9.3f} "
+              f"{m['sampler_calls_per_roll']:11.4f} {m['bits_per_roll']:10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "backend": args.backend,
+                "efficient": args.efficient,
+                "quick": args.quick,
+                "python": platform.python_version(),
+                "results": results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for case, metric, change in regressions:
+            print(f"REGRESSION {case} {metric}: {change:+.1%}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Import-time benchmark for the quantum dice and rng modules
+
+Every worker cold start pays for importing these modules, so they should stay
+import-light: qiskit and matplotlib only get imported once a circuit is run or
+a plot is drawn. This imports each module in a fresh interpreter a few times,
+reports the fastest import time, and fails if a heavy dependency got pulled in.
+
+to run (from the project root) - python -m benchmarks.import_time [--repeat 5] [--json results.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MODULES = [
+    "Quantum_Dice_With_Luck_Bias.quantum_dice",
+    "Quantum_Dice_With_Luck_Bias.entropy_pool",
+    "Random_Number_Generator.rng",
+]
+
+# Modules that shouldn't be loaded just by importing ours
+HEAVY_MODULES = ["qiskit", "matplotlib"]
+
+_CHILD_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted(m for m in {heavy!r} if m in sys.modules)
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_import(module, repeat):
+    """
+    Import a module in `repeat` fresh interpreters
+
+    Returns:
+    dict: Fastest import time in seconds, and any heavy modules it pulled in
+    """
+    timings = []
+    heavy = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _CHILD_CODE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        heavy = result["heavy"]
+    return {"seconds": min(timings), "heavy": heavy}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how long our modules take to import")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--json", help="also save the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for module in MODULES:
+        results[module] = time_import(module, args.repeat)
+        heavy = ", ".join(results[module]["heavy"]) or "-"
+        print(f"{module:45s} {results[module]['seconds'] * 1000:8.1f} ms   heavy imports: {heavy}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    # Fail (e.g. in CI) if any module imports qiskit or matplotlib eagerly again
+    return 1 if any(r["heavy"] for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
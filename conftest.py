@@ -0,0 +1,2 @@
+# Lets pytest import Quantum_Dice_With_Luck_Bias and Random_Number_Generator
+# from the repository root, the same way `python -m ...` does
@@ -2,10 +2,16 @@
 
 import streamlit as st
 import matplotlib.pyplot as plt
+import numpy as np
 
 
 
 from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+from Quantum_Dice_With_Luck_Bias.dice_expressions import roll_expressions
+from Quantum_Dice_With_Luck_Bias.distribution import DistributionEngine
+from Quantum_Dice_With_Luck_Bias.entropy_pool import EntropyPool
+from Quantum_Dice_With_Luck_Bias.probability import exact_distribution
+from Quantum_Dice_With_Luck_Bias.roll_service import RollService
 
 
 
@@ -93,9 +99,18 @@ st.subheader("🤞 Try your luck! 🎲")
 # Initialize the dice simulator
 @st.cache_resource
 def get_dice():
-    return QuantumDice()
+    # The pool keeps quantum random bytes ready in the background,
+    # so clicking "Roll" doesn't have to wait on the simulator
+    return QuantumDice(pool=EntropyPool())
+
+@st.cache_resource
+def get_roll_service():
+    # Every session shares the same dice, so rolls go through one service that
+    # batches the rolls of concurrent sessions into a single sampler run
+    return RollService(get_dice())
 
 dice = get_dice()
+roll_service = get_roll_service()
 
 # Create two columns for the controls
 col1, col2 = st.columns([1, 2])
@@ -103,7 +118,7 @@ with col2:
     die_choice = st.selectbox("Choose a die:", list(dice.dice_types.keys()), index=5)
 
     luck = st.slider("Set your luck level (5 is neutral):", 
-        min_value=1, max_value=10, value=5,
+        min_value=1.0, max_value=10.0, value=5.0, step=0.5,
         help="Lower values bias toward lower numbers, higher values bias toward higher numbers")
     
 with col1:
@@ -112,7 +127,7 @@ with col1:
 # Roll button
 if st.button("🎲 Roll the Quantum Dice 🎲", use_container_width=True):
     with st.spinner("rolling..."):
-        result = dice.roll_die(die_choice, luck)
+        result = roll_service.roll(die_choice, luck)
     
     # Display the result with some styling
     st.markdown(f"## ⚛️ You rolled: {result} ⚛️")
@@ -144,34 +159,82 @@ with visCol1:
     st.image(dice_images[vis_die], width=150, caption=f"{vis_die}")
     
 
-num_rolls = st.slider("Number of simulated rolls:", 100, 1000, 700, 100)
+num_rolls = st.slider("Number of simulated rolls:", 1000, 200000, 20000, 1000)
 
 if st.button("Generate Visualization", use_container_width=True):
-    with st.spinner("Running quantum simulations..."):
-        die_size = dice.dice_types[vis_die]
-        luck_values = [1, 3, 5, 7, 10]
-        
+    engine = DistributionEngine(dice, vis_die, luck_values=[1, 3, 5, 7, 10])
+    # The expected distribution is exact, so we can draw it before rolling anything
+    expected = engine.expected()
+    faces = np.arange(1, engine.die_size + 1)
+    
+    plot_area = st.empty()
+    progress = st.progress(0.0, text="Running quantum simulations...")
+    
+    # Redraw the plot after every batch so the histogram fills in as we go
+    # Each batch is spread over every CPU core (workers=None)
+    for done in engine.run(num_rolls, batch_size=max(1000, num_rolls // 10), workers=None):
         fig, ax = plt.subplots(figsize=(10, 6))
         
-        for luck in luck_values:
-            results = []
-            for _ in range(num_rolls):
-                results.append(dice.roll_die(vis_die, luck))
-            
-            # Create histogram
-            ax.hist(results, bins=range(1, die_size + 2), alpha=0.6, 
-                   label=f"Luck = {luck}")
+        for luck, histogram in engine.histograms.items():
+            bars = ax.bar(faces, histogram.counts, width=1.0, alpha=0.6,
+                          label=f"Luck = {luck}")
+            ax.plot(faces, expected[luck] * done, linestyle="--",
+                    color=bars.patches[0].get_facecolor(), alpha=1.0)
         
-        ax.set_title(f"Effect of Luck on {vis_die} Rolls ({num_rolls} rolls per luck value)")
+        ax.set_title(f"Effect of Luck on {vis_die} Rolls ({done} of {num_rolls} rolls per luck value)")
         ax.set_xlabel("Roll Result")
-        ax.set_ylabel("NUmber of hits")
-        ax.set_xticks(range(1, die_size + 1))
+        ax.set_ylabel("Number of hits (dashed = expected)")
+        ax.set_xticks(faces)
         ax.legend()
         ax.grid(alpha=0.3)
         
-        st.pyplot(fig)
-        
-        st.info("Notice how higher luck values shift the probability toward higher numbers!")
+        plot_area.pyplot(fig)
+        plt.close(fig)
+        progress.progress(done / num_rolls, text=f"Running quantum simulations... {done}/{num_rolls}")
+    
+    progress.empty()
+    st.info("Notice how higher luck values shift the probability toward higher numbers!")
+
+#=================================================================================================
+# ==========================Exact Distribution Section============================================
+#=================================================================================================
+
+st.divider()
+st.subheader("🧮 Exact Roll Odds 🎯")
+st.write("Type any dice expression to see the exact chance of every total - no rolling needed!")
+
+expCol1, expCol2 = st.columns([2, 1])
+with expCol1:
+    expression = st.text_input("Dice expression:", "4d6kh3+2",
+        help="e.g. 10d100, 2d20kl1 (disadvantage), 4d6kh3+2, 6d10>=8 (count successes), 1d20@8.5+5, 1d1000")
+with expCol2:
+    exp_luck = st.slider("Luck for the expression:", min_value=1.0, max_value=10.0, value=5.0,
+                         step=0.5, key="exp_luck")
+
+try:
+    exact = exact_distribution(expression, exp_luck)
+except ValueError as e:
+    st.error(f"Can't work out that expression: {e}")
+else:
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.bar(exact.values, exact.probabilities, width=1.0, alpha=0.7, label="Exact")
+    
+    # Optionally roll the expression and compare the results with the exact odds
+    check_rolls = st.slider("Quantum rolls to compare against (0 = none):", 0, 100000, 0, 1000)
+    if check_rolls:
+        with st.spinner("rolling..."):
+            totals = roll_expressions(roll_service, [expression], check_rolls, exp_luck)[0]
+        observed = np.bincount(totals - exact.offset, minlength=len(exact.probabilities)) / check_rolls
+        ax.plot(exact.values, observed, "o", markersize=3, color="orange", label="Quantum rolls")
+        st.caption(f"Difference from the exact odds (total variation): {exact.total_variation(totals):.4f}")
+    
+    ax.set_title(f"{expression} at luck {exp_luck}: mean {exact.mean():.2f}, std {exact.std():.2f}")
+    ax.set_xlabel("Total")
+    ax.set_ylabel("Probability")
+    ax.legend()
+    ax.grid(alpha=0.3)
+    st.pyplot(fig)
+    plt.close(fig)
 
 #=================================================================================================
 # ==============================ABOUT SECTION=====================================================
@@ -402,3 +465,28 @@ with t3:
 
 st.divider()
 st.write("Made with ❤️ and ⚛️ (quantum physics)")
+
+#=================================================================================================
+# ================================STATS SIDEBAR===================================================
+#=================================================================================================
+# Drawn last so the numbers include this run's rolls and visualizations
+with st.sidebar:
+    st.subheader("⏱️ Hot Path Stats")
+    stats = dice.stats()
+    st.caption(f"Backend: {stats['backend']}")
+    if stats["pool_fill_level"] is not None:
+        st.progress(stats["pool_fill_level"], text="Entropy pool fill level")
+
+    counters = stats["counters"]
+    st.metric("Circuits built", counters["circuits_built"])
+    st.metric("Sampler calls", counters["sampler_calls"])
+    st.metric("Shots requested", counters["shots_requested"])
+    st.metric("Rejected outcomes", counters["rejected_outcomes"])
+
+    st.write("**Time per stage (ms)**")
+    st.bar_chart({stage: spent * 1000 for stage, spent in stats["seconds"].items()})
+
+    st.write("**Cache hit rates**")
+    for name, cache in stats["caches"].items():
+        rate = "n/a" if cache["hit_rate"] is None else f"{cache['hit_rate']:.0%}"
+        st.write(f"{name}: {rate} ({cache['hits']} hits, {cache['misses']} misses)")
@@ -0,0 +1,64 @@
+"""The Aer backend runs the circuit it was given, even after the circuit caches evict"""
+import gc
+import sys
+import types
+
+import qiskit
+from qiskit.primitives import StatevectorSampler
+
+from Quantum_Dice_With_Luck_Bias.backends import AerBackend
+from Quantum_Dice_With_Luck_Bias.circuit_cache import get_biased_circuit
+from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+
+
+class FakeResult:
+    def __init__(self, memory):
+        self._memory = memory
+
+    def result(self):
+        return self
+
+    def get_memory(self, index):
+        return self._memory[index]
+
+
+class FakeAerSimulator:
+    """Stands in for qiskit_aer.AerSimulator (not installed here) using the reference sampler"""
+
+    def run(self, circuits, shots, memory, seed_simulator):
+        sampler = StatevectorSampler(seed=seed_simulator)
+        all_memory = []
+        for qc, pub_result in zip(circuits, sampler.run(circuits, shots=shots).result()):
+            registers = [getattr(pub_result.data, creg.name).get_bitstrings() for creg in qc.cregs]
+            # Aer puts the last register first, separated by spaces
+            all_memory.append([" ".join(reversed(bits)) for bits in zip(*registers)])
+        return FakeResult(all_memory)
+
+
+def fake_aer_backend(monkeypatch):
+    monkeypatch.setitem(sys.modules, "qiskit_aer", types.SimpleNamespace(AerSimulator=FakeAerSimulator))
+    # Like the real transpile, hand back a new circuit object
+    monkeypatch.setattr(qiskit, "transpile", lambda qc, backend: qc.copy())
+    return AerBackend(seed=5)
+
+
+def test_evicted_circuits_are_not_mixed_up(monkeypatch):
+    backend = fake_aer_backend(monkeypatch)
+    for _ in range(50):
+        assert backend.run_circuit(get_biased_circuit(4, 10), 10).max() <= 3
+        # Freed circuits' ids often get reused by the next ones built
+        get_biased_circuit.cache_clear()
+        gc.collect()
+        # At luck 10 a d20 lands on 5-20 (values 4-19) nearly every time
+        assert backend.run_circuit(get_biased_circuit(20, 10), 50).max() >= 4
+        get_biased_circuit.cache_clear()
+        gc.collect()
+
+
+def test_transpiled_circuits_are_cached(monkeypatch):
+    backend = fake_aer_backend(monkeypatch)
+    dice = QuantumDice(backend=backend, native_bias=True)
+    dice.roll_dice("d20", 10, 10)
+    dice.roll_dice("d20", 10, 10)
+    info = backend._transpiled.cache_info()
+    assert info.misses == 1 and info.hits == 1
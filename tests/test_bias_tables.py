@@ -0,0 +1,102 @@
+"""Alias tables: exact probabilities and both ways of sampling from them"""
+import numpy as np
+import pytest
+
+from Quantum_Dice_With_Luck_Bias.bias_tables import (
+    AliasTable, calculate_bias, check_luck, get_alias_table, get_weighted_alias_table, weighted_bias
+)
+from Quantum_Dice_With_Luck_Bias.instrumentation import STATS
+from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+
+
+def table_probabilities(table):
+    """Chance of every face, worked out straight from the thresholds and aliases"""
+    scale = 2 ** table.precision_bits
+    probs = np.zeros(table.num_columns)
+    for column in range(table.num_columns):
+        probs[column] += table.threshold[column] / scale
+        probs[table.alias[column]] += (scale - table.threshold[column]) / scale
+    # The padding columns past the last face must never come out themselves
+    assert np.all(probs[table.num_faces:] == 0)
+    return probs[:table.num_faces] / table.num_columns
+
+
+@pytest.mark.parametrize("die_size", [2, 4, 6, 20, 100, 1000])
+@pytest.mark.parametrize("luck", [1, 3, 5, 6.5, 10])
+def test_alias_table_error_is_within_precision(die_size, luck):
+    table = get_alias_table(die_size, luck)
+    error = np.abs(table_probabilities(table) - calculate_bias(luck, die_size))
+    assert error.max() <= 2.0 ** -16
+    assert table.probabilities() == pytest.approx(table_probabilities(table))
+
+
+def test_weighted_alias_table_error_is_within_precision():
+    weights = (1.0, 1.0, 1.0, 1.0, 1.0, 2.0)
+    table = get_weighted_alias_table(weights, 8)
+    error = np.abs(table_probabilities(table) - weighted_bias(8, weights))
+    assert error.max() <= 2.0 ** -16
+
+
+def test_lopsided_table_keeps_zero_faces_at_zero():
+    table = AliasTable([0.0, 0.999, 0.001, 0.0])
+    probs = table_probabilities(table)
+    assert probs[0] == 0 and probs[3] == 0
+    assert probs.sum() == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("die_size,luck", [(6, 2), (20, 8), (100, 9.5), (7, 5)])
+def test_lazy_sampling_gives_the_same_faces(die_size, luck):
+    table = get_alias_table(die_size, luck)
+    rng = np.random.default_rng(1)
+    columns = rng.integers(0, table.num_columns, 20000)
+    threshold_bits = rng.integers(0, 2 ** table.precision_bits, 20000)
+
+    expected = table.sample(columns, threshold_bits)
+    # All the threshold bits handed over up front
+    assert np.array_equal(
+        table.sample_lazily(columns, None, first_bits=threshold_bits, first_width=table.precision_bits),
+        expected)
+    # The top 5 bits up front, and the rest drawn in 3-bit chunks as needed
+    lazy = table.sample_lazily(
+        columns, lambda width, n: rng.integers(0, 2 ** width, n), 3,
+        threshold_bits >> (table.precision_bits - 5), 5)
+    decided = (threshold_bits >> (table.precision_bits - 5)) != (table.threshold[columns] >> (table.precision_bits - 5))
+    assert np.array_equal(lazy[decided], expected[decided])
+
+
+def test_lazy_sampling_follows_the_table():
+    table = get_alias_table(20, 8)
+    rng = np.random.default_rng(2)
+    n = 200000
+    faces = table.sample_lazily(rng.integers(0, table.num_columns, n), lambda width, k: rng.integers(0, 2 ** width, k))
+    observed = np.bincount(faces, minlength=20) / n
+    expected = table.probabilities()
+    # Within 5 standard deviations on every face
+    assert np.all(np.abs(observed - expected) <= 5 * np.sqrt(expected * (1 - expected) / n))
+
+
+@pytest.mark.parametrize("efficient", [False, True])
+def test_biased_rolls_cost_about_as_much_as_unbiased(efficient):
+    dice = QuantumDice(backend="classical", seed=3, efficient=efficient)
+    STATS.reset()
+    rolls = np.array([dice.roll_die("d20", 8) for _ in range(3000)])
+    observed = np.bincount(rolls - 1, minlength=20) / len(rolls)
+    expected = calculate_bias(8, 20)
+    assert np.all(np.abs(observed - expected) <= 5 * np.sqrt(expected * (1 - expected) / len(rolls)))
+    if efficient:
+        # log2(20) ~ 4.3 bits for the column, about 2 more for the threshold
+        assert dice.bits_per_roll() < 8
+    else:
+        # One 2-byte draw settles all but about 1 in 64 rolls
+        assert STATS.snapshot()["counters"]["sampler_calls"] / len(rolls) < 1.03
+
+
+@pytest.mark.parametrize("luck", [1, 5, 6.5, 10])
+def test_check_luck_accepts_1_to_10(luck):
+    check_luck(luck)
+
+
+@pytest.mark.parametrize("luck", [0, 0.99, 10.01, 11, -5, float("nan")])
+def test_check_luck_rejects_everything_else(luck):
+    with pytest.raises(ValueError, match="Luck must be between 1 and 10"):
+        check_luck(luck)
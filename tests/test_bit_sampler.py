@@ -0,0 +1,75 @@
+"""EntropyEfficientSampler: bit and value accounting, and uniform output"""
+import numpy as np
+import pytest
+
+from Quantum_Dice_With_Luck_Bias.bit_sampler import REFILL_BYTES, EntropyEfficientSampler
+
+
+class CountingSource:
+    """Seeded random bytes that remember how many were handed out"""
+
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.bytes_given = 0
+
+    def __call__(self, num_bytes):
+        self.bytes_given += num_bytes
+        return self.rng.integers(0, 256, num_bytes, dtype=np.uint8)
+
+
+def test_raw_bits_are_counted_but_are_not_values():
+    sampler = EntropyEfficientSampler(CountingSource())
+    values = sampler.bits(5, 10)
+    assert len(values) == 10 and values.max() < 32
+    assert sampler.bits_consumed == 50
+    assert sampler.values_produced == 0
+    assert sampler.bits_per_value() == 0.0
+
+
+def test_uniform_counts_every_value():
+    source = CountingSource()
+    sampler = EntropyEfficientSampler(source)
+    sampler.uniform(6, 1000)
+    sampler.uniform_one(6)
+    sampler.uniform_one(20)
+    assert sampler.values_produced == 1002
+    # Never more bits than the source handed over, and at least log2(6) per d6
+    assert sampler.bits_consumed <= 8 * source.bytes_given
+    assert sampler.bits_consumed >= 1000 * np.log2(6)
+
+
+def test_packing_wastes_few_bits():
+    sampler = EntropyEfficientSampler(CountingSource())
+    sampler.uniform(6, 30000)
+    assert sampler.bits_per_value() == pytest.approx(np.log2(6), rel=0.05)
+
+
+def test_single_rolls_recycle_leftover_bits():
+    sampler = EntropyEfficientSampler(CountingSource())
+    for _ in range(5000):
+        sampler.uniform_one(100)
+    # Rejection sampling would take 7 * 128/100 ~ 9 bits per roll
+    assert sampler.bits_per_value() < np.log2(100) + 0.5
+
+
+def test_reset_counters():
+    source = CountingSource()
+    sampler = EntropyEfficientSampler(source)
+    sampler.uniform(20, 100)
+    sampler.reset_counters()
+    assert sampler.bits_consumed == 0 and sampler.values_produced == 0
+    # The reservoir isn't touched, so the next draw needs no new bytes
+    sampler.uniform(20, 10)
+    assert source.bytes_given == REFILL_BYTES
+
+
+@pytest.mark.parametrize("die_size", [1, 2, 6, 20, 100, 1000])
+def test_values_are_uniform(die_size):
+    sampler = EntropyEfficientSampler(CountingSource(die_size))
+    n = 50000
+    values = np.concatenate([sampler.uniform(die_size, n // 2),
+                             [sampler.uniform_one(die_size) for _ in range(n // 2)]])
+    assert values.min() >= 0 and values.max() < die_size
+    counts = np.bincount(values, minlength=die_size)
+    expected = n / die_size
+    assert np.all(np.abs(counts - expected) <= 5 * np.sqrt(expected) + 1)
@@ -0,0 +1,87 @@
+"""Custom and weighted dice, and fractional luck, roll with the right odds"""
+import numpy as np
+import pytest
+
+from Quantum_Dice_With_Luck_Bias.bias_tables import calculate_bias, weighted_bias
+from Quantum_Dice_With_Luck_Bias.custom_dice import CustomDie
+from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+
+
+def assert_counts_match(counts, probabilities):
+    """Every face count is within 5 standard deviations of what's expected"""
+    n = counts.sum()
+    expected = n * probabilities
+    assert np.all(np.abs(counts - expected) <= 5 * np.sqrt(expected * (1 - probabilities)) + 1)
+
+
+@pytest.mark.parametrize("mode", [{}, {"efficient": True}])
+@pytest.mark.parametrize("luck", [1, 5, 8, 6.5])
+def test_weighted_die_follows_its_weights(mode, luck):
+    dice = QuantumDice(backend="classical", seed=8, **mode)
+    weights = [1, 1, 1, 1, 1, 2]
+    dice.add_die("loaded", 6, weights)
+    rolls = dice.roll_dice("loaded", luck, 60000)
+    counts = np.bincount(rolls - 1, minlength=6)
+    assert_counts_match(counts, weighted_bias(luck, weights))
+
+
+def test_zero_weight_faces_never_come_up():
+    dice = QuantumDice(backend="classical", seed=8)
+    dice.add_die("blank", ["a", "b", "c", "d"], [1, 0, 3, 0])
+    rolls = dice.roll_dice("blank", 7, 20000)
+    assert set(rolls.tolist()) == {"a", "c"}
+    share = np.mean(rolls == "c")
+    expected = weighted_bias(7, [1, 0, 3, 0])[2]
+    assert abs(share - expected) <= 5 * np.sqrt(expected * (1 - expected) / 20000)
+
+
+def test_custom_faces_come_back_as_face_values():
+    dice = QuantumDice(backend="classical", seed=8)
+    dice.add_die("fudge", [-1, 0, 1])
+    rolls = dice.roll_dice("fudge", 5, 30000)
+    assert set(rolls.tolist()) == {-1, 0, 1}
+    assert_counts_match(np.bincount(rolls + 1, minlength=3), np.full(3, 1 / 3))
+    assert dice.roll_die("fudge") in (-1, 0, 1)
+
+
+def test_equal_weights_are_a_plain_die():
+    assert CustomDie(6, [2, 2, 2, 2, 2, 2]).weights is None
+    assert CustomDie(6, [2, 2, 2, 2, 2, 2]).probabilities(8) == pytest.approx(calculate_bias(8, 6))
+
+
+@pytest.mark.parametrize("faces, weights", [
+    ([], None),
+    (3, [1, 2]),
+    (3, [1, -1, 1]),
+    (3, [0, 0, 0]),
+])
+def test_bad_custom_dice_are_rejected(faces, weights):
+    with pytest.raises(ValueError):
+        CustomDie(faces, weights)
+
+
+def test_custom_dice_cant_take_standard_names():
+    dice = QuantumDice(backend="classical", seed=8)
+    for name in ("d6", "d37"):
+        with pytest.raises(ValueError):
+            dice.add_die(name, 6)
+
+
+@pytest.mark.parametrize("die_size", [2, 6, 20, 100])
+def test_fractional_luck_lies_between_its_neighbours(die_size):
+    low, middle, high = (calculate_bias(luck, die_size) for luck in (6, 6.5, 7))
+    assert np.all(np.minimum(low, high) <= middle + 1e-12)
+    assert np.all(middle <= np.maximum(low, high) + 1e-12)
+    assert middle.sum() == pytest.approx(1)
+
+
+@pytest.mark.parametrize("mode", [
+    {"backend": "classical"},
+    {"backend": "classical", "efficient": True},
+    {"backend": "sampler", "native_bias": True},
+])
+@pytest.mark.parametrize("luck", [2.5, 6.5, 9.75])
+def test_fractional_luck_rolls_follow_calculate_bias(mode, luck):
+    dice = QuantumDice(seed=4, **mode)
+    rolls = dice.roll_dice("d8", luck, 40000)
+    assert_counts_match(np.bincount(rolls - 1, minlength=8), calculate_bias(luck, 8))
@@ -0,0 +1,113 @@
+"""Parsing dice notation and applying keep/drop and dice pool rules"""
+import numpy as np
+import pytest
+
+from Quantum_Dice_With_Luck_Bias.dice_expressions import (
+    MAX_DICE, MAX_ROLLED_DICE, MAX_SIDES, DiceExpression, parse, roll_expressions
+)
+from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+
+# Two rows of five fixed rolls to apply the rules to
+ROLLS = np.array([[3, 6, 1, 4, 2],
+                  [5, 5, 2, 6, 1]])
+
+
+@pytest.fixture
+def dice():
+    return QuantumDice(backend="classical", seed=13)
+
+
+def apply(text, rolls=ROLLS):
+    """Apply the rule of a one-term expression to the fixed rolls"""
+    (term,) = parse(text)
+    return term.apply(rolls).tolist()
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("5d6", [16, 19]),
+    ("5d6kh3", [13, 16]),
+    ("5d6k3", [13, 16]),
+    ("5d6kl2", [3, 3]),
+    ("5d6dh1", [10, 13]),
+    ("5d6dl2", [13, 16]),
+    ("5d6kh5", [16, 19]),
+    ("-5d6kh1", [-6, -6]),
+])
+def test_keep_and_drop(text, expected):
+    assert apply(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("5d6>=4", [2, 3]),
+    ("5d6>4", [1, 3]),
+    ("5d6<=2", [2, 2]),
+    ("5d6<2", [1, 1]),
+    ("5d6kh3>=5", [1, 3]),
+])
+def test_dice_pools_count_successes(text, expected):
+    assert apply(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "   ",
+    "d",
+    "4d",
+    "4d6 2",
+    "4d6+",
+    "4d6 * 2",
+    "0d6",
+    "4d0",
+    "4d6kh5",
+    "4d6kh0",
+    "4d6dl4",
+    "d20@11",
+    "d20@0",
+    f"{MAX_DICE + 1}d6",
+    f"d{MAX_SIDES + 1}",
+])
+def test_bad_expressions_are_rejected(text):
+    with pytest.raises(ValueError):
+        DiceExpression(text)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("4d6kh3+2", "4d6kh3+2"),
+    ("d20 - 1", "1d20-1"),
+    ("2d%K1", "2d100kh1"),
+    ("6d10>=8@6.5", "6d10>=8@6.5"),
+    ("-3+d4", "-3+1d4"),
+])
+def test_expressions_print_back_in_full(text, expected):
+    assert str(DiceExpression(text)) == expected
+    assert str(DiceExpression(expected)) == expected
+
+
+def test_rolled_totals_stay_in_range(dice):
+    totals = DiceExpression("4d6kh3+2").roll(dice, 5000)
+    assert totals.min() >= 5 and totals.max() <= 20
+    pools = DiceExpression("6d10>=8").roll(dice, 5000)
+    assert pools.min() >= 0 and pools.max() <= 6
+    # 3 successes in 10 on every die
+    assert abs(pools.mean() - 1.8) <= 5 * np.sqrt(6 * 0.3 * 0.7 / 5000)
+
+
+def test_keep_highest_beats_keep_lowest(dice):
+    high, low = roll_expressions(dice, ["2d20kh1", "2d20kl1"], 5000)
+    # Advantage averages 13.825 and disadvantage 7.175 on a d20
+    assert abs(high.mean() - 13.825) < 0.3
+    assert abs(low.mean() - 7.175) < 0.3
+
+
+def test_term_luck_overrides_expression_luck(dice):
+    lucky, unlucky = roll_expressions(dice, ["d20@10", "d20"], 5000, luck=1)
+    assert lucky.mean() > 11.5 > 9.5 > unlucky.mean()
+
+
+def test_roll_limits(dice):
+    with pytest.raises(ValueError):
+        roll_expressions(dice, ["d20"], 5, luck=11)
+    with pytest.raises(ValueError):
+        roll_expressions(dice, ["d20"], -1)
+    with pytest.raises(ValueError):
+        roll_expressions(dice, [f"{MAX_DICE}d6"], MAX_ROLLED_DICE // MAX_DICE + 1)
@@ -0,0 +1,73 @@
+"""EntropyPool: the bytes come out in order, and the pool refills itself"""
+import threading
+
+import numpy as np
+import pytest
+
+from Quantum_Dice_With_Luck_Bias.entropy_pool import EntropyPool
+from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+
+
+class CountingSource:
+    """Hands out 0, 1, 2, ... (mod 256) so the order of the bytes can be checked"""
+
+    def __init__(self):
+        self.next = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, num_bytes):
+        with self.lock:
+            data = (np.arange(self.next, self.next + num_bytes) % 256).astype(np.uint8)
+            self.next += num_bytes
+        return data
+
+
+def test_bytes_come_out_in_order_across_the_ring():
+    with EntropyPool(capacity=100, block_size=30, source=CountingSource()) as pool:
+        taken = np.concatenate([pool.take_bytes(n, timeout=5) for n in (7, 50, 93, 1, 250)])
+    assert np.array_equal(taken, np.arange(len(taken)) % 256)
+
+
+def test_take_values():
+    with EntropyPool(capacity=64, block_size=16, source=CountingSource()) as pool:
+        assert pool.take_values(8, 3).tolist() == [0, 1, 2]
+        # 12-bit values take 2 bytes each, big-endian, keeping the low 12 bits
+        assert pool.take_values(12, 2).tolist() == [0x0304, 0x0506]
+        with pytest.raises(ValueError):
+            pool.take_values(65, 1)
+
+
+def test_pool_refills_in_the_background():
+    source = CountingSource()
+    with EntropyPool(capacity=1000, low_watermark=0.2, high_watermark=0.9,
+                     block_size=100, source=source) as pool:
+        pool.take_bytes(5000, timeout=5)
+        assert source.next >= 5000
+
+
+def test_empty_pool_that_isnt_refilling():
+    pool = EntropyPool(capacity=10, source=CountingSource(), start=False)
+    with pytest.raises(TimeoutError):
+        pool.take_bytes(1, timeout=0.1)
+    pool.stop()
+    with pytest.raises(RuntimeError):
+        pool.take_bytes(1, timeout=5)
+
+
+def test_refill_errors_reach_the_reader():
+    def broken(num_bytes):
+        raise OSError("no entropy today")
+
+    with EntropyPool(capacity=10, source=broken) as pool:
+        with pytest.raises(RuntimeError):
+            pool.take_bytes(1, timeout=5)
+
+
+def test_dice_roll_from_the_pool():
+    rng = np.random.default_rng(4)
+    with EntropyPool(capacity=4096, source=lambda n: rng.integers(0, 256, n, dtype=np.uint8)) as pool:
+        dice = QuantumDice(pool=pool)
+        rolls = dice.roll_dice("d20", 5, 20000)
+    assert rolls.min() == 1 and rolls.max() == 20
+    counts = np.bincount(rolls, minlength=21)[1:]
+    assert np.all(np.abs(counts - 1000) <= 5 * np.sqrt(1000))
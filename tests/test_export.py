@@ -0,0 +1,62 @@
+"""Exporting rolls to npy, raw and bit-packed tapes and reading them back"""
+import numpy as np
+import pytest
+
+from Quantum_Dice_With_Luck_Bias.export import RollTape, export_rolls, format_for_path
+
+
+def chunks_of(values, size):
+    """Hand values out size at a time, like dice.stream(..., as_chunks=True)"""
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+@pytest.mark.parametrize("fmt", ["npy", "raw", "bits"])
+@pytest.mark.parametrize("low,high", [(1, 20), (1, 6), (0, 1), (-1, 1), (1, 1000000)])
+def test_round_trip(tmp_path, fmt, low, high):
+    values = np.random.default_rng(high).integers(low, high + 1, 10007)
+    path = str(tmp_path / f"rolls.{fmt}")
+    # 333 isn't a multiple of 8, so bit-packed chunks have to carry values over
+    assert export_rolls(path, chunks_of(values, 333), len(values), low, high, fmt) == fmt
+
+    tape = RollTape(path)
+    assert tape.format == fmt
+    assert len(tape) == len(values)
+    assert np.array_equal(tape[:], values)
+    assert np.array_equal(np.concatenate(list(tape.chunks(1000))), values)
+    assert tape[0] == values[0] and tape[-1] == values[-1]
+    assert np.array_equal(tape[17:4001], values[17:4001])
+    assert np.array_equal(tape[5:100:7], values[5:100:7])
+
+
+def test_npy_tapes_load_with_numpy(tmp_path):
+    path = str(tmp_path / "rolls.npy")
+    values = np.arange(1, 21)
+    export_rolls(path, chunks_of(values, 7), 20, 1, 20)
+    assert np.array_equal(np.load(path), values)
+    assert np.load(path).dtype == np.uint8
+
+
+def test_only_count_values_are_written(tmp_path):
+    path = str(tmp_path / "rolls.raw")
+    export_rolls(path, chunks_of(np.arange(1, 101), 30), 45, 1, 100)
+    tape = RollTape(path)
+    assert len(tape) == 45
+    assert np.array_equal(tape.values, np.arange(1, 46))
+
+
+def test_bits_are_packed_tightly(tmp_path):
+    path = str(tmp_path / "rolls.bits")
+    export_rolls(path, chunks_of(np.full(800, 20), 100), 800, 1, 20)
+    # A d20 needs 5 bits, so 800 rolls fit in 500 bytes
+    assert (tmp_path / "rolls.bits").stat().st_size == 500
+    with pytest.raises(ValueError):
+        RollTape(path).values
+
+
+def test_formats():
+    assert format_for_path("a.npy") == "npy"
+    assert format_for_path("a.BITS") == "bits"
+    assert format_for_path("a.bin") == "raw"
+    with pytest.raises(ValueError):
+        export_rolls("unused", iter([]), 0, 1, 6, "csv")
@@ -0,0 +1,66 @@
+"""Exact distributions of dice expressions, checked against brute force"""
+from itertools import product
+
+import numpy as np
+import pytest
+
+from Quantum_Dice_With_Luck_Bias.bias_tables import calculate_bias
+from Quantum_Dice_With_Luck_Bias.dice_expressions import DiceExpression
+from Quantum_Dice_With_Luck_Bias.probability import exact_distribution
+
+
+def brute_force(text, luck):
+    """Go through every way the dice can land, adding up the chance of every total"""
+    expression = DiceExpression(text)
+    dice = []
+    for term in expression.dice_terms():
+        dice += [(term, calculate_bias(term.luck or luck, term.sides))] * term.count
+    constant = sum(term.sign * term.constant for term in expression.terms if not term.is_dice)
+
+    totals = {}
+    for faces in product(*(range(len(p)) for _, p in dice)):
+        chance = np.prod([p[face] for (_, p), face in zip(dice, faces)])
+        total = constant
+        position = 0
+        for term in expression.dice_terms():
+            rolls = np.array([faces[position:position + term.count]]) + 1
+            total += int(term.apply(rolls)[0])
+            position += term.count
+        totals[total] = totals.get(total, 0.0) + chance
+    return totals
+
+
+@pytest.mark.parametrize("text", [
+    "3d6", "2d20kl1", "4d6kh3+2", "3d6dl1", "3d8dh2", "4d6>=5", "3d10kh2>7",
+    "2d4-1d6", "1d12@8+1d4", "5-2d3",
+])
+@pytest.mark.parametrize("luck", [1, 5, 8.5])
+def test_matches_brute_force(text, luck):
+    exact = exact_distribution(text, luck)
+    expected = brute_force(text, luck)
+
+    assert exact.probabilities.sum() == pytest.approx(1.0)
+    for total, chance in zip(exact.values.tolist(), exact.probabilities):
+        assert chance == pytest.approx(expected.pop(total, 0.0), abs=1e-12)
+    # Every total brute force found has to be in the exact distribution
+    assert sum(expected.values()) == pytest.approx(0.0, abs=1e-12)
+
+
+def test_big_pool_uses_fft_and_stays_normalized():
+    exact = exact_distribution("10d100", 7)
+    assert exact.values[0] == 10 and exact.values[-1] == 1000
+    assert exact.probabilities.min() >= 0
+    assert exact.probabilities.sum() == pytest.approx(1.0)
+    assert exact.mean() == pytest.approx(10 * np.dot(np.arange(1, 101), calculate_bias(7, 100)))
+
+
+@pytest.mark.parametrize("text", [
+    "1000d1000000kh500",  # keep table far too big
+    "4d10000kh3",         # keep table too slow to fill
+    "1000d9999",          # too many possible totals
+    "1001d6",             # too many dice in a term
+    "1d2000000",          # too many sides
+])
+def test_too_big_expressions_raise(text):
+    with pytest.raises(ValueError):
+        exact_distribution(text)
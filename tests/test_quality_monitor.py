@@ -0,0 +1,97 @@
+"""The quality monitor stays quiet on good streams and catches bad ones"""
+from math import exp
+
+import numpy as np
+import pytest
+
+from Quantum_Dice_With_Luck_Bias.quality_monitor import QualityMonitor, chi_square_sf
+from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+
+
+@pytest.fixture
+def dice():
+    return QuantumDice(backend="classical", seed=31)
+
+
+@pytest.mark.parametrize("x, df, p_value", [
+    (3.841459, 1, 0.05),
+    (6.634897, 1, 0.01),
+    (18.307038, 10, 0.05),
+    (30.143527, 19, 0.05),
+    (1.0, 30, 1.0),
+])
+def test_chi_square_sf_matches_tables(x, df, p_value):
+    assert chi_square_sf(x, df) == pytest.approx(p_value, abs=1e-6)
+
+
+def test_chi_square_sf_with_two_degrees_of_freedom_is_exponential():
+    for x in (0.5, 2, 10, 50):
+        assert chi_square_sf(x, 2) == pytest.approx(exp(-x / 2), rel=1e-9)
+
+
+@pytest.mark.parametrize("die_type, luck", [("d20", 5), ("d6", 8), ("d1000", 2), ("d3000", 6.5)])
+def test_quiet_on_rolls_that_match(dice, die_type, luck):
+    alerts = []
+    monitor = QualityMonitor.for_die(dice, die_type, luck, window=20000, on_alert=alerts.append)
+    for _ in range(10):
+        monitor.update(dice.roll_dice(die_type, luck, 10000))
+    assert monitor.windows == 5
+    assert alerts == [] and monitor.check() == []
+    report = monitor.report()
+    assert report["samples"] == 100000 and report["alerts"] == 0
+
+
+def test_quiet_on_uniform_rng_numbers():
+    monitor = QualityMonitor.for_range(-10 ** 12, 10 ** 12, window=50000)
+    rng = np.random.default_rng(3)
+    for _ in range(4):
+        monitor.update(rng.integers(-10 ** 12, 10 ** 12 + 1, 50000))
+    assert monitor.bins == 1024
+    assert list(monitor.alerts) == [] and monitor.check() == []
+
+
+def test_biased_rolls_raise_a_chi_square_alert(dice):
+    alerts = []
+    monitor = QualityMonitor.for_die(dice, "d20", 5, window=20000, on_alert=alerts.append)
+    monitor.update(dice.roll_dice("d20", 7, 20000))
+    assert [alert.test for alert in alerts] == ["chi_square"]
+    assert alerts[0].scope == "window" and alerts[0].samples == 20000
+    assert alerts[0].p_value < monitor.alpha
+
+
+def test_drift_halfway_through_is_caught_by_the_window_it_starts_in(dice):
+    alerts = []
+    monitor = QualityMonitor.for_die(dice, "d20", 5, window=20000, on_alert=alerts.append)
+    for luck in (5, 5, 5, 8, 8):
+        found = monitor.update(dice.roll_dice("d20", luck, 20000))
+        if luck == 5:
+            assert found == []
+        else:
+            assert "chi_square" in [alert.test for alert in found]
+    assert all(alert.scope == "window" for alert in alerts)
+    assert len(monitor.alerts) == len(alerts) >= 2
+
+
+def test_repeating_stream_fails_the_independence_tests():
+    # Right counts on every face, but each value follows the one before it
+    monitor = QualityMonitor.for_range(1, 20, window=20000)
+    found = monitor.update(np.tile(np.arange(1, 21), 1000))
+    assert {"serial_correlation", "runs"} <= {alert.test for alert in found}
+    assert "chi_square" not in {alert.test for alert in found}
+
+
+def test_values_out_of_range_raise_a_range_alert():
+    monitor = QualityMonitor.for_range(1, 6, window=100)
+    rng = np.random.default_rng(4)
+    values = rng.integers(1, 7, 100)
+    values[50] = 7
+    found = monitor.update(values)
+    assert found[0].test == "range" and found[0].statistic == 1
+
+
+def test_watch_passes_the_stream_through(dice):
+    monitor = QualityMonitor.for_die(dice, "d12", 5, window=1000)
+    stream = dice.stream("d12", 5)
+    seen = [roll for roll, _ in zip(monitor.watch(stream, batch=100), range(5000))]
+    assert len(seen) == 5000 and all(1 <= roll <= 12 for roll in seen)
+    assert monitor.report()["samples"] >= 4900
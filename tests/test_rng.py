@@ -0,0 +1,101 @@
+"""Random numbers land in any range, however it's offset, signed or wide"""
+import numpy as np
+import pytest
+
+from Quantum_Dice_With_Luck_Bias.backends import create_backend
+from Random_Number_Generator.rng import (
+    _random_words, generate_random_number, generate_random_numbers, stream_numbers
+)
+
+RANGES = [
+    (1, 100),
+    (1000, 1009),
+    (-50, -41),
+    (-5, 5),
+    (7, 7),
+    (-7, -7),
+]
+
+
+@pytest.fixture
+def backend():
+    return create_backend("classical", 21)
+
+
+@pytest.mark.parametrize("min_val, max_val", RANGES)
+def test_single_numbers_stay_in_range(backend, min_val, max_val):
+    numbers = [generate_random_number(min_val, max_val, backend=backend) for _ in range(200)]
+    assert min(numbers) >= min_val and max(numbers) <= max_val
+    assert all(isinstance(number, int) for number in numbers)
+
+
+@pytest.mark.parametrize("min_val, max_val", RANGES)
+def test_batches_cover_the_range_evenly(backend, min_val, max_val):
+    size = max_val - min_val + 1
+    n = 2000 * size if size <= 20 else 20000
+    numbers = generate_random_numbers(min_val, max_val, n, backend=backend)
+    assert numbers.dtype == np.int64 and len(numbers) == n
+    counts = np.bincount(numbers - min_val, minlength=size)
+    assert len(counts) == size
+    # Every value is hit about n / size times (5 standard deviations either way)
+    p = 1 / size
+    assert np.all(np.abs(counts - n * p) <= 5 * np.sqrt(n * p * (1 - p)) + 1)
+
+
+def test_single_value_range_needs_no_luck(backend):
+    assert generate_random_numbers(42, 42, 50, backend=backend).tolist() == [42] * 50
+    assert generate_random_number(42, 42, backend=backend) == 42
+
+
+@pytest.mark.parametrize("min_val, max_val", [
+    (0, 2 ** 100 - 1),
+    (-2 ** 70, 2 ** 70),
+    (2 ** 63 - 10, 2 ** 63 + 10),
+])
+def test_ranges_past_64_bits_give_python_ints(backend, min_val, max_val):
+    numbers = generate_random_numbers(min_val, max_val, 500, backend=backend)
+    assert numbers.dtype == object
+    assert all(type(number) is int and min_val <= number <= max_val for number in numbers)
+    single = generate_random_number(min_val, max_val, backend=backend)
+    assert min_val <= single <= max_val
+
+
+def test_wide_ranges_reach_their_top_bits(backend):
+    # A bug in gluing the pieces together would leave the high bits stuck at 0
+    numbers = generate_random_numbers(0, 2 ** 100 - 1, 200, backend=backend)
+    assert max(numbers) >= 2 ** 99
+    assert len(set(numbers)) == 200
+
+
+@pytest.mark.parametrize("num_bits, max_qubits", [(1, 8), (8, 8), (20, 8), (63, 8), (64, 8), (100, 7)])
+def test_random_words_are_num_bits_wide(backend, num_bits, max_qubits):
+    words = _random_words(num_bits, 2000, None, backend, max_qubits)
+    assert words.dtype == (object if num_bits > 63 else np.int64)
+    assert min(words) >= 0 and max(words) < 2 ** num_bits
+    # The top bit is set about half the time (checks the pieces line up)
+    top = sum(int(word) >> (num_bits - 1) for word in words)
+    assert abs(top - 1000) <= 5 * np.sqrt(500)
+
+
+@pytest.mark.parametrize("call", [
+    lambda backend: generate_random_number(10, 9, backend=backend),
+    lambda backend: generate_random_numbers(10, 9, 5, backend=backend),
+    lambda backend: generate_random_numbers(-1, -3, 5, backend=backend),
+    lambda backend: stream_numbers(10, 9, backend=backend),
+])
+def test_backwards_ranges_are_rejected(backend, call):
+    with pytest.raises(ValueError):
+        call(backend)
+
+
+def test_negative_counts_are_rejected(backend):
+    with pytest.raises(ValueError):
+        generate_random_numbers(1, 6, -1, backend=backend)
+
+
+def test_streams_keep_going_past_a_chunk(backend):
+    stream = stream_numbers(-3, 3, chunk=16, backend=backend)
+    numbers = [next(stream) for _ in range(100)]
+    assert all(-3 <= number <= 3 for number in numbers)
+    chunks = stream_numbers(-3, 3, chunk=16, as_chunks=True, backend=backend)
+    assert len(next(chunks)) == 16
@@ -0,0 +1,103 @@
+"""Roll plans pack dice into narrow circuits and keep every die's odds right"""
+import numpy as np
+import pytest
+
+from Quantum_Dice_With_Luck_Bias import roll_plan as roll_plan_module
+from Quantum_Dice_With_Luck_Bias.backends import EntropyBackend
+from Quantum_Dice_With_Luck_Bias.bias_tables import calculate_bias
+from Quantum_Dice_With_Luck_Bias.circuit_cache import MAX_CIRCUIT_QUBITS
+from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+from Quantum_Dice_With_Luck_Bias.roll_plan import pack_dice, roll_plan
+
+
+class UniformCircuitBackend(EntropyBackend):
+    """
+    Fast stand-in for a simulator, for plans of neutral (luck 5) dice only
+
+    Their plan circuits are just Hadamards, so every register measures
+    uniform bits. Every circuit it's asked to run is kept for checking.
+    """
+    runs_circuits = True
+
+    def __init__(self, seed=None):
+        self._rng = np.random.default_rng(seed)
+        self.batches = []
+
+    def random_bytes(self, num_bytes):
+        return self._rng.integers(0, 256, num_bytes, dtype=np.uint8)
+
+    def run_batch(self, circuits, shots):
+        self.batches.append(circuits)
+        return [[self._rng.integers(0, 2 ** creg.size, shots) for creg in qc.cregs] for qc in circuits]
+
+
+@pytest.mark.parametrize("max_qubits", [1, 3, 8, 10, 20])
+def test_packed_circuits_fit_in_max_qubits(max_qubits):
+    rng = np.random.default_rng(max_qubits)
+    for _ in range(50):
+        widths = rng.integers(1, max_qubits + 1, rng.integers(0, 15)).tolist()
+        groups = pack_dice(widths, max_qubits)
+        assert sorted(index for group in groups for index in group) == list(range(len(widths)))
+        for group in groups:
+            assert group == sorted(group)
+            assert sum(widths[index] for index in group) <= max_qubits
+
+
+def test_packing_fills_circuits_first_fit():
+    # Widest first: 5+5, 4+3+2, 1 joins the first circuit with room
+    assert pack_dice([5, 3, 4, 5, 2, 1], 10) == [[0, 3], [1, 2, 4, 5]]
+    assert pack_dice([], 10) == []
+
+
+@pytest.mark.parametrize("widths, max_qubits", [([3, 11], 10), ([2], 1), ([1], 0)])
+def test_dice_wider_than_max_qubits_are_rejected(widths, max_qubits):
+    with pytest.raises(ValueError):
+        pack_dice(widths, max_qubits)
+
+
+@pytest.mark.parametrize("max_qubits", [6, 10, 24])
+def test_plans_never_put_a_die_past_max_circuit_qubits(max_qubits):
+    backend = UniformCircuitBackend(seed=1)
+    dice = QuantumDice(backend=backend)
+    plan = ["d20", "d300", "d6", "d1000", "d100000", "d4", "d256", "d257"]
+    for _ in range(20):
+        results = dice.roll_plan(plan, max_qubits=max_qubits)
+        sizes = [dice.die_size(die_type) for die_type in plan]
+        assert all(1 <= roll <= size for roll, size in zip(results, sizes))
+    circuits = [qc for batch in backend.batches for qc in batch]
+    assert circuits
+    for qc in circuits:
+        assert qc.num_qubits <= max_qubits
+        assert all(creg.size <= min(max_qubits, MAX_CIRCUIT_QUBITS) for creg in qc.cregs)
+
+
+def test_redrawn_dice_keep_their_odds(monkeypatch):
+    # With one shot a round, a d5 misses 3 times in 8 and a d3 once in 4, so
+    # most rounds redraw some of the dice while the others keep their results
+    monkeypatch.setattr(roll_plan_module, "PLAN_SHOTS", 1)
+    backend = UniformCircuitBackend(seed=2)
+    plan = [(5, 5), (20, 5), (3, 5), (8, 5), (5, 5), (6, 5), (3, 5)]
+    n = 8000
+    rolls = np.array([roll_plan(backend, plan, max_qubits=6) for _ in range(n)])
+    # Far more rounds than plans, so redraws really happened
+    assert len(backend.batches) > 1.5 * n
+    for column, (die_size, _) in enumerate(plan):
+        counts = np.bincount(rolls[:, column] - 1, minlength=die_size)
+        assert len(counts) == die_size
+        p = 1 / die_size
+        assert np.all(np.abs(counts - n * p) <= 5 * np.sqrt(n * p * (1 - p)))
+
+
+def test_plans_on_a_simulator_mix_lucky_and_neutral_dice():
+    dice = QuantumDice(backend="sampler", seed=6)
+    plan = [("d20", 10), "d6", "d5", ("d8", 1)]
+    n = 100
+    rolls = np.array([dice.roll_plan(plan) for _ in range(n)])
+    for column, (die_size, luck) in enumerate([(20, 10), (6, 5), (5, 5), (8, 1)]):
+        assert rolls[:, column].min() >= 1 and rolls[:, column].max() <= die_size
+        # Every die's mean is where its luck puts it (5 standard errors either way)
+        faces = np.arange(1, die_size + 1)
+        probabilities = calculate_bias(luck, die_size)
+        mean = faces @ probabilities
+        std = np.sqrt((faces - mean) ** 2 @ probabilities)
+        assert abs(rolls[:, column].mean() - mean) <= 5 * std / np.sqrt(n)
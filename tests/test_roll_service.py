@@ -0,0 +1,128 @@
+"""RollService: concurrent requests share batches, and cancel and stop cleanly"""
+from concurrent.futures import CancelledError
+import threading
+
+import numpy as np
+import pytest
+
+from Quantum_Dice_With_Luck_Bias.dice_expressions import roll_expressions
+from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+from Quantum_Dice_With_Luck_Bias.roll_service import RollService
+
+
+class CountingDice(QuantumDice):
+    """Classical dice that remember every roll_dice call they get"""
+
+    def __init__(self):
+        super().__init__(backend="classical", seed=17)
+        self.calls = []
+
+    def roll_dice(self, die_type="d20", luck=5, n=1):
+        self.calls.append((die_type, luck, n))
+        return super().roll_dice(die_type, luck, n)
+
+
+def test_queued_requests_share_one_roll_per_die_and_luck():
+    dice = CountingDice()
+    service = RollService(dice, window=0, start=False)
+    d20s = [service.submit("d20", 5, 1) for _ in range(10)]
+    lucky = [service.submit("d6", 8, n) for n in (1, 2, 3)]
+    service.start()
+    results = [future.result(timeout=5) for future in d20s + lucky]
+    service.stop()
+
+    assert sorted(dice.calls) == [("d20", 5, 10), ("d6", 8, 6)]
+    assert [len(result) for result in results] == [1] * 10 + [1, 2, 3]
+    assert all(1 <= roll <= 20 for result in results[:10] for roll in result)
+    assert all(1 <= roll <= 6 for result in results[10:] for roll in result)
+
+
+def test_concurrent_callers_are_coalesced():
+    dice = CountingDice()
+    callers = 20
+    rolls = []
+    ready = threading.Barrier(callers)
+
+    with RollService(dice, window=0.2) as service:
+        def roll():
+            ready.wait(timeout=5)
+            rolls.append(service.roll("d20", timeout=5))
+
+        threads = [threading.Thread(target=roll) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+
+    assert len(rolls) == callers and all(1 <= roll <= 20 for roll in rolls)
+    # Everyone asked within the same window, so a couple of batches at most
+    assert len(dice.calls) <= 3
+    assert sum(n for _, _, n in dice.calls) == callers
+
+
+def test_max_batch_closes_a_batch_early():
+    dice = CountingDice()
+    with RollService(dice, window=30, max_batch=5) as service:
+        # Without the early close this would wait out the 30 second window
+        assert len(service.roll_many("d8", 5, 5, timeout=5)) == 5
+
+
+def test_cancelled_requests_are_not_rolled():
+    dice = CountingDice()
+    service = RollService(dice, window=0, start=False)
+    kept = service.submit("d12", 5, 4)
+    cancelled = service.submit("d12", 5, 100)
+    assert cancelled.cancel()
+    service.start()
+    assert len(kept.result(timeout=5)) == 4
+    service.stop()
+
+    assert dice.calls == [("d12", 5, 4)]
+    with pytest.raises(CancelledError):
+        cancelled.result(timeout=0)
+
+
+def test_stop_finishes_queued_requests_then_refuses_new_ones():
+    dice = CountingDice()
+    service = RollService(dice, window=0, start=False)
+    queued = [service.submit("d4", 3, 2) for _ in range(3)]
+    service.start()
+    service.stop()
+    assert all(len(future.result(timeout=0)) == 2 for future in queued)
+    with pytest.raises(RuntimeError):
+        service.submit("d4")
+
+    # It can be started again after stopping
+    service.start()
+    assert 1 <= service.roll("d4", timeout=5) <= 4
+    service.stop()
+
+
+def test_bad_requests_fail_straight_away():
+    with RollService(CountingDice(), window=0) as service:
+        with pytest.raises(ValueError):
+            service.submit("d20x")
+        with pytest.raises(ValueError):
+            service.submit("d20", 11)
+        with pytest.raises(ValueError):
+            service.submit("d20", 5, -1)
+
+
+def test_errors_while_rolling_reach_every_caller():
+    class BrokenDice(CountingDice):
+        def roll_dice(self, die_type="d20", luck=5, n=1):
+            raise OSError("backend went away")
+
+    service = RollService(BrokenDice(), window=0, start=False)
+    futures = [service.submit("d6") for _ in range(3)]
+    service.start()
+    for future in futures:
+        with pytest.raises(OSError):
+            future.result(timeout=5)
+    service.stop()
+
+
+def test_service_stands_in_for_the_dice_in_expressions():
+    with RollService(CountingDice(), window=0) as service:
+        (totals,) = roll_expressions(service, ["2d6+1"], 50)
+    assert isinstance(totals, np.ndarray) and totals.min() >= 3 and totals.max() <= 13
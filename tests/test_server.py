@@ -0,0 +1,186 @@
+"""The HTTP server, talked to over a real socket"""
+import asyncio
+import json
+
+import pytest
+
+from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+from Quantum_Dice_With_Luck_Bias.server import RollServer
+
+
+class HeldDice(QuantumDice):
+    """Dice whose async rolls wait until release() is called"""
+
+    def __init__(self):
+        super().__init__(backend="classical", seed=29)
+        self.started = asyncio.Event()
+        self.released = asyncio.Event()
+
+    async def aroll_dice(self, die_type="d20", luck=5, n=1):
+        self.started.set()
+        await self.released.wait()
+        return await super().aroll_dice(die_type, luck, n)
+
+
+def run_with_server(test, dice=None, **options):
+    """Run test(server, port) against a RollServer listening on a free local port"""
+    dice = dice or QuantumDice(backend="classical", seed=29)
+    server = RollServer(dice, **options)
+
+    async def main():
+        listener = await asyncio.start_server(server.handle_connection, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            async with listener:
+                await asyncio.wait_for(test(server, port), 20)
+        finally:
+            if dice._service is not None:
+                dice._service.stop()
+
+    asyncio.run(main())
+
+
+async def request(reader, writer, method, target, body=None, headers=None, raw=None):
+    """Send one request on an open connection and read the response"""
+    if raw is None:
+        body = json.dumps(body).encode() if body is not None else b""
+        head = f"{method} {target} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        raw = head.encode() + b"\r\n" + body
+    writer.write(raw)
+    await writer.drain()
+    return await read_response(reader)
+
+
+async def read_response(reader):
+    """(status, headers, JSON payload) of the next response on a connection"""
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+    payload = json.loads(await reader.readexactly(int(response_headers["content-length"])))
+    return status, response_headers, payload
+
+
+def test_keep_alive_answers_several_requests_on_one_connection():
+    async def test(server, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        status, headers, payload = await request(reader, writer, "GET", "/roll?die=d20&luck=8&n=3")
+        assert status == 200 and headers["connection"] == "keep-alive"
+        assert payload["die"] == "d20" and payload["luck"] == 8
+        assert len(payload["rolls"]) == 3 and all(1 <= roll <= 20 for roll in payload["rolls"])
+
+        status, _, payload = await request(reader, writer, "POST", "/roll",
+                                           [{"die": "d6", "n": 2}, {"die": "d100", "luck": 6.5}])
+        assert status == 200
+        assert [len(result["rolls"]) for result in payload["results"]] == [2, 1]
+
+        status, headers, payload = await request(reader, writer, "GET", "/health",
+                                                 headers={"Connection": "close"})
+        assert status == 200 and payload == {"ok": True} and headers["connection"] == "close"
+        # The server hangs up after a Connection: close request
+        assert await reader.read() == b""
+        writer.close()
+
+    run_with_server(test)
+
+
+def test_http_1_0_closes_unless_asked_to_keep_alive():
+    async def test(server, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /health HTTP/1.0\r\n\r\n")
+        status, headers, _ = await read_response(reader)
+        assert status == 200 and headers["connection"] == "close"
+        assert await reader.read() == b""
+        writer.close()
+
+    run_with_server(test)
+
+
+@pytest.mark.parametrize("method, target, body", [
+    ("GET", "/roll?die=d7x", None),
+    ("GET", "/roll?luck=11", None),
+    ("GET", "/roll?n=abc", None),
+    ("GET", "/roll?n=100001", None),
+    ("POST", "/roll", [{"n": 60000}, {"n": 60000}]),
+    ("POST", "/roll", ["d20"]),
+])
+def test_bad_rolls_get_400_and_keep_the_connection(method, target, body):
+    async def test(server, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        status, headers, payload = await request(reader, writer, method, target, body)
+        assert status == 400 and "error" in payload
+        assert headers["connection"] == "keep-alive"
+        # The connection is still good for the next request
+        status, _, _ = await request(reader, writer, "GET", "/health")
+        assert status == 200
+        writer.close()
+
+    run_with_server(test)
+
+
+def test_bad_json_and_bad_request_lines_get_400():
+    async def test(server, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        raw = b"POST /roll HTTP/1.1\r\nContent-Length: 5\r\n\r\n{nope"
+        status, _, payload = await request(reader, writer, None, None, raw=raw)
+        assert status == 400 and payload["error"] == "Request body must be JSON"
+        writer.close()
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        status, headers, _ = await request(reader, writer, None, None, raw=b"NONSENSE\r\n\r\n")
+        assert status == 400 and headers["connection"] == "close"
+        writer.close()
+
+    run_with_server(test)
+
+
+def test_unknown_paths_and_methods():
+    async def test(server, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        assert (await request(reader, writer, "GET", "/nope"))[0] == 404
+        assert (await request(reader, writer, "DELETE", "/roll"))[0] == 405
+        writer.close()
+
+    run_with_server(test)
+
+
+def test_oversized_bodies_get_413_and_a_closed_connection():
+    async def test(server, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        status, headers, _ = await request(reader, writer, "POST", "/roll", {"die": "d20" * 100})
+        assert status == 413 and headers["connection"] == "close"
+        assert await reader.read() == b""
+        writer.close()
+
+    run_with_server(test, max_body=64)
+
+
+def test_requests_past_max_in_flight_get_503():
+    dice = HeldDice()
+
+    async def test(server, port):
+        # The first request holds the only slot until the dice are released
+        first_reader, first_writer = await asyncio.open_connection("127.0.0.1", port)
+        first = asyncio.ensure_future(request(first_reader, first_writer, "GET", "/roll"))
+        await dice.started.wait()
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        status, headers, payload = await request(reader, writer, "GET", "/roll")
+        assert status == 503 and headers["retry-after"] == "1" and "error" in payload
+        # A 503 doesn't cost the client its connection
+        assert headers["connection"] == "keep-alive"
+
+        dice.released.set()
+        status, _, payload = await first
+        assert status == 200 and 1 <= payload["rolls"][0] <= 20
+        # With the slot free again the same connection gets its roll
+        assert (await request(reader, writer, "GET", "/roll"))[0] == 200
+        first_writer.close()
+        writer.close()
+
+    run_with_server(test, dice, max_in_flight=1)
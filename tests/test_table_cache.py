@@ -0,0 +1,101 @@
+"""BoundedCache keeps the most recently used entries within its memory budget"""
+import numpy as np
+
+from Quantum_Dice_With_Luck_Bias.table_cache import BoundedCache, bounded_cache, estimate_size
+
+
+def size_of_value(value):
+    """Every test value says how many bytes it 'uses'"""
+    return value
+
+
+def fill(cache, keys, size=10):
+    for key in keys:
+        cache.get(key, lambda: size)
+
+
+def test_least_recently_used_entries_go_first():
+    cache = BoundedCache(30, size_of_value)
+    fill(cache, "abc")
+    # Using "a" again makes "b" the oldest
+    cache.get("a", lambda: 10)
+    fill(cache, "d")
+    assert list(cache._entries) == ["c", "a", "d"]
+    fill(cache, "e")
+    assert list(cache._entries) == ["a", "d", "e"]
+
+
+def test_cache_info_counts_hits_misses_and_evictions():
+    cache = BoundedCache(30, size_of_value)
+    fill(cache, "abcd")
+    cache.get("d", lambda: 10)
+    cache.get("c", lambda: 10)
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.evictions) == (2, 4, 1)
+    assert (info.currsize, info.bytes, info.max_bytes) == (3, 30, 30)
+
+
+def test_values_are_only_built_on_a_miss():
+    cache = BoundedCache(100, size_of_value)
+    builds = []
+    for _ in range(3):
+        assert cache.get("a", lambda: builds.append(1) or 10) == 10
+    assert len(builds) == 1
+
+
+def test_the_newest_entry_is_kept_even_over_budget():
+    cache = BoundedCache(30, size_of_value)
+    fill(cache, "ab")
+    assert cache.get("huge", lambda: 100) == 100
+    assert list(cache._entries) == ["huge"]
+    assert cache.cache_info().bytes == 100
+
+
+def test_resize_evicts_straight_away():
+    cache = BoundedCache(100, size_of_value)
+    fill(cache, "abcde")
+    cache.resize(25)
+    info = cache.cache_info()
+    assert list(cache._entries) == ["d", "e"]
+    assert (info.evictions, info.bytes, info.max_bytes) == (3, 20, 25)
+    # Growing the budget again keeps what's there
+    cache.resize(1000)
+    fill(cache, "fgh")
+    assert list(cache._entries) == ["d", "e", "f", "g", "h"]
+
+
+def test_cache_clear_resets_everything():
+    cache = BoundedCache(100, size_of_value)
+    fill(cache, "abc")
+    cache.get("a", lambda: 10)
+    cache.cache_clear()
+    assert tuple(cache.cache_info()) == (0, 0, 0, 0, 0, 100)
+
+
+def test_decorator_keys_on_the_arguments():
+    calls = []
+
+    @bounded_cache(1000, lambda value: 100)
+    def square(x, power=2):
+        calls.append(x)
+        return x ** power
+
+    assert [square(3), square(3), square(3, power=3), square(3, power=3)] == [9, 9, 27, 27]
+    assert calls == [3, 3]
+    assert square.cache_info().hits == 2
+    square.cache.resize(100)
+    assert square.cache_info().currsize == 1
+    square.cache_clear()
+    assert square.cache_info().currsize == 0
+
+
+def test_estimate_size_counts_array_data():
+    array = np.zeros(1000, dtype=np.int64)
+    assert estimate_size(array) >= 8000
+    assert estimate_size((array, array)) >= 16000
+
+    class Table:
+        def __init__(self):
+            self.threshold = np.zeros(500, dtype=np.int64)
+
+    assert estimate_size(Table()) >= 4000
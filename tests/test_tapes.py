@@ -0,0 +1,57 @@
+"""Recording entropy tapes and replaying them gives the same rolls again"""
+import pytest
+
+from Quantum_Dice_With_Luck_Bias.quantum_dice import QuantumDice
+from Quantum_Dice_With_Luck_Bias.tapes import ReplayBackend
+
+
+def play(dice):
+    """A mix of single, batched, biased and wide rolls"""
+    rolls = [dice.roll_die("d20"), dice.roll_die("d6", 8), dice.roll_die("d100", 2)]
+    rolls += dice.roll_dice("d20", 5, 50).tolist()
+    rolls += dice.roll_dice("d12", 9, 50).tolist()
+    rolls += dice.roll_dice("d1000", 7, 20).tolist()
+    rolls += dice.roll_dice("d300", 5, 20).tolist()
+    return rolls
+
+
+@pytest.mark.parametrize("mode", [
+    {"backend": "sampler"},
+    {"backend": "classical"},
+    {"backend": "sampler", "efficient": True},
+    {"backend": "sampler", "native_bias": True},
+    {"backend": "statevector", "native_bias": True},
+])
+def test_replay_gives_the_recorded_rolls(tmp_path, mode):
+    tape = str(tmp_path / "rolls.tape")
+    recorder = QuantumDice(seed=11, record_to=tape, **mode)
+    recorded = play(recorder)
+    recorder.backend.close()
+
+    settings = {key: value for key, value in mode.items() if key != "backend"}
+    replayed = play(QuantumDice(replay_from=tape, **settings))
+    assert replayed == recorded
+
+
+def test_replay_of_a_roll_plan(tmp_path):
+    tape = str(tmp_path / "plan.tape")
+    recorder = QuantumDice(backend="sampler", seed=5, record_to=tape)
+    turns = [recorder.roll_plan(["d20", "d6", "d6", ("d8", 7)], max_qubits=6) for _ in range(20)]
+    recorder.backend.close()
+
+    player = QuantumDice(replay_from=tape)
+    assert [player.roll_plan(["d20", "d6", "d6", ("d8", 7)], max_qubits=6) for _ in range(20)] == turns
+
+
+def test_replay_runs_out_or_loops(tmp_path):
+    tape = tmp_path / "short.tape"
+    tape.write_bytes(bytes(range(10)))
+
+    backend = ReplayBackend(str(tape))
+    assert backend.random_bytes(8).tolist() == list(range(8))
+    with pytest.raises(RuntimeError):
+        backend.random_bytes(8)
+
+    looping = ReplayBackend(str(tape), loop=True)
+    assert looping.random_bytes(15).tolist() == list(range(10)) + list(range(5))
+    assert looping.position == 5